@@ -0,0 +1,48 @@
+"""
+ Benchmark of the language detection throughput of the Detector on the texts of resources/test_texts.csv.
+
+ Run from the repository root via:
+     PYTHONPATH=src/main python src/benchmark/benchmark_detector.py
+
+ Prints the results as JSON.
+"""
+import csv
+import json
+import time
+from typing import List
+
+from langdetect import DetectorFactory
+
+from constants import make_absolute_path
+from detector import Detector
+
+REPETITIONS = 20
+
+
+def _load_texts() -> List[str]:
+    """ Both the texts and their translations, i.e. short phrases and sentences in English and German. """
+    with open(make_absolute_path("../../resources/test_texts.csv"), newline="") as file:
+        return [text.strip() for row in csv.reader(file) for text in row[:2]]
+
+
+def benchmark_detector() -> dict:
+    DetectorFactory.seed = 0
+    texts = _load_texts()
+    detector = Detector()
+    detector.detect_language(texts[0])  # loads the language profiles
+
+    start_time = time.perf_counter()
+    for _ in range(REPETITIONS):
+        for text in texts:
+            detector.detect_language(text)
+    duration = time.perf_counter() - start_time
+
+    return {
+        "texts": len(texts) * REPETITIONS,
+        "textsPerSecond": len(texts) * REPETITIONS / duration,
+        "detectionMicroseconds": duration / (len(texts) * REPETITIONS) * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark_detector(), indent=2))
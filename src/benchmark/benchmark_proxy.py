@@ -0,0 +1,114 @@
+"""
+ Benchmark of the proxy fanning out a large translation request in batches to translator clients, which are stubs
+ served by aiohttp on a local port and answer each batch after a fixed delay.
+
+ Since the batches are sent concurrently, a request ideally takes as long as one batch; the overhead reported is the
+ time beyond that. Run from the repository root via:
+     PYTHONPATH=src/main python src/benchmark/benchmark_proxy.py
+
+ Prints the results as JSON.
+"""
+import asyncio
+import json
+import os
+import socket
+import time
+from types import SimpleNamespace
+
+from aiohttp import web
+
+CLIENTS = ["stub-a", "stub-b"]
+TEXTS = 256
+PROXY_BATCH_MAX_SIZE = 16
+STUB_TRANSLATION_SECONDS = 0.05
+REPETITIONS = 10
+
+# configured before the translator is imported, since the settings are read at import
+os.environ.update({"TRANSLATOR_MODELS": '["mock"]',
+                   "TRANSLATOR_MODE": "PROXY",
+                   "TRANSLATOR_CLIENTS": json.dumps(CLIENTS),
+                   "TRANSLATOR_PROXY_BATCH_MAX_SIZE": str(PROXY_BATCH_MAX_SIZE),
+                   "TRANSLATOR_CACHE_MAX_BYTES": "0",
+                   "TRANSLATOR_SHARED_CACHE_ENABLED": "false",
+                   "TRANSLATOR_TRACING_SAMPLE_RATE": "0"})
+
+import translator_proxy_client
+from translator import TranslatorProxy
+from utils.event_loop import BackgroundEventLoop
+from utils.srv_resolver import SrvResolver
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def _create_stub_client() -> web.Application:
+    """ A translator client providing the MockTranslator, which translates by echoing the texts. """
+    async def models(request: web.Request) -> web.Response:
+        return web.json_response({"models": ["mock"]})
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"healthy": True, "serviceAvailable": True})
+
+    async def translation(request: web.Request) -> web.Response:
+        body = await request.json()
+        await asyncio.sleep(STUB_TRANSLATION_SECONDS)
+        return web.json_response({"texts": body["texts"]})
+
+    app = web.Application()
+    app.router.add_get("/models", models)
+    app.router.add_route("*", "/health", health)
+    app.router.add_post("/translation", translation)
+    return app
+
+
+async def _start_stub_client(port: int) -> web.AppRunner:
+    runner = web.AppRunner(_create_stub_client())
+    await runner.setup()
+    await web.TCPSite(runner, "localhost", port).start()
+    return runner
+
+
+def benchmark_proxy() -> dict:
+    port = _free_port()
+    stub_event_loop = BackgroundEventLoop(name="stub-client-event-loop")
+    runner = stub_event_loop.run(_start_stub_client(port))
+
+    async def _query_stub_records(domain: str):
+        return [SimpleNamespace(host="localhost", port=port, priority=0, weight=1, ttl=3600)]
+    # all clients resolve to the stub instead of their SRV records
+    translator_proxy_client._shared_srv_resolver = SrvResolver(min_ttl_seconds=3600, max_ttl_seconds=3600, query=_query_stub_records)
+
+    translator = TranslatorProxy()
+    translator.initialize_models()
+    texts = [f"Text {i}" for i in range(TEXTS)]
+    translator.translate_batch(texts, "en", source_language="de")  # warm-up, opens the pooled connections
+
+    durations = []
+    for _ in range(REPETITIONS):
+        start_time = time.perf_counter()
+        translations = translator.translate_batch(texts, "en", source_language="de")
+        durations.append(time.perf_counter() - start_time)
+        assert translations == texts
+
+    start_time = time.perf_counter()
+    for _ in range(REPETITIONS):
+        translator.translate_batch(["Text"], "en", source_language="de")
+    single_text_duration = (time.perf_counter() - start_time) / REPETITIONS
+
+    translator.close()
+    stub_event_loop.run(runner.cleanup())
+    stub_event_loop.close()
+    return {
+        "texts": TEXTS,
+        "batches": -(-TEXTS // PROXY_BATCH_MAX_SIZE),
+        "fanOutMilliseconds": min(durations) * 1000,
+        "fanOutOverheadMilliseconds": (min(durations) - STUB_TRANSLATION_SECONDS) * 1000,
+        "singleTextOverheadMilliseconds": (single_text_duration - STUB_TRANSLATION_SECONDS) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark_proxy(), indent=2))
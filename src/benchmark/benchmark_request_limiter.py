@@ -0,0 +1,101 @@
+"""
+ Benchmark of the overhead the RequestLimiter adds to each request, limited per process and shared via a local
+ redis-server (as in the Docker image). The latter is skipped if redis-server is not installed.
+
+ Run from the repository root via:
+     PYTHONPATH=src/main python src/benchmark/benchmark_request_limiter.py
+
+ Prints the results as JSON.
+"""
+import json
+import os
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import redis
+
+# the limiter without redis client limits requests per process, instead of connecting to the Redis of the settings
+os.environ["TRANSLATOR_RATE_LIMIT_REDIS_ENABLED"] = "false"
+
+from request_limitation import RequestLimiter
+
+REQUESTS = 2000
+REPETITIONS = 5
+THREADS = 8
+CAPACITY = 64
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def _redis_server() -> Iterator[Optional[redis.Redis]]:
+    """ A client of a local redis-server started for the benchmark, None if redis-server is not installed. """
+    if shutil.which("redis-server") is None:
+        yield None
+        return
+    port = _free_port()
+    process = subprocess.Popen(["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    client = redis.Redis(connection_pool=redis.ConnectionPool(host="localhost", port=port, db=0))
+    try:
+        for _ in range(100):
+            try:
+                client.ping()
+                break
+            except redis.ConnectionError:
+                time.sleep(0.05)
+        yield client
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _sequential_request_microseconds(request_limiter: RequestLimiter) -> float:
+    start_time = time.perf_counter()
+    for _ in range(REQUESTS):
+        request_limiter.end_request(request_limiter.new_request())
+    return (time.perf_counter() - start_time) / REQUESTS * 1e6
+
+
+def _concurrent_requests_per_second(request_limiter: RequestLimiter) -> float:
+    """ Requests of several threads at once, all admitted since the capacity exceeds the number of threads. """
+    def _send_requests():
+        for _ in range(REQUESTS // THREADS):
+            request_limiter.end_request(request_limiter.new_request())
+
+    threads = [threading.Thread(target=_send_requests) for _ in range(THREADS)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return REQUESTS // THREADS * THREADS / (time.perf_counter() - start_time)
+
+
+def _benchmark_request_limiter(request_limiter: RequestLimiter) -> dict:
+    _sequential_request_microseconds(request_limiter)  # warm-up
+    result = {"requestMicroseconds": min(_sequential_request_microseconds(request_limiter) for _ in range(REPETITIONS)),
+              "concurrentRequestsPerSecond": max(_concurrent_requests_per_second(request_limiter) for _ in range(REPETITIONS))}
+    request_limiter.close()
+    return result
+
+
+def benchmark_request_limiter() -> dict:
+    results = {"local": _benchmark_request_limiter(RequestLimiter(CAPACITY, queue_timeouts_seconds={}))}
+    with _redis_server() as redis_client:
+        if redis_client is not None:
+            results["redis"] = _benchmark_request_limiter(RequestLimiter(CAPACITY, redis_client=redis_client, queue_timeouts_seconds={}))
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark_request_limiter(), indent=2))
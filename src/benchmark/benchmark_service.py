@@ -0,0 +1,78 @@
+"""
+ Benchmark of the overhead of the Flask service per request, served by the MockTranslator through the test client.
+
+ Cached translations and languages measure the request handling alone; translations that miss the cache additionally
+ pass the batch scheduler (including its wait for segments of concurrent requests), of which the MockTranslator's fixed
+ translation time of 1s is subtracted. Run from the repository root via:
+     PYTHONPATH=src/main python src/benchmark/benchmark_service.py
+
+ Prints the results as JSON.
+"""
+import json
+import os
+import time
+from typing import Callable
+
+# configured before the service is imported, since it creates the translator and rate limiter at import
+os.environ.update({"TRANSLATOR_MODELS": '["mock"]',
+                   "TRANSLATOR_MODE": "CLIENT",
+                   "TRANSLATOR_RATE_LIMIT_REDIS_ENABLED": "false",
+                   "TRANSLATOR_SHARED_CACHE_ENABLED": "false",
+                   "TRANSLATOR_JOB_QUEUE_REDIS_ENABLED": "false",
+                   "TRANSLATOR_JOB_WORKERS": "0",
+                   "TRANSLATOR_TRACING_SAMPLE_RATE": "0"})
+
+import translator_service
+
+REQUESTS = 200
+REPETITIONS = 3
+UNCACHED_REQUESTS = 3
+MOCK_TRANSLATION_SECONDS = 1.0
+MODELS_LOADED_TIMEOUT_SECONDS = 60
+
+
+def _wait_until_models_loaded():
+    deadline = time.monotonic() + MODELS_LOADED_TIMEOUT_SECONDS
+    while not translator_service.translator.models_loaded:
+        if time.monotonic() > deadline:
+            raise TimeoutError("The MockTranslator was not loaded in time.")
+        time.sleep(0.05)
+
+
+def _request_microseconds(send_request: Callable[[int], None], requests: int = REQUESTS, repetitions: int = REPETITIONS) -> float:
+    """ Mean time per request of the fastest repetition. """
+    send_request(-1)  # warm-up
+    durations = []
+    for repetition in range(repetitions):
+        start_time = time.perf_counter()
+        for i in range(requests):
+            send_request(repetition * requests + i)
+        durations.append(time.perf_counter() - start_time)
+    return min(durations) / requests * 1e6
+
+
+def benchmark_service() -> dict:
+    _wait_until_models_loaded()
+    with translator_service.app.test_client() as client:
+        def _post(path: str, body: dict):
+            response = client.post(path, json=body)
+            assert response.status_code == 200, response.get_data(as_text=True)
+
+        health = _request_microseconds(lambda i: client.get("health"))
+        languages = _request_microseconds(lambda i: _post("languages", {"baseLanguage": "de"}))
+        cached_translation = _request_microseconds(
+            lambda i: _post("translation", {"texts": ["Hallo Welt"], "sourceLanguage": "de", "targetLanguage": "en"}))
+        uncached_translation = _request_microseconds(
+            lambda i: _post("translation", {"texts": [f"Hallo Welt {i}"], "sourceLanguage": "de", "targetLanguage": "en"}),
+            UNCACHED_REQUESTS, repetitions=1)
+
+    return {
+        "healthMicroseconds": health,
+        "languagesMicroseconds": languages,
+        "cachedTranslationMicroseconds": cached_translation,
+        "uncachedTranslationOverheadMicroseconds": uncached_translation - MOCK_TRANSLATION_SECONDS * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark_service(), indent=2))
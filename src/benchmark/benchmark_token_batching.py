@@ -0,0 +1,87 @@
+"""
+ Benchmark of batching texts by token length (as Nllb200Translator and Wmt19Translator do) against batches of a fixed
+ number of texts in arrival order.
+
+ Uses a small randomly initialised model of the NLLB architecture and random token ids of mixed lengths, so that it runs
+ on a CPU without downloading a model. Run from the repository root via:
+     PYTHONPATH=src/main python src/benchmark/benchmark_token_batching.py
+
+ Prints the results as JSON.
+"""
+import json
+import random
+import time
+from typing import List
+
+import torch
+from transformers import M2M100Config, M2M100ForConditionalGeneration
+
+from utils.token_batching import token_budget_batches
+
+SEED = 42
+TEXTS = 64
+FIXED_BATCH_SIZE = 16
+BATCH_MAX_TOKENS = 1024
+MAX_NEW_TOKENS = 8
+REPETITIONS = 3
+PAD_TOKEN_ID = 1
+
+
+def _create_model() -> M2M100ForConditionalGeneration:
+    config = M2M100Config(vocab_size=1000, d_model=64, encoder_layers=2, decoder_layers=2, encoder_attention_heads=4,
+                          decoder_attention_heads=4, encoder_ffn_dim=128, decoder_ffn_dim=128, max_position_embeddings=1024,
+                          pad_token_id=PAD_TOKEN_ID, bos_token_id=0, eos_token_id=2, decoder_start_token_id=2)
+    return M2M100ForConditionalGeneration(config).eval()
+
+
+def _create_token_ids() -> List[List[int]]:
+    """ Mostly short texts with some long ones, as in chat messages mixed with documents. """
+    rng = random.Random(SEED)
+    lengths = [rng.randint(5, 30) if rng.random() < 0.8 else rng.randint(200, 400) for _ in range(TEXTS)]
+    return [[rng.randint(3, 999) for _ in range(length)] for length in lengths]
+
+
+def _generate(model: M2M100ForConditionalGeneration, token_ids: List[List[int]]):
+    longest = max(len(ids) for ids in token_ids)
+    input_ids = torch.tensor([ids + [PAD_TOKEN_ID] * (longest - len(ids)) for ids in token_ids])
+    attention_mask = torch.tensor([[1] * len(ids) + [0] * (longest - len(ids)) for ids in token_ids])
+    with torch.no_grad():
+        model.generate(input_ids=input_ids, attention_mask=attention_mask, max_new_tokens=MAX_NEW_TOKENS,
+                       min_new_tokens=MAX_NEW_TOKENS, num_beams=1, do_sample=False)
+
+
+def _run(model: M2M100ForConditionalGeneration, token_ids: List[List[int]], batches: List[List[int]]) -> dict:
+    durations = []
+    for _ in range(REPETITIONS):
+        start_time = time.perf_counter()
+        for batch in batches:
+            _generate(model, [token_ids[i] for i in batch])
+        durations.append(time.perf_counter() - start_time)
+    padded_tokens = sum(max(len(token_ids[i]) for i in batch) * len(batch) for batch in batches)
+    return {
+        "batches": len(batches),
+        "seconds": min(durations),
+        "paddedTokens": padded_tokens,
+        "paddingRatio": 1 - sum(len(ids) for ids in token_ids) / padded_tokens,
+    }
+
+
+def benchmark_token_batching() -> dict:
+    torch.manual_seed(SEED)
+    model = _create_model()
+    token_ids = _create_token_ids()
+
+    fixed_batches = [list(range(i, min(i + FIXED_BATCH_SIZE, TEXTS))) for i in range(0, TEXTS, FIXED_BATCH_SIZE)]
+    fixed = _run(model, token_ids, fixed_batches)
+    token_budget = _run(model, token_ids, token_budget_batches([len(ids) for ids in token_ids], BATCH_MAX_TOKENS))
+    return {
+        "texts": TEXTS,
+        "tokens": sum(len(ids) for ids in token_ids),
+        "fixedBatchSize": {"batchSize": FIXED_BATCH_SIZE, **fixed},
+        "tokenBudget": {"batchMaxTokens": BATCH_MAX_TOKENS, **token_budget},
+        "speedup": fixed["seconds"] / token_budget["seconds"],
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark_token_batching(), indent=2))
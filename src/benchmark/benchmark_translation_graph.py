@@ -0,0 +1,63 @@
+"""
+ Benchmark of building the TranslationGraph and looking up translation paths for all available models.
+
+ Run from the repository root via:
+     PYTHONPATH=src/main python src/benchmark/benchmark_translation_graph.py
+
+ Prints the results as JSON.
+"""
+import json
+import time
+import tracemalloc
+
+from translator_models import models
+from utils.translation_graph import TranslationGraph
+
+REPETITIONS = 5
+
+
+def _build_graph() -> TranslationGraph:
+    return TranslationGraph(models)
+
+
+def benchmark_translation_graph() -> dict:
+    build_times = []
+    for _ in range(REPETITIONS):
+        start_time = time.perf_counter()
+        _build_graph()
+        build_times.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    graph = _build_graph()
+    start_time = time.perf_counter()
+    graph.find_optimal_translation_path("de", "en")
+    shortest_paths_time = time.perf_counter() - start_time
+    _, peak_memory = tracemalloc.get_traced_memory()
+    resident_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start_time = time.perf_counter()
+    graph.get_connected_languages("en")
+    connected_languages_time = time.perf_counter() - start_time
+
+    language_pairs = list(graph.translation_models)
+    start_time = time.perf_counter()
+    for source_language, target_language in language_pairs:
+        graph.find_optimal_translation_path(source_language, target_language)
+    lookup_time = time.perf_counter() - start_time
+
+    return {
+        "languages": len(graph.languages),
+        "languagePairs": len(language_pairs),
+        "buildSeconds": min(build_times),
+        "shortestPathsSeconds": shortest_paths_time,
+        "connectedLanguagesSeconds": connected_languages_time,
+        "pathLookupMicroseconds": lookup_time / len(language_pairs) * 1e6,
+        "matrixBytes": graph.nbytes,
+        "residentBytes": resident_memory,
+        "peakBytes": peak_memory,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark_translation_graph(), indent=2))
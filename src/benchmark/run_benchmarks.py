@@ -0,0 +1,176 @@
+"""
+ Runs all benchmarks and compares their results with the baselines in baselines.json, so that performance
+ regressions fail the run.
+
+ Each benchmark runs in its own process, since they configure the translator differently before importing it. Since
+ absolute timings depend on the machine, timings and throughputs are related to the time a fixed reference workload
+ takes in the same run, and the baselines store these relative values; sizes are compared as they are. A metric
+ regresses if it is worse than its baseline by more than the tolerance, i.e. a relative time above
+ `baseline * (1 + tolerance)` or a relative throughput below `baseline / (1 + tolerance)`. Metrics of benchmarks that
+ are skipped (e.g. the limiter shared via Redis if redis-server is not installed) are not compared, and metrics without
+ baseline are reported as new. Run from the repository root via:
+     python src/benchmark/run_benchmarks.py [--output results.json] [--tolerance 0.5] [--update-baselines]
+
+ Prints the results and their comparison as JSON and exits with 1 if a metric regressed.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), "main")
+BASELINES_PATH = os.path.join(BENCHMARK_DIR, "baselines.json")
+DEFAULT_TOLERANCE = 0.5
+REFERENCE_REPETITIONS = 5
+
+TIME = "time"
+""" A duration, lower is better; divided by the reference time. """
+RATE = "rate"
+""" A throughput, higher is better; multiplied by the reference time. """
+SIZE = "size"
+""" A size or ratio that does not depend on the speed of the machine, lower is better. """
+
+TRACKED_METRICS: Dict[str, Dict[str, str]] = {
+    "translation_graph": {"buildSeconds": TIME, "shortestPathsSeconds": TIME, "pathLookupMicroseconds": TIME,
+                          "matrixBytes": SIZE, "peakBytes": SIZE},
+    "token_batching": {"tokenBudget.seconds": TIME, "tokenBudget.paddingRatio": SIZE},
+    "detector": {"textsPerSecond": RATE},
+    "request_limiter": {"local.requestMicroseconds": TIME, "redis.requestMicroseconds": TIME},
+    "service": {"healthMicroseconds": TIME, "languagesMicroseconds": TIME, "cachedTranslationMicroseconds": TIME,
+                "uncachedTranslationOverheadMicroseconds": TIME},
+    "proxy": {"fanOutOverheadMilliseconds": TIME, "singleTextOverheadMilliseconds": TIME},
+}
+""" Metrics compared with the baselines per benchmark (nested results joined by dots), and their kind. Others, like the
+throughput of concurrent threads, vary too much between runs to detect regressions. """
+
+
+def _reference_workload():
+    rng = random.Random(0)
+    values = sorted(rng.random() for _ in range(200_000))
+    sums: Dict[str, float] = {}
+    for value in values:
+        key = f"{value:.3f}"
+        sums[key] = sums.get(key, 0.0) + value
+    json.dumps(sums)
+
+
+def measure_reference() -> float:
+    """ Seconds the reference workload (sorting, string formatting and dictionaries in Python) takes at best on this machine. """
+    best = math.inf
+    for _ in range(REFERENCE_REPETITIONS):
+        start = time.perf_counter()
+        _reference_workload()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def relative_value(value: float, kind: str, reference_seconds: float) -> float:
+    """ The value of a metric independent of the speed of the machine, given the time of the reference workload. """
+    if kind == TIME:
+        return value / reference_seconds
+    if kind == RATE:
+        return value * reference_seconds
+    return value
+
+
+def run_benchmark(name: str) -> Dict[str, Any]:
+    """ Runs src/benchmark/benchmark_<name>.py and returns the results it printed. """
+    process = subprocess.run([sys.executable, os.path.join(BENCHMARK_DIR, f"benchmark_{name}.py")],
+                             env={**os.environ, "PYTHONPATH": MAIN_DIR}, stdout=subprocess.PIPE, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"Benchmark {name} failed with exit code {process.returncode}.")
+    return json.loads(process.stdout)
+
+
+def _get_metric(results: Dict[str, Any], metric: str) -> Optional[float]:
+    value = results
+    for key in metric.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(results: Dict[str, Dict[str, Any]], baselines: Dict[str, Dict[str, float]], tolerance: float,
+            reference_seconds: float) -> List[Dict[str, Any]]:
+    """ Compares the tracked metrics of the results, relative to the reference time of the run, with their baselines. """
+    comparisons = []
+    for benchmark, metrics in TRACKED_METRICS.items():
+        for metric, kind in metrics.items():
+            value = _get_metric(results.get(benchmark, {}), metric)
+            relative = None if value is None else relative_value(value, kind, reference_seconds)
+            baseline = baselines.get(benchmark, {}).get(metric)
+            if relative is None or baseline is None:
+                status = "skipped" if relative is None else "new"
+                limit = None
+            else:
+                limit = baseline / (1 + tolerance) if kind == RATE else baseline * (1 + tolerance)
+                regressed = relative < limit if kind == RATE else relative > limit
+                status = "regressed" if regressed else "ok"
+            comparisons.append({"benchmark": benchmark, "metric": metric, "kind": kind, "value": value, "relativeValue": relative,
+                                "baseline": baseline, "limit": limit, "status": status})
+    return comparisons
+
+
+def updated_baselines(results: Dict[str, Dict[str, Any]], baselines: Dict[str, Dict[str, float]],
+                      reference_seconds: float) -> Dict[str, Dict[str, float]]:
+    """ The baselines with the tracked metrics of the results, relative to the reference time; those of skipped benchmarks are kept. """
+    updated = {benchmark: dict(metrics) for benchmark, metrics in baselines.items()}
+    for benchmark, metrics in TRACKED_METRICS.items():
+        for metric, kind in metrics.items():
+            value = _get_metric(results.get(benchmark, {}), metric)
+            if value is not None:
+                updated.setdefault(benchmark, {})[metric] = relative_value(value, kind, reference_seconds)
+    return updated
+
+
+def _load_baselines() -> Dict[str, Dict[str, float]]:
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH) as file:
+        return json.load(file)
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Runs the benchmarks and compares their results with the stored baselines.")
+    parser.add_argument("benchmarks", nargs="*", help=f"Benchmarks to run ({', '.join(TRACKED_METRICS)}), all if omitted.")
+    parser.add_argument("--output", help="File to write the results and their comparison to, as JSON.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Relative deterioration of a metric beyond its baseline that is still accepted.")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help="Store the results as new baselines instead of failing on regressions.")
+    args = parser.parse_args(arguments)
+    unknown_benchmarks = set(args.benchmarks) - set(TRACKED_METRICS)
+    if unknown_benchmarks:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown_benchmarks))}")
+
+    reference_seconds = measure_reference()
+    results = {name: run_benchmark(name) for name in args.benchmarks or TRACKED_METRICS}
+    baselines = _load_baselines()
+    comparisons = compare(results, baselines, args.tolerance, reference_seconds)
+    report = json.dumps({"referenceSeconds": reference_seconds, "results": results, "comparisons": comparisons}, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report)
+    print(report)
+
+    if args.update_baselines:
+        with open(BASELINES_PATH, "w") as file:
+            json.dump(updated_baselines(results, baselines, reference_seconds), file, indent=2)
+            file.write("\n")
+        return 0
+    regressions = [c for c in comparisons if c["status"] == "regressed"]
+    for regression in regressions:
+        print(f"Regression of {regression['benchmark']} {regression['metric']}: {regression['value']}, relative "
+              f"{regression['relativeValue']} (baseline {regression['baseline']}, limit {regression['limit']})", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+from aiohttp import web
+
+from translator_async_service import app
+
+if __name__ == "__main__":
+    web.run_app(app, port=80, host='0.0.0.0')
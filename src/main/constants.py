@@ -12,3 +12,20 @@ def make_absolute_path(relative_path: str) -> str:
 class TranslatorMode(str, Enum):
     client = "CLIENT"
     proxy = "PROXY"
+
+
+class BalancingPolicy(str, Enum):
+    random = "RANDOM"
+    least_outstanding = "LEAST_OUTSTANDING"
+    ewma = "EWMA"
+
+
+class PriorityClass(str, Enum):
+    interactive = "INTERACTIVE"
+    bulk = "BULK"
+
+
+class JobStatus(str, Enum):
+    queued = "QUEUED"
+    running = "RUNNING"
+    completed = "COMPLETED"
@@ -1,6 +1,8 @@
 from langdetect import detect
 from langdetect.lang_detect_exception import LangDetectException
 
+from utils.tracing import traced
+
 
 class LanguageDetectionError(Exception):
     def __init__(self):
@@ -10,6 +12,7 @@ class LanguageDetectionError(Exception):
 class Detector:
 
     @staticmethod
+    @traced("detect")
     def detect_language(text):
         try:
             return detect(text)
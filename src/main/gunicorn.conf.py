@@ -0,0 +1,16 @@
+""" Gunicorn settings, read from the working directory (src/main, /translator in the image) on start. """
+import sys
+
+
+def post_worker_init(worker):
+    # Flask has no startup hook, so the job workers of the WSGI service are started in each worker once it loaded the
+    # app; the aiohttp service starts them itself on startup.
+    service = sys.modules.get("translator_service")
+    if service is not None:
+        service.start_job_workers()
+
+
+def worker_exit(server, worker):
+    service = sys.modules.get("translator_service")
+    if service is not None:
+        service.stop_job_workers()
@@ -0,0 +1,40 @@
+""" Metrics of the translator, exported by the /metrics endpoint of the services. """
+
+from settings import settings
+from utils.metrics import MetricsRegistry, SIZE_BUCKETS
+
+registry = MetricsRegistry(settings.metrics_multiprocess_dir, settings.metrics_write_interval_seconds)
+
+request_duration = registry.histogram("translator_request_duration_seconds",
+                                      "Time until a request was answered (for streams, until the response started).",
+                                      ["endpoint", "method", "status"])
+
+model_inference_duration = registry.histogram("translator_model_inference_duration_seconds",
+                                              "Time a model took to translate a batch.",
+                                              ["model", "source_language", "target_language"])
+batch_size = registry.histogram("translator_batch_size_segments", "Number of segments a model translated in one batch.",
+                                ["model", "source_language", "target_language"], buckets=SIZE_BUCKETS)
+batch_queue_depth = registry.gauge("translator_batch_queue_depth_segments", "Number of segments queued for a batch.",
+                                   ["model", "source_language", "target_language", "priority"])
+model_load_duration = registry.gauge("translator_model_load_duration_seconds", "Time it took to load a model.", ["model"],
+                                     multiprocess_mode="max")
+
+rate_limit_rejections = registry.counter("translator_rate_limit_rejections_total",
+                                         "Requests rejected as the rate limit capacity did not become available in time.", ["priority"])
+rate_limit_waiting = registry.gauge("translator_rate_limit_waiting_requests", "Requests waiting for rate limit capacity.", ["priority"])
+
+cache_lookups = registry.counter("translator_cache_lookups_total", "Lookups of translations in a cache by result, hit or miss.",
+                                 ["cache", "result"])
+
+proxy_client_request_duration = registry.histogram("translator_proxy_client_request_duration_seconds",
+                                                   "Time until a translator client answered a request, by model or 'detection'.",
+                                                   ["client", "kind"])
+proxy_client_errors = registry.counter("translator_proxy_client_errors_total",
+                                       "Requests to a translator client that failed, by reason: 'failed' or the HTTP status of its answer.",
+                                       ["client", "kind", "reason"])
+proxy_circuit_transitions = registry.counter("translator_proxy_circuit_transitions_total",
+                                             "State transitions of the circuit breaker of a translator client.",
+                                             ["client", "from_state", "to_state"])
+proxy_circuit_state = registry.gauge("translator_proxy_circuit_state",
+                                     "State of the circuit breaker of a translator client: 1 for its current state, 0 otherwise.",
+                                     ["client", "state"])
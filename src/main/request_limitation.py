@@ -1,58 +1,321 @@
-import os
+import asyncio
+import concurrent.futures
+import functools
 import logging
+import math
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from typing import Dict, List, Mapping, NamedTuple, Optional, Set, Union
+
 import redis
-from contextlib import contextmanager
 
-request_key = 'current_number_of_concurrent_requests'
+from constants import PriorityClass
+from instrumentation import rate_limit_rejections, rate_limit_waiting
+from settings import settings
+from utils.priority import current_priority
+from utils.weighted_fair_queue import WeightedFairQueue
+
 _logger = logging.getLogger(__name__)
 
+leases_key = 'translator:request_leases'
+
+# Leases are the members of a sorted set, "<id>:<priority class>:<cost>", scored by their expiry in milliseconds of the
+# Redis server time, so that the clocks of the replicas do not matter. The set itself expires once no lease has been
+# acquired or renewed for a TTL.
+
+# KEYS[1]: leases; ARGV: lease, capacity, TTL in milliseconds, cost of the lease, priority class, capacity of the class
+# Returns 1 if the lease was acquired, 0 if the capacity is exhausted and -1 if the capacity of the class is exhausted
+_ACQUIRE_LEASE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local used = 0
+local used_by_class = 0
+for _, lease in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+    local priority, cost = string.match(lease, ':(%u+):(%d+)$')
+    used = used + tonumber(cost)
+    if priority == ARGV[5] then
+        used_by_class = used_by_class + tonumber(cost)
+    end
+end
+if used + tonumber(ARGV[4]) > tonumber(ARGV[2]) then
+    return 0
+end
+if used_by_class + tonumber(ARGV[4]) > tonumber(ARGV[6]) then
+    return -1
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+# KEYS[1]: leases; ARGV: TTL in milliseconds, lease ids; leases that have already expired are removed, not renewed
+_RENEW_LEASES_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local expiry = now + tonumber(ARGV[1])
+for i = 2, #ARGV do
+    redis.call('ZADD', KEYS[1], 'XX', expiry, ARGV[i])
+end
+redis.call('PEXPIRE', KEYS[1], ARGV[1])
+return #ARGV - 1
+"""
+
+_ACQUIRED = 1
+_CAPACITY_EXHAUSTED = 0
+_CLASS_CAPACITY_EXHAUSTED = -1
+
+# waiting requests are admitted as soon as a request of this process ends; capacity released by other workers is polled
+_QUEUE_POLL_INTERVAL_SECONDS = 0.02
+
+
+def estimate_cost(texts: List[str]) -> int:
+    """ Estimates the cost of translating (or detecting the language of) the texts before any work is done.
+
+    A request costs one unit per `rate_limit_characters_per_cost_unit` characters, where each text counts
+    `rate_limit_text_cost_characters` characters in addition to its length; but at least one unit. Invalid texts are
+    left to the translator to reject.
+    """
+    if settings.rate_limit_characters_per_cost_unit <= 0:
+        return 1
+    characters = sum(len(text) for text in texts if isinstance(text, str)) + len(texts) * settings.rate_limit_text_cost_characters
+    return max(1, math.ceil(characters / settings.rate_limit_characters_per_cost_unit))
+
+
+class _Lease(NamedTuple):
+    member: Optional[str]
+    """ Member of the leases in Redis; None for a share of the in-process capacity. """
+    cost: int
+    priority: PriorityClass
+
+
+class _Waiter:
+    __slots__ = ("cost", "priority", "lease")
+
+    def __init__(self, cost: int, priority: PriorityClass):
+        self.cost = cost
+        self.priority = priority
+        self.lease: Optional[_Lease] = None
+
 
 class RequestLimiter:
+    """ Limits the total cost of concurrently processed requests to a capacity.
+
+    With Redis, the capacity is shared by all workers and replicas using the Redis instance: each request holds a lease
+    of its cost, which is acquired by one atomic server-side script and released with one ZREM. Leases of running
+    requests are renewed in the background, so that the capacity held by a crashed worker is released once its leases
+    have expired. Without Redis, or while Redis is unavailable, the requests of this process only are limited.
+
+    The requests of each priority class may only take the share of the capacity of their class. Requests that do not
+    fit wait up to the queue timeout of their class and are admitted from weighted-fair queues, so that waiting bulk
+    requests cannot delay interactive ones.
+    """
+
     class RequestLimitation:
 
-        def __init__(self, request_limiter):
+        def __init__(self, request_limiter, cost: int, priority: PriorityClass):
             self._request_limiter = request_limiter
+            self._cost = cost
+            self._priority = priority
+            self._lease: Optional[_Lease] = None
 
         def __enter__(self):
-            self._request_limiter.new_request()
+            self._lease = self._request_limiter.new_request(self._cost, self._priority)
 
         def __exit__(self, exc_type, exc_val, exc_tb):
-            self._request_limiter.end_request()
+            self._request_limiter.end_request(self._lease)
 
-    def __init__(self, max_number_of_concurrent_requests: int):
-        redis_host = os.getenv('REDIS_HOST', 'localhost')
-        self._redis = redis.Redis(host=redis_host, port=6379, db=0)
-        self._redis.set(request_key, 0)
+        async def __aenter__(self):
+            # acquiring calls Redis and may wait in the queue, which must not block the event loop; the queue timeout
+            # counts from now, even if all admission threads are busy
+            self._lease = await asyncio.get_running_loop().run_in_executor(
+                self._request_limiter._admission_executor,
+                functools.partial(self._request_limiter.new_request, self._cost, self._priority, queued_at=time.monotonic()))
+
+        async def __aexit__(self, exc_type, exc_val, exc_tb):
+            # releasing calls Redis and admits waiting requests
+            await asyncio.get_running_loop().run_in_executor(None, self._request_limiter.end_request, self._lease)
+
+    def __init__(self, max_number_of_concurrent_requests: int, redis_client: Optional[redis.Redis] = None,
+                 lease_ttl_seconds: Optional[float] = None, capacity_shares: Optional[Mapping[PriorityClass, float]] = None,
+                 queue_timeouts_seconds: Optional[Mapping[PriorityClass, float]] = None,
+                 weights: Optional[Mapping[PriorityClass, float]] = None):
+        """
+        :param max_number_of_concurrent_requests: Capacity, i.e. maximum total cost of the requests processed at the same time
+        :param redis_client: Redis to share the limit in; created from the settings if omitted and
+         `rate_limit_redis_enabled`, otherwise requests are limited per process
+        :param lease_ttl_seconds: Time after which the lease of a request expires unless renewed; from the settings if omitted
+        :param capacity_shares: Share of the capacity per priority class; from the settings if omitted
+        :param queue_timeouts_seconds: Time a request waits for capacity per priority class; from the settings if omitted
+        :param weights: Weights of the priority classes when admitting waiting requests; from the settings if omitted
+        """
         self._max_number_of_concurrent_requests = max_number_of_concurrent_requests
+        capacity_shares = capacity_shares if capacity_shares is not None else settings.priority_capacity_shares
+        self._class_capacities: Dict[PriorityClass, int] = {
+            priority: max(1, min(max_number_of_concurrent_requests, math.floor(capacity_shares.get(priority, 1.0) * max_number_of_concurrent_requests)))
+            for priority in PriorityClass}
+        self._queue_timeouts = queue_timeouts_seconds if queue_timeouts_seconds is not None else settings.priority_queue_timeouts_seconds
+        self._local_used = 0
+        self._local_used_by_class: Dict[PriorityClass, int] = {priority: 0 for priority in PriorityClass}
+        self._local_lock = threading.Lock()
+        self._waiting: WeightedFairQueue[_Waiter] = WeightedFairQueue(weights if weights is not None else settings.priority_weights)
+        self._waiting_condition = threading.Condition()
+        rate_limit_waiting.set_callback(lambda: {(priority,): self._waiting.depth(priority) for priority in PriorityClass})
+        if redis_client is None and settings.rate_limit_redis_enabled:
+            redis_client = redis.Redis(connection_pool=redis.ConnectionPool(host=settings.redis_host, port=settings.redis_port, db=0))
+        self._redis = redis_client
+        self._lease_ttl_ms = int((lease_ttl_seconds if lease_ttl_seconds is not None else settings.rate_limit_lease_ttl_seconds) * 1000)
+        self._active_leases: Set[str] = set()
+        self._active_leases_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.rejected = 0
+        # asynchronous requests wait for capacity in their own threads, not in those of the default executor of the event loop
+        self._admission_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, settings.rate_limit_admission_threads),
+                                                                         thread_name_prefix="request-admission")
+        if self._redis is not None:
+            self._acquire_lease = self._redis.register_script(_ACQUIRE_LEASE_SCRIPT)
+            self._renew_leases = self._redis.register_script(_RENEW_LEASES_SCRIPT)
+            threading.Thread(target=self._renew_leases_periodically, name="request-lease-renewal", daemon=True).start()
+
+    def limited_requests(self, cost: int = 1, priority: Optional[PriorityClass] = None):
+        """ Context (synchronous or asynchronous) to process a request in; the request is of the current priority class if omitted. """
+        return RequestLimiter.RequestLimitation(self, cost, priority or current_priority.get())
+
+    def new_request(self, cost: int = 1, priority: PriorityClass = PriorityClass.interactive, queued_at: Optional[float] = None) -> _Lease:
+        """ Takes a share of the capacity for a new request, waiting up to the queue timeout of its priority class.
 
-    def limited_requests(self):
-        return RequestLimiter.RequestLimitation(self)
+        :param cost: Estimated cost of the request; a request costing more than the capacity of its class is only
+         admitted while no other request of its class is in progress
+        :param priority: Priority class of the request
+        :param queued_at: Monotonic time the request arrived, from which the queue timeout counts; now if omitted
+        :return: The lease of the share, to be passed to end_request
+        :raises RequestLimitExceededException: If the capacity did not become available in time
+        """
+        cost = max(1, min(cost, self._class_capacities[priority]))
+        timeout = self._queue_timeouts.get(priority, 0.0)
+        # the queue is checked and the capacity taken under the lock of the queue, so that no request overtakes waiting ones
+        with self._waiting_condition:
+            if not len(self._waiting):
+                result = self._try_acquire(cost, priority)
+                if isinstance(result, _Lease):
+                    return result
+            if timeout <= 0:
+                raise self._reject(cost, priority)
+            return self._wait_for_capacity(_Waiter(cost, priority), (queued_at if queued_at is not None else time.monotonic()) + timeout)
 
-    def new_request(self):
-        if (request_value := int(self.read_redis_key(request_key))) > self._max_number_of_concurrent_requests:
-            _logger.debug(f"Raise RequestLimitExceededException as key value is {request_value}")
-            raise RequestLimitExceededException()
-        _logger.debug(f"Increasing request value (read value is {request_value}).")
-        self._redis.incr(request_key)
+    def _wait_for_capacity(self, waiter: _Waiter, deadline: float) -> _Lease:
+        with self._waiting_condition:
+            self._waiting.push(waiter.priority, waiter)
+            try:
+                while True:
+                    self._admit_waiting()
+                    if waiter.lease is not None:
+                        return waiter.lease
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject(waiter.cost, waiter.priority)
+                    # the next waiter to be admitted polls for capacity released by other workers, all others are woken on admission
+                    next_waiter = self._waiting.peek()
+                    polling = next_waiter is not None and next_waiter[1] is waiter
+                    self._waiting_condition.wait(min(remaining, _QUEUE_POLL_INTERVAL_SECONDS) if polling else remaining)
+            finally:
+                if waiter.lease is None:
+                    self._waiting.remove(waiter.priority, waiter)
+                    self._waiting_condition.notify_all()
 
-    def end_request(self):
-        if (request_value := int(self.read_redis_key(request_key))) > 0:
-            _logger.debug(f"Decreasing request value (read value is {request_value}).")
-            self._redis.decr(request_key)
+    def _admit_waiting(self):
+        """ Admits waiting requests in weighted-fair order while there is capacity. Must be called while holding the waiting condition. """
+        admitted = False
+        while self._admit_next_waiting():
+            admitted = True
+        if admitted:
+            self._waiting_condition.notify_all()
+
+    def _admit_next_waiting(self) -> bool:
+        for priority, waiter in self._waiting.heads():
+            result = self._try_acquire(waiter.cost, priority)
+            if isinstance(result, _Lease):
+                waiter.lease = result
+                self._waiting.pop(priority, waiter.cost)
+                return True
+            if result == _CAPACITY_EXHAUSTED:
+                # a class that is served later must not overtake this one; only a class at its own share is skipped
+                return False
+        return False
+
+    def _try_acquire(self, cost: int, priority: PriorityClass) -> Union[_Lease, int]:
+        """ The lease, if the capacity allows, otherwise _CAPACITY_EXHAUSTED or _CLASS_CAPACITY_EXHAUSTED. """
+        if self._redis is not None:
+            member = f"{uuid.uuid4().hex}:{priority.value}:{cost}"
+            try:
+                result = self._acquire_lease(keys=[leases_key], args=[member, self._max_number_of_concurrent_requests, self._lease_ttl_ms,
+                                                                      cost, priority.value, self._class_capacities[priority]])
+            except redis.RedisError as e:
+                _logger.warning(f"Redis unavailable, limiting the requests of this process only: {type(e).__name__} - {e}")
+            else:
+                if result != _ACQUIRED:
+                    return result
+                with self._active_leases_lock:
+                    self._active_leases.add(member)
+                return _Lease(member, cost, priority)
+        with self._local_lock:
+            if self._local_used + cost > self._max_number_of_concurrent_requests:
+                return _CAPACITY_EXHAUSTED
+            if self._local_used_by_class[priority] + cost > self._class_capacities[priority]:
+                return _CLASS_CAPACITY_EXHAUSTED
+            self._local_used += cost
+            self._local_used_by_class[priority] += cost
+        return _Lease(None, cost, priority)
+
+    def _reject(self, cost: int, priority: PriorityClass) -> "RequestLimitExceededException":
+        self.rejected += 1
+        rate_limit_rejections.labels(priority).inc()
+        _logger.debug(f"Raise RequestLimitExceededException as a {priority.value} request of cost {cost} exceeds the remaining capacity")
+        return RequestLimitExceededException()
+
+    def end_request(self, lease: _Lease):
+        """ Releases the share of the capacity of a request, given the lease returned by new_request. """
+        if lease.member is None:
+            with self._local_lock:
+                self._local_used -= lease.cost
+                self._local_used_by_class[lease.priority] -= lease.cost
         else:
-            _logger.debug(f"Request ended but read value is {request_value}.")
+            with self._active_leases_lock:
+                self._active_leases.discard(lease.member)
+            try:
+                self._redis.zrem(leases_key, lease.member)
+            except redis.RedisError as e:
+                _logger.warning(f"Failed to release request lease, it expires in {self._lease_ttl_ms} ms: {type(e).__name__} - {e}")
+        if len(self._waiting):
+            with self._waiting_condition:
+                self._admit_waiting()
 
-    def read_redis_key(self, redis_key: str):
-        if self._redis.get(redis_key) is None:
-            self._redis.set(redis_key, 0)
-            _logger.info("Redis corrupted the number of requests.. again!")
-        return self._redis.get(redis_key)
+    def renew_leases(self):
+        """ Extends the leases of all requests in progress by the lease TTL, with one call to Redis. """
+        with self._active_leases_lock:
+            leases = list(self._active_leases)
+        if not leases:
+            return
+        try:
+            self._renew_leases(keys=[leases_key], args=[self._lease_ttl_ms, *leases])
+        except redis.RedisError as e:
+            _logger.warning(f"Failed to renew {len(leases)} request leases: {type(e).__name__} - {e}")
 
+    def _renew_leases_periodically(self):
+        while not self._stopped.wait(self._lease_ttl_ms / 3000.0):
+            self.renew_leases()
+
+    def close(self):
+        """ Stops renewing leases. """
+        self._stopped.set()
+        self._admission_executor.shutdown(wait=False)
 
     @staticmethod
-    @contextmanager
-    def no_limit_context():
-        yield
+    def no_limit_context(cost: int = 1, priority: Optional[PriorityClass] = None):
+        return nullcontext()
 
 class RequestLimitExceededException(Exception):
     """Raised when the max number of requests is exceeded"""
@@ -60,5 +323,3 @@ class RequestLimitExceededException(Exception):
     def __init__(self):
         self.message = 'Request limit exceeded'
         Exception.__init__(self)
-
-
@@ -0,0 +1,140 @@
+""" Request handling shared by translator_service (Flask) and translator_async_service (aiohttp): parsing of the
+request bodies and parameters, the response bodies and the mapping of exceptions to error responses. The services only
+adapt these to their framework. """
+
+import json
+import logging
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple, Type
+
+from constants import PriorityClass
+from request_limitation import RequestLimitExceededException
+from settings import settings
+from translator import UnexpectedTranslationError, UnsupportedTranslationInputException, TranslatorNotReadyException
+from translation_jobs import InvalidJobException, JobNotFoundException, job_file_format, job_items_from_file, \
+    job_items_from_texts
+from translator_proxy_client import ForwardedTranslatorProxyError
+from utils.batch_scheduler import BatchQueueFullException
+from utils.priority import PRIORITY_HEADER, InvalidPriorityException, parse_priority
+
+_logger = logging.getLogger(__name__)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+class MissingArgumentError(Exception):
+    pass
+
+
+class TranslationRequest(NamedTuple):
+    texts: List[str]
+    target_language: str
+    source_language: Optional[str]
+
+
+class ErrorResponse(NamedTuple):
+    status: int
+    body: Dict[str, Any]
+    headers: Dict[str, str]
+
+
+def request_priority(headers: Mapping[str, str], default: PriorityClass) -> PriorityClass:
+    """ Priority class from the priority header of the request, or the default of the endpoint. """
+    return parse_priority(headers.get(PRIORITY_HEADER), default)
+
+
+def _required(body: Any, name: str) -> Any:
+    if not isinstance(body, dict) or name not in body:
+        raise MissingArgumentError(f"Missing parameter '{name}'")
+    return body[name]
+
+
+def translation_request(body: Any) -> TranslationRequest:
+    return TranslationRequest(_required(body, 'texts'), _required(body, 'targetLanguage'), body.get('sourceLanguage'))
+
+
+def detection_text(body: Any) -> str:
+    return _required(body, 'text')
+
+
+def base_language(body: Any) -> str:
+    return _required(body, 'baseLanguage')
+
+
+def job_items_from_json(body: Any) -> List[Dict[str, Any]]:
+    if not isinstance(body, dict):
+        raise InvalidJobException("Expected a JSON object")
+    return job_items_from_texts(body.get('texts'), body.get('targetLanguage'), body.get('sourceLanguage'))
+
+
+def job_items_from_upload(content: bytes, mimetype: Optional[str], filename: Optional[str],
+                          target_language: Optional[str], source_language: Optional[str]) -> List[Dict[str, Any]]:
+    """ Job items of a CSV or JSONL file uploaded as form field or as the request body. """
+    return job_items_from_file(content, job_file_format(mimetype, filename), target_language, source_language)
+
+
+def job_location(job: Dict[str, Any]) -> Dict[str, str]:
+    return {'Location': f"/jobs/{job['jobId']}"}
+
+
+def results_page(offset: Optional[str], limit: Optional[str]) -> Tuple[int, int]:
+    """ The offset and the limit of a page of job results from the query parameters, bounded by the page size. """
+    try:
+        offset = max(0, int(offset if offset is not None else 0))
+        limit = int(limit if limit is not None else settings.job_results_page_size)
+    except ValueError:
+        raise InvalidJobException("Parameters 'offset' and 'limit' must be integers")
+    return offset, min(max(1, limit), settings.job_results_page_size)
+
+
+def health_body(models_loaded: bool) -> Dict[str, Any]:
+    return {"healthy": True, "serviceAvailable": models_loaded}
+
+
+def translation_record(index: int, text: str) -> str:
+    return json.dumps({"index": index, "text": text}) + "\n"
+
+
+def error_record(e: Exception) -> str:
+    """ Ends a stream of translation records; as the status has already been sent, the error is sent as a record. """
+    _logger.error(f"Streaming translations failed with '{e}'")
+    return json.dumps({"error": getattr(e, "message", str(e))}) + "\n"
+
+
+def _unexpected_translation_error(e: UnexpectedTranslationError) -> ErrorResponse:
+    _logger.error(f"Handling UnexpectedTranslationError '{e}'; returning 500")
+    return ErrorResponse(500, {"error": e.message}, {})
+
+
+def _unavailable(e: Exception) -> ErrorResponse:
+    _logger.debug(f"Handling {type(e).__name__} '{e}'; return 503")
+    return ErrorResponse(503, {"error": e.message}, {'Retry-After': '5'})
+
+
+def _forwarded_error(e: ForwardedTranslatorProxyError) -> ErrorResponse:
+    _logger.debug(f"Handling forwarded ForwardedTranslatorProxyError '{e}'; return {e.status_code}")
+    return ErrorResponse(e.status_code, {"error": e.error}, {'Retry-After': '5'})
+
+
+_ERROR_RESPONSES = {
+    UnexpectedTranslationError: _unexpected_translation_error,
+    UnsupportedTranslationInputException: lambda e: ErrorResponse(400, {"error": str(e)}, {}),
+    MissingArgumentError: lambda e: ErrorResponse(400, {"error": str(e)}, {}),
+    json.JSONDecodeError: lambda e: ErrorResponse(400, {"error": f"Failed to decode JSON object: {e}"}, {}),
+    InvalidJobException: lambda e: ErrorResponse(400, {"error": e.message}, {}),
+    JobNotFoundException: lambda e: ErrorResponse(404, {"error": e.message}, {}),
+    InvalidPriorityException: lambda e: ErrorResponse(400, {"error": e.message}, {}),
+    RequestLimitExceededException: _unavailable,
+    BatchQueueFullException: _unavailable,
+    TranslatorNotReadyException: _unavailable,
+    ForwardedTranslatorProxyError: _forwarded_error,
+}
+
+HANDLED_EXCEPTIONS: Tuple[Type[Exception], ...] = tuple(_ERROR_RESPONSES)
+
+
+def error_response(e: Exception) -> Optional[ErrorResponse]:
+    """ The error response for the most specific handled class of the exception, or None if it is not handled. """
+    for exception_class in type(e).__mro__:
+        if exception_class in _ERROR_RESPONSES:
+            return _ERROR_RESPONSES[exception_class](e)
+    return None
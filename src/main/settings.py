@@ -1,19 +1,148 @@
-from typing import  Union, List
+from typing import  Union, List, Dict, Optional
 
 from pydantic import BaseSettings, Field, root_validator
 
-from constants import TranslatorMode
+from constants import TranslatorMode, BalancingPolicy, PriorityClass
 from translator_models.translator_model import TranslatorModelName
 
 
 class TranslatorSettings(BaseSettings):
     preload_models: bool = Field(default=False, env="TRANSLATOR_PRELOAD_MODELS")
-    rate_limit: int = Field(default=3, env="TRANSLATOR_RATE_LIMIT", description="Set <=0 to disable rate limiting.")
+    rate_limit: int = Field(default=3, env="TRANSLATOR_RATE_LIMIT",
+                            description="Capacity in cost units, i.e. number of concurrent small requests. Set <=0 to disable rate limiting.")
+    rate_limit_characters_per_cost_unit: int = Field(default=2000, env="TRANSLATOR_RATE_LIMIT_CHARACTERS_PER_COST_UNIT",
+                                                     description="Characters of a request that cost one unit of the rate limit capacity. Set <=0 to let every request cost one unit.")
+    rate_limit_text_cost_characters: int = Field(default=100, env="TRANSLATOR_RATE_LIMIT_TEXT_COST_CHARACTERS",
+                                                 description="Characters each text of a request counts in addition to its length, for the overhead per text.")
+    rate_limit_redis_enabled: bool = Field(default=True, env="TRANSLATOR_RATE_LIMIT_REDIS_ENABLED",
+                                           description="Share the rate limit between all workers and replicas via Redis; otherwise each process limits its own requests.")
+    rate_limit_lease_ttl_seconds: float = Field(default=30, env="TRANSLATOR_RATE_LIMIT_LEASE_TTL_SECONDS",
+                                                description="Time after which the slot of a request is released if its worker stopped renewing it, e.g. because it crashed.")
+    priority_capacity_shares: Dict[PriorityClass, float] = Field(default={PriorityClass.interactive: 1.0, PriorityClass.bulk: 0.5},
+                                                                 env="TRANSLATOR_PRIORITY_CAPACITY_SHARES",
+                                                                 description="Share of the rate limit capacity the requests of each priority class may take together, "
+                                                                             "so that bulk requests leave capacity for interactive ones.")
+    priority_queue_timeouts_seconds: Dict[PriorityClass, float] = Field(default={PriorityClass.interactive: 1.0, PriorityClass.bulk: 30.0},
+                                                                        env="TRANSLATOR_PRIORITY_QUEUE_TIMEOUTS_SECONDS",
+                                                                        description="Time a request of each priority class waits for capacity before it is "
+                                                                                    "rejected. Set <=0 to reject requests right away.")
+    rate_limit_admission_threads: int = Field(default=64, env="TRANSLATOR_RATE_LIMIT_ADMISSION_THREADS",
+                                              description="Threads of translator_async_service in which requests wait for capacity, i.e. the maximum "
+                                                          "number of requests waiting at the same time; others are rejected once their queue timeout passed.")
+    priority_weights: Dict[PriorityClass, float] = Field(default={PriorityClass.interactive: 4.0, PriorityClass.bulk: 1.0},
+                                                         env="TRANSLATOR_PRIORITY_WEIGHTS",
+                                                         description="Relative share of each priority class when waiting requests are admitted and when "
+                                                                     "queued segments are collected into batches.")
     log_level: Union[str, int] =  Field(default="INFO", env="LOGLEVEL")
     models: List[TranslatorModelName] = Field(default=["nlb-200"], env="TRANSLATOR_MODELS")
     mode: TranslatorMode = Field(default=TranslatorMode.client, env="TRANSLATOR_MODE")
     translator_clients: List[str] = Field(default_factory=list)
     dns_namespace: str = Field(default="translator")
+    async_inference_threads: int = Field(default=8, env="TRANSLATOR_ASYNC_INFERENCE_THREADS",
+                                         description="Threads translating in client mode when served by translator_async_service.")
+    async_max_request_bytes: int = Field(default=256 * 1024 * 1024, env="TRANSLATOR_ASYNC_MAX_REQUEST_BYTES",
+                                         description="Maximum size of a request body, e.g. of an uploaded job file, when served by translator_async_service.")
+    stream_chunk_size: int = Field(default=16, env="TRANSLATOR_STREAM_CHUNK_SIZE",
+                                   description="Number of texts translated together before their translations are streamed. Set <=0 to translate all texts at once.")
+    proxy_batch_max_size: int = Field(default=256, env="TRANSLATOR_PROXY_BATCH_MAX_SIZE",
+                                      description="Maximum number of texts forwarded to a translator client in one request. Set <=0 for no limit.")
+    proxy_detection_max_concurrency: int = Field(default=16, env="TRANSLATOR_PROXY_DETECTION_MAX_CONCURRENCY",
+                                                 description="Maximum number of concurrent language detections sent to translator clients for the texts of one batch. Set <=0 for no limit.")
+    proxy_balancing_policy: BalancingPolicy = Field(default=BalancingPolicy.ewma, env="TRANSLATOR_PROXY_BALANCING_POLICY",
+                                                    description="How a translator client is chosen for a request: RANDOM, LEAST_OUTSTANDING or EWMA.")
+    proxy_ewma_decay_seconds: float = Field(default=10, env="TRANSLATOR_PROXY_EWMA_DECAY_SECONDS",
+                                            description="Time after which the latency measured for a translator client has lost most of its weight.")
+    proxy_hedging_enabled: bool = Field(default=False, env="TRANSLATOR_PROXY_HEDGING_ENABLED",
+                                        description="Send slow requests to a second translator client as well and use the first answer.")
+    proxy_hedging_percentile: float = Field(default=95, env="TRANSLATOR_PROXY_HEDGING_PERCENTILE",
+                                            description="Percentile of recent latencies after which a request is hedged.")
+    proxy_hedging_min_delay_ms: float = Field(default=20, env="TRANSLATOR_PROXY_HEDGING_MIN_DELAY_MS",
+                                              description="Minimum time before a request is hedged.")
+    proxy_hedging_budget_ratio: float = Field(default=0.05, env="TRANSLATOR_PROXY_HEDGING_BUDGET_RATIO",
+                                              description="Maximum number of hedges as fraction of all requests.")
+    proxy_circuit_failure_rate_threshold: float = Field(default=0.5, env="TRANSLATOR_PROXY_CIRCUIT_FAILURE_RATE_THRESHOLD",
+                                                        description="Failure rate of recent requests at which the circuit of a translator client opens.")
+    proxy_circuit_minimum_requests: int = Field(default=5, env="TRANSLATOR_PROXY_CIRCUIT_MINIMUM_REQUESTS",
+                                                description="Minimum number of recent requests before the circuit of a translator client can open.")
+    proxy_circuit_window_size: int = Field(default=20, env="TRANSLATOR_PROXY_CIRCUIT_WINDOW_SIZE",
+                                           description="Number of recent requests the failure rate of a translator client is computed from.")
+    proxy_circuit_open_seconds: float = Field(default=1, env="TRANSLATOR_PROXY_CIRCUIT_OPEN_SECONDS",
+                                              description="Time the circuit of a translator client stays open at first; doubles with each consecutive opening.")
+    proxy_circuit_max_open_seconds: float = Field(default=60, env="TRANSLATOR_PROXY_CIRCUIT_MAX_OPEN_SECONDS")
+    proxy_health_interval_seconds: float = Field(default=5, env="TRANSLATOR_PROXY_HEALTH_INTERVAL_SECONDS",
+                                                 description="Time between health checks of each translator client.")
+    proxy_health_max_backoff_seconds: float = Field(default=60, env="TRANSLATOR_PROXY_HEALTH_MAX_BACKOFF_SECONDS",
+                                                    description="Maximum time between health checks of a translator client whose checks fail.")
+    proxy_health_stale_after_seconds: float = Field(default=30, env="TRANSLATOR_PROXY_HEALTH_STALE_AFTER_SECONDS",
+                                                    description="Time after the last successful health check a translator client counts as unavailable.")
+    proxy_dns_min_ttl_seconds: float = Field(default=5, env="TRANSLATOR_PROXY_DNS_MIN_TTL_SECONDS",
+                                             description="Minimum time SRV records of translator clients are cached, regardless of their TTL.")
+    proxy_dns_max_ttl_seconds: float = Field(default=300, env="TRANSLATOR_PROXY_DNS_MAX_TTL_SECONDS",
+                                             description="Maximum time SRV records of translator clients are cached, regardless of their TTL.")
+    proxy_connection_limit: int = Field(default=100, env="TRANSLATOR_PROXY_CONNECTION_LIMIT",
+                                        description="Maximum number of open connections per translator client. Set 0 for no limit.")
+    proxy_connection_limit_per_host: int = Field(default=0, env="TRANSLATOR_PROXY_CONNECTION_LIMIT_PER_HOST",
+                                                 description="Maximum number of open connections per translator client host. Set 0 for no limit.")
+    proxy_keepalive_timeout_seconds: float = Field(default=60, env="TRANSLATOR_PROXY_KEEPALIVE_TIMEOUT_SECONDS",
+                                                   description="Time idle connections to translator clients are kept open.")
+    proxy_connect_timeout_seconds: float = Field(default=5, env="TRANSLATOR_PROXY_CONNECT_TIMEOUT_SECONDS")
+    proxy_request_timeout_seconds: float = Field(default=600, env="TRANSLATOR_PROXY_REQUEST_TIMEOUT_SECONDS")
+    translation_cache_max_bytes: int = Field(default=64 * 1024 * 1024, env="TRANSLATOR_CACHE_MAX_BYTES",
+                                             description="Memory budget of the in-process translation cache. Set <=0 to disable caching.")
+    translation_cache_ttl_seconds: float = Field(default=24 * 60 * 60, env="TRANSLATOR_CACHE_TTL_SECONDS",
+                                                 description="Time after which cached translations expire.")
+    redis_host: str = Field(default="localhost", env="REDIS_HOST")
+    redis_port: int = Field(default=6379, env="REDIS_PORT")
+    shared_cache_enabled: bool = Field(default=False, env="TRANSLATOR_SHARED_CACHE_ENABLED",
+                                       description="Share translations between replicas via Redis.")
+    shared_cache_ttl_seconds: int = Field(default=7 * 24 * 60 * 60, env="TRANSLATOR_SHARED_CACHE_TTL_SECONDS")
+    shared_cache_timeout_ms: float = Field(default=50, env="TRANSLATOR_SHARED_CACHE_TIMEOUT_MS",
+                                           description="Redis socket timeout; slower lookups are treated as cache misses.")
+    shared_cache_compression_min_bytes: int = Field(default=512, env="TRANSLATOR_SHARED_CACHE_COMPRESSION_MIN_BYTES",
+                                                    description="Translations of at least this size are stored compressed. Set <=0 to disable compression.")
+    shared_cache_retry_after_seconds: float = Field(default=30, env="TRANSLATOR_SHARED_CACHE_RETRY_AFTER_SECONDS",
+                                                    description="Time the shared cache is bypassed after a Redis error.")
+    segment_max_tokens: int = Field(default=256, env="TRANSLATOR_SEGMENT_MAX_TOKENS",
+                                    description="Texts longer than this number of tokens (or the maximum input length of the model, if lower) are split into sentences "
+                                                "or chunks of at most this length, which are translated as one batch. Set <=0 to only split texts that exceed "
+                                                "the maximum input length of the model.")
+    batch_max_size: int = Field(default=32, env="TRANSLATOR_BATCH_MAX_SIZE",
+                                description="Maximum number of segments translated by a model in one call.")
+    batch_max_wait_ms: float = Field(default=10, env="TRANSLATOR_BATCH_MAX_WAIT_MS",
+                                     description="Time to wait for segments of concurrent requests before translating a batch that is not full.")
+    batch_max_tokens: Dict[TranslatorModelName, int] = Field(default_factory=dict, env="TRANSLATOR_BATCH_MAX_TOKENS",
+                                                             description="Token budget of a padded batch per model, e.g. {\"nlb-200\": 4096}; overrides the default "
+                                                                         "of models that batch texts by token length.")
+    batch_max_queue_depth: int = Field(default=1024, env="TRANSLATOR_BATCH_MAX_QUEUE_DEPTH",
+                                       description="Maximum number of segments queued per model and language pair; a request with more segments is only "
+                                                   "accepted while none are queued. Set <=0 for no limit.")
+
+    metrics_multiprocess_dir: Optional[str] = Field(default=None, env="TRANSLATOR_METRICS_MULTIPROCESS_DIR",
+                                                    description="Directory in which each worker process writes its metrics, so that /metrics of any worker "
+                                                                "exports those of all workers; to be emptied before starting. Unset for a single process.")
+    metrics_write_interval_seconds: float = Field(default=5, env="TRANSLATOR_METRICS_WRITE_INTERVAL_SECONDS",
+                                                  description="Interval in which each worker process writes its metrics to the multiprocess directory.")
+    tracing_sample_rate: float = Field(default=0.01, env="TRANSLATOR_TRACING_SAMPLE_RATE",
+                                       description="Fraction of requests whose stages are traced and returned in a Server-Timing header; requests "
+                                                   "continuing a sampled trace of a caller (traceparent header) are always traced. Set 0 to disable.")
+    tracing_log_enabled: bool = Field(default=False, env="TRANSLATOR_TRACING_LOG_ENABLED",
+                                      description="Log the spans of each traced request as JSON.")
+
+    job_queue_redis_enabled: bool = Field(default=True, env="TRANSLATOR_JOB_QUEUE_REDIS_ENABLED",
+                                          description="Keep translation jobs in Redis, shared by all workers and replicas and kept across restarts; "
+                                                      "otherwise each process keeps its own jobs in memory.")
+    job_workers: int = Field(default=1, env="TRANSLATOR_JOB_WORKERS",
+                             description="Number of threads per process translating the chunks of translation jobs. Set 0 to not process jobs in this process.")
+    job_chunk_size: int = Field(default=256, env="TRANSLATOR_JOB_CHUNK_SIZE",
+                                description="Number of texts of a job a worker translates at once.")
+    job_max_texts: int = Field(default=100000, env="TRANSLATOR_JOB_MAX_TEXTS",
+                               description="Maximum number of texts of a translation job.")
+    job_ttl_seconds: int = Field(default=7 * 24 * 3600, env="TRANSLATOR_JOB_TTL_SECONDS",
+                                 description="Time a translation job and its results are kept after it was submitted.")
+    job_chunk_lease_seconds: float = Field(default=600, env="TRANSLATOR_JOB_CHUNK_LEASE_SECONDS",
+                                           description="Time after which a chunk is translated again if its worker did not complete it, e.g. because it crashed.")
+    job_results_page_size: int = Field(default=1000, env="TRANSLATOR_JOB_RESULTS_PAGE_SIZE",
+                                       description="Maximum number of results returned by one request for the results of a job.")
 
     @root_validator()
     def assert_clients(cls, data):
@@ -0,0 +1,575 @@
+import csv
+import io
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Callable, ContextManager, Deque, Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+import redis
+
+from constants import JobStatus, PriorityClass
+from request_limitation import RequestLimitExceededException, estimate_cost
+from settings import settings
+from translator import TranslatorNotReadyException, UnexpectedTranslationError
+from translator_proxy_client import FailedTranslatorProxyRequest, ForwardedTranslatorProxyError
+from utils.batch_scheduler import BatchQueueFullException
+from utils.priority import priority_context
+
+_logger = logging.getLogger(__name__)
+
+queue_key = 'translator:jobs:queue'
+claimed_key = 'translator:jobs:claimed'
+
+# The chunks of a job are queued as "<job id>:<chunk index>". A worker claims a chunk by moving it into a sorted set
+# scored by the expiry of its lease, so that the chunk is claimed again if its worker crashed before completing it.
+
+# KEYS[1]: queue, KEYS[2]: claimed chunks; ARGV: lease in milliseconds
+_CLAIM_CHUNK_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local chunk = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now, 'LIMIT', 0, 1)[1]
+if not chunk then
+    chunk = redis.call('LPOP', KEYS[1])
+end
+if not chunk then
+    return false
+end
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[1]), chunk)
+return chunk
+"""
+
+# KEYS[1]: job, KEYS[2]: chunks of the job; ARGV: chunk index. Returns the texts of the chunk, or nothing if the job expired
+_START_CHUNK_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'status') == 'QUEUED' then
+    redis.call('HSET', KEYS[1], 'status', 'RUNNING')
+end
+return redis.call('HGET', KEYS[2], ARGV[1])
+"""
+
+# KEYS[1]: job, KEYS[2]: results of the job, KEYS[3]: claimed chunks, KEYS[4]: chunks of the job
+# ARGV: chunk index, results, claimed chunk, number of texts, number of failed texts
+# A chunk translated twice (as its lease expired) is only counted once.
+_COMPLETE_CHUNK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 and redis.call('HSETNX', KEYS[2], ARGV[1], ARGV[2]) == 1 then
+    local ttl = redis.call('PTTL', KEYS[1])
+    if ttl > 0 then
+        redis.call('PEXPIRE', KEYS[2], ttl)
+    end
+    redis.call('HINCRBY', KEYS[1], 'completed', ARGV[4])
+    redis.call('HINCRBY', KEYS[1], 'failed', ARGV[5])
+    if redis.call('HINCRBY', KEYS[1], 'completedChunks', 1) == tonumber(redis.call('HGET', KEYS[1], 'chunks')) then
+        redis.call('HSET', KEYS[1], 'status', 'COMPLETED')
+        redis.call('DEL', KEYS[4])
+    end
+end
+redis.call('ZREM', KEYS[3], ARGV[3])
+"""
+
+# KEYS[1]: queue, KEYS[2]: claimed chunks; ARGV: claimed chunk. Only requeued if its lease has not been taken over.
+_RELEASE_CHUNK_SCRIPT = """
+if redis.call('ZREM', KEYS[2], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+end
+"""
+
+# KEYS[1]: claimed chunks; ARGV: lease in milliseconds, claimed chunks; chunks no longer claimed are not claimed again
+_RENEW_CHUNKS_SCRIPT = """
+local time = redis.call('TIME')
+local expiry = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000) + tonumber(ARGV[1])
+for i = 2, #ARGV do
+    redis.call('ZADD', KEYS[1], 'XX', expiry, ARGV[i])
+end
+return #ARGV - 1
+"""
+
+_WORKER_POLL_INTERVAL_SECONDS = 0.5
+_WORKER_RETRY_DELAY_SECONDS = 5.0
+
+
+class JobItem(NamedTuple):
+    text: str
+    target_language: str
+    source_language: Optional[str] = None
+
+
+class ClaimedChunk(NamedTuple):
+    job_id: str
+    index: int
+    items: List[JobItem]
+
+
+class InvalidJobException(Exception):
+    """Raised when a translation job cannot be created from the given input"""
+
+    def __init__(self, message: str):
+        self.message = message
+        Exception.__init__(self, message)
+
+
+class JobNotFoundException(Exception):
+    """Raised for a translation job that does not exist (anymore)"""
+
+    def __init__(self, job_id: str):
+        self.message = f"Translation job '{job_id}' not found"
+        Exception.__init__(self, self.message)
+
+
+def job_items_from_texts(texts: Any, target_language: Optional[str], source_language: Optional[str] = None) -> List[JobItem]:
+    """ The items of a job translating all texts into the same target language. """
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        raise InvalidJobException("Parameter 'texts' must be a list of strings")
+    if not target_language:
+        raise InvalidJobException("Missing parameter 'targetLanguage'")
+    return [JobItem(text, target_language, source_language or None) for text in texts]
+
+
+def job_file_format(content_type: Optional[str], filename: Optional[str]) -> str:
+    """ 'csv' or 'jsonl', from the content type or else the extension of an uploaded file. """
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    filename = (filename or "").lower()
+    if content_type in ("text/csv", "application/csv") or filename.endswith(".csv"):
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/jsonl", "application/json-lines") or filename.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    raise InvalidJobException("Unsupported file format, expected CSV (text/csv) or JSONL (application/x-ndjson)")
+
+
+def job_items_from_file(content: Union[str, bytes], file_format: str, target_language: Optional[str] = None,
+                        source_language: Optional[str] = None) -> List[JobItem]:
+    """ The items of a job from an uploaded file.
+
+    CSV rows hold the text in the first and the target language in the last column, as in resources/test_texts.csv;
+    columns in between (e.g. reference translations) are ignored. Rows of a single column are translated into the
+    given target language. JSONL lines are objects {"text": ..., "targetLanguage": ..., "sourceLanguage": ...}, where
+    the languages default to the given ones. Files are expected to be UTF-8 encoded.
+    """
+    if isinstance(content, bytes):
+        try:
+            content = content.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise InvalidJobException("File is not UTF-8 encoded")
+    items = []
+    if file_format == "csv":
+        for line, row in enumerate(csv.reader(io.StringIO(content)), start=1):
+            if not row:
+                continue
+            row_target_language = row[-1].strip() if len(row) > 1 else target_language
+            if not row_target_language:
+                raise InvalidJobException(f"Missing target language in line {line}")
+            items.append(JobItem(row[0], row_target_language, source_language or None))
+    else:
+        for line, row in enumerate(content.splitlines(), start=1):
+            if not row.strip():
+                continue
+            try:
+                record = json.loads(row)
+            except ValueError:
+                raise InvalidJobException(f"Invalid JSON in line {line}")
+            if not isinstance(record, dict) or not isinstance(record.get("text"), str):
+                raise InvalidJobException(f"Missing text in line {line}")
+            row_target_language = record.get("targetLanguage") or target_language
+            if not row_target_language:
+                raise InvalidJobException(f"Missing target language in line {line}")
+            items.append(JobItem(record["text"], row_target_language, record.get("sourceLanguage") or source_language or None))
+    return items
+
+
+class JobStore(ABC):
+    """ Keeps translation jobs, split into chunks, with a queue of the chunks still to be translated. """
+
+    def __init__(self, chunk_size: int, ttl_seconds: float, max_texts: int):
+        self._chunk_size = max(1, chunk_size)
+        self._ttl_seconds = ttl_seconds
+        self._max_texts = max_texts
+
+    def create_job(self, items: List[JobItem]) -> Dict[str, Any]:
+        """ Stores the job and queues its chunks.
+
+        :return: The status of the job
+        """
+        if not items:
+            raise InvalidJobException("A translation job needs at least one text")
+        if 0 < self._max_texts < len(items):
+            raise InvalidJobException(f"A translation job may contain at most {self._max_texts} texts")
+        job_id = uuid.uuid4().hex
+        chunks = [items[i:i + self._chunk_size] for i in range(0, len(items), self._chunk_size)]
+        job = {"status": JobStatus.queued.value, "total": len(items), "completed": 0, "failed": 0, "chunks": len(chunks),
+               "completedChunks": 0, "chunkSize": self._chunk_size, "createdAt": time.time()}
+        self._create_job(job_id, job, chunks)
+        _logger.info(f"Created translation job {job_id} of {len(items)} texts in {len(chunks)} chunks")
+        return self._job_status(job_id, job)
+
+    @staticmethod
+    def _job_status(job_id: str, job: Dict[str, Any]) -> Dict[str, Any]:
+        return {"jobId": job_id, "status": job["status"], "total": int(job["total"]), "completed": int(job["completed"]),
+                "failed": int(job["failed"]), "createdAt": float(job["createdAt"])}
+
+    @staticmethod
+    def _page(job_id: str, job: Dict[str, Any], chunk_results: List[Optional[List[Dict[str, str]]]], first_chunk: int,
+              offset: int, limit: int) -> Dict[str, Any]:
+        """ The results from the offset up to the first chunk that has not been translated yet. """
+        chunk_size = int(job["chunkSize"])
+        results = []
+        for chunk_index, chunk in enumerate(chunk_results, start=first_chunk):
+            if chunk is None:
+                break
+            for i, result in enumerate(chunk, start=chunk_index * chunk_size):
+                if offset <= i < offset + limit:
+                    results.append({"index": i, **result})
+        return {"jobId": job_id, "status": job["status"], "offset": offset, "nextOffset": offset + len(results), "results": results}
+
+    def _chunk_range(self, job: Dict[str, Any], offset: int, limit: int) -> range:
+        chunk_size = int(job["chunkSize"])
+        return range(offset // chunk_size, min(int(job["chunks"]), math.ceil((offset + limit) / chunk_size)))
+
+    @abstractmethod
+    def _create_job(self, job_id: str, job: Dict[str, Any], chunks: List[List[JobItem]]):
+        pass
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        """ The status and progress of the job.
+
+        :raises JobNotFoundException: If the job does not exist or has expired
+        """
+
+    @abstractmethod
+    def get_results(self, job_id: str, offset: int, limit: int) -> Dict[str, Any]:
+        """ The results of the job from the offset on, as far as they are translated, at most limit.
+
+        :raises JobNotFoundException: If the job does not exist or has expired
+        """
+
+    @abstractmethod
+    def claim_chunk(self) -> Optional[ClaimedChunk]:
+        """ Takes the next chunk to be translated from the queue, if there is one. """
+
+    @abstractmethod
+    def complete_chunk(self, chunk: ClaimedChunk, results: List[Dict[str, str]]):
+        """ Stores the results of the chunk, {"text": ...} or {"error": ...} for each of its texts. """
+
+    @abstractmethod
+    def release_chunk(self, chunk: ClaimedChunk):
+        """ Returns the chunk to the queue, to be translated later. """
+
+    @property
+    def chunk_lease_seconds(self) -> Optional[float]:
+        """ Time after which a claimed chunk is claimed again unless its lease is renewed, None if claims do not expire. """
+        return None
+
+    def renew_chunks(self, chunks: List[ClaimedChunk]):
+        """ Extends the leases of the claimed chunks, so that they are not claimed again while being translated. """
+
+
+class RedisJobStore(JobStore):
+    """ Jobs in Redis, shared by all workers and replicas. Chunks are claimed with a lease, so that the chunks of a
+    crashed worker are translated by another one and the progress of a job survives restarts. """
+
+    def __init__(self, redis_client: redis.Redis, chunk_size: int, ttl_seconds: float, max_texts: int, chunk_lease_seconds: float):
+        super().__init__(chunk_size, ttl_seconds, max_texts)
+        self._redis = redis_client
+        self._chunk_lease_ms = int(chunk_lease_seconds * 1000)
+        self._claim_chunk = self._redis.register_script(_CLAIM_CHUNK_SCRIPT)
+        self._start_chunk = self._redis.register_script(_START_CHUNK_SCRIPT)
+        self._complete_chunk = self._redis.register_script(_COMPLETE_CHUNK_SCRIPT)
+        self._release_chunk = self._redis.register_script(_RELEASE_CHUNK_SCRIPT)
+        self._renew_chunks = self._redis.register_script(_RENEW_CHUNKS_SCRIPT)
+
+    @classmethod
+    def from_settings(cls, translator_settings) -> "RedisJobStore":
+        redis_client = redis.Redis(connection_pool=redis.ConnectionPool(host=translator_settings.redis_host,
+                                                                        port=translator_settings.redis_port, db=0))
+        return cls(redis_client, chunk_size=translator_settings.job_chunk_size, ttl_seconds=translator_settings.job_ttl_seconds,
+                   max_texts=translator_settings.job_max_texts, chunk_lease_seconds=translator_settings.job_chunk_lease_seconds)
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"translator:jobs:{job_id}"
+
+    def _create_job(self, job_id: str, job: Dict[str, Any], chunks: List[List[JobItem]]):
+        job_key = self._job_key(job_id)
+        ttl_ms = int(self._ttl_seconds * 1000)
+        pipeline = self._redis.pipeline(transaction=True)
+        pipeline.hset(job_key, mapping=job)
+        pipeline.pexpire(job_key, ttl_ms)
+        pipeline.hset(f"{job_key}:chunks", mapping={i: json.dumps(chunk) for i, chunk in enumerate(chunks)})
+        pipeline.pexpire(f"{job_key}:chunks", ttl_ms)
+        pipeline.rpush(queue_key, *(f"{job_id}:{i}" for i in range(len(chunks))))
+        pipeline.execute()
+
+    def _load_job(self, job_id: str) -> Dict[str, Any]:
+        job = {key.decode(): value.decode() for key, value in self._redis.hgetall(self._job_key(job_id)).items()}
+        if not job:
+            raise JobNotFoundException(job_id)
+        return job
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        return self._job_status(job_id, self._load_job(job_id))
+
+    def get_results(self, job_id: str, offset: int, limit: int) -> Dict[str, Any]:
+        job = self._load_job(job_id)
+        chunk_range = self._chunk_range(job, offset, limit)
+        values = self._redis.hmget(f"{self._job_key(job_id)}:results", list(chunk_range)) if chunk_range else []
+        return self._page(job_id, job, [None if value is None else json.loads(value) for value in values], chunk_range.start, offset, limit)
+
+    def claim_chunk(self) -> Optional[ClaimedChunk]:
+        while (claimed := self._claim_chunk(keys=[queue_key, claimed_key], args=[self._chunk_lease_ms])) is not None:
+            job_id, index = claimed.decode().rsplit(":", 1)
+            job_key = self._job_key(job_id)
+            items = self._start_chunk(keys=[job_key, f"{job_key}:chunks"], args=[index])
+            if items is not None:
+                return ClaimedChunk(job_id, int(index), [JobItem(*item) for item in json.loads(items)])
+            # the job expired or the chunk has been completed after its lease expired
+            self._redis.zrem(claimed_key, claimed)
+        return None
+
+    def complete_chunk(self, chunk: ClaimedChunk, results: List[Dict[str, str]]):
+        job_key = self._job_key(chunk.job_id)
+        self._complete_chunk(keys=[job_key, f"{job_key}:results", claimed_key, f"{job_key}:chunks"],
+                             args=[chunk.index, json.dumps(results), f"{chunk.job_id}:{chunk.index}", len(results),
+                                   sum(1 for result in results if "error" in result)])
+
+    def release_chunk(self, chunk: ClaimedChunk):
+        self._release_chunk(keys=[queue_key, claimed_key], args=[f"{chunk.job_id}:{chunk.index}"])
+
+    @property
+    def chunk_lease_seconds(self) -> Optional[float]:
+        return self._chunk_lease_ms / 1000.0
+
+    def renew_chunks(self, chunks: List[ClaimedChunk]):
+        if chunks:
+            self._renew_chunks(keys=[claimed_key], args=[self._chunk_lease_ms, *(f"{chunk.job_id}:{chunk.index}" for chunk in chunks)])
+
+
+class LocalJobStore(JobStore):
+    """ Jobs in the memory of this process; they are lost on restart and only visible to the process they were submitted to. """
+
+    def __init__(self, chunk_size: int, ttl_seconds: float, max_texts: int, clock: Callable[[], float] = time.monotonic):
+        super().__init__(chunk_size, ttl_seconds, max_texts)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._chunks: Dict[str, List[List[JobItem]]] = {}
+        self._results: Dict[str, Dict[int, List[Dict[str, str]]]] = {}
+        self._expiries: Dict[str, float] = {}
+        self._queue: Deque[Tuple[str, int]] = deque()
+        self._claimed: Set[Tuple[str, int]] = set()
+
+    @classmethod
+    def from_settings(cls, translator_settings) -> "LocalJobStore":
+        return cls(chunk_size=translator_settings.job_chunk_size, ttl_seconds=translator_settings.job_ttl_seconds,
+                   max_texts=translator_settings.job_max_texts)
+
+    def _remove_expired_jobs(self):
+        now = self._clock()
+        for job_id in [job_id for job_id, expiry in self._expiries.items() if expiry <= now]:
+            for store in (self._jobs, self._chunks, self._results, self._expiries):
+                store.pop(job_id, None)
+
+    def _create_job(self, job_id: str, job: Dict[str, Any], chunks: List[List[JobItem]]):
+        with self._lock:
+            self._remove_expired_jobs()
+            self._jobs[job_id] = job
+            self._chunks[job_id] = chunks
+            self._results[job_id] = {}
+            self._expiries[job_id] = self._clock() + self._ttl_seconds
+            self._queue.extend((job_id, i) for i in range(len(chunks)))
+
+    def _load_job(self, job_id: str) -> Dict[str, Any]:
+        job = self._jobs.get(job_id)
+        if job is None or self._expiries[job_id] <= self._clock():
+            raise JobNotFoundException(job_id)
+        return job
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return self._job_status(job_id, self._load_job(job_id))
+
+    def get_results(self, job_id: str, offset: int, limit: int) -> Dict[str, Any]:
+        with self._lock:
+            job = self._load_job(job_id)
+            chunk_range = self._chunk_range(job, offset, limit)
+            return self._page(job_id, job, [self._results[job_id].get(i) for i in chunk_range], chunk_range.start, offset, limit)
+
+    def claim_chunk(self) -> Optional[ClaimedChunk]:
+        with self._lock:
+            while self._queue:
+                job_id, index = self._queue.popleft()
+                if job_id not in self._jobs:
+                    continue
+                self._claimed.add((job_id, index))
+                job = self._jobs[job_id]
+                if job["status"] == JobStatus.queued.value:
+                    job["status"] = JobStatus.running.value
+                return ClaimedChunk(job_id, index, self._chunks[job_id][index])
+        return None
+
+    def complete_chunk(self, chunk: ClaimedChunk, results: List[Dict[str, str]]):
+        with self._lock:
+            self._claimed.discard((chunk.job_id, chunk.index))
+            job = self._jobs.get(chunk.job_id)
+            if job is None:
+                return
+            self._results[chunk.job_id][chunk.index] = results
+            job["completed"] += len(results)
+            job["failed"] += sum(1 for result in results if "error" in result)
+            job["completedChunks"] += 1
+            if job["completedChunks"] == job["chunks"]:
+                job["status"] = JobStatus.completed.value
+                del self._chunks[chunk.job_id]
+
+    def release_chunk(self, chunk: ClaimedChunk):
+        with self._lock:
+            if (chunk.job_id, chunk.index) in self._claimed:
+                self._claimed.discard((chunk.job_id, chunk.index))
+                self._queue.append((chunk.job_id, chunk.index))
+
+
+def create_job_store() -> JobStore:
+    return RedisJobStore.from_settings(settings) if settings.job_queue_redis_enabled else LocalJobStore.from_settings(settings)
+
+
+class _RetryLaterException(Exception):
+    pass
+
+
+def _is_temporary(e: Exception) -> bool:
+    """ Whether the translation may succeed if retried later.
+
+    Besides overload, this includes failed requests of the proxy to its clients (e.g. their circuits are open or they
+    cannot be reached), which the proxy reports as UnexpectedTranslationError.
+    """
+    if isinstance(e, ForwardedTranslatorProxyError):
+        return e.status_code == 503
+    return isinstance(e, (TranslatorNotReadyException, RequestLimitExceededException, BatchQueueFullException, redis.RedisError,
+                          FailedTranslatorProxyRequest, UnexpectedTranslationError, ConnectionError))
+
+
+class JobWorkers:
+    """ Threads translating the chunks of translation jobs in the background.
+
+    Each worker takes the next chunk from the queue of the store and translates it with bulk priority, in one batch per
+    target and source language, so that the model is fed large batches without delaying interactive requests. Chunks
+    that cannot be translated for the time being (e.g. the models are still loading or the capacity is exhausted) are
+    returned to the queue; texts that cannot be translated at all are stored with their error. The leases of the chunks
+    being translated are renewed periodically, so that chunks which take longer than a lease are not claimed again.
+    """
+
+    def __init__(self, store: JobStore, translate_batch: Callable[[List[str], str, Optional[str]], List[str]],
+                 request_limit_context: Callable[..., ContextManager], count: int,
+                 poll_interval_seconds: float = _WORKER_POLL_INTERVAL_SECONDS, retry_delay_seconds: float = _WORKER_RETRY_DELAY_SECONDS):
+        """
+        :param store: Store of the jobs
+        :param translate_batch: Translates texts into the target language, from the source language if given
+        :param request_limit_context: Context limiting concurrent requests, given the cost and priority class of a chunk
+        :param count: Number of worker threads
+        """
+        self._store = store
+        self._translate_batch = translate_batch
+        self._request_limit_context = request_limit_context
+        self._count = count
+        self._poll_interval_seconds = poll_interval_seconds
+        self._retry_delay_seconds = retry_delay_seconds
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._active_chunks: Dict[Tuple[str, int], ClaimedChunk] = {}
+        self._active_chunks_lock = threading.Lock()
+
+    def start(self):
+        for i in range(self._count):
+            thread = threading.Thread(target=self._run, name=f"translation-job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self._count > 0 and self._store.chunk_lease_seconds:
+            thread = threading.Thread(target=self._renew_leases_periodically, name="translation-job-lease-renewal", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self._count > 0:
+            _logger.info(f"Started {self._count} translation job workers")
+
+    def close(self):
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                delay = 0.0 if self.process_next_chunk() else self._poll_interval_seconds
+            except _RetryLaterException:
+                delay = self._retry_delay_seconds
+            except redis.RedisError as e:
+                _logger.warning(f"Translation job queue unavailable: {type(e).__name__} - {e}")
+                delay = self._retry_delay_seconds
+            except Exception as e:
+                _logger.error(f"Translation job worker failed: {type(e).__name__} - {e}")
+                delay = self._retry_delay_seconds
+            if delay:
+                self._stopped.wait(delay)
+
+    def process_next_chunk(self) -> bool:
+        """ Translates the next chunk, if there is one.
+
+        :return: Whether a chunk was translated
+        :raises _RetryLaterException: If the chunk has been returned to the queue
+        """
+        chunk = self._store.claim_chunk()
+        if chunk is None:
+            return False
+        with self._active_chunks_lock:
+            self._active_chunks[(chunk.job_id, chunk.index)] = chunk
+        try:
+            try:
+                results = self._translate_chunk(chunk)
+            except Exception as e:
+                self._store.release_chunk(chunk)
+                if _is_temporary(e):
+                    _logger.info(f"Translating chunk {chunk.index} of job {chunk.job_id} is retried later: {type(e).__name__}")
+                    raise _RetryLaterException()
+                raise
+            self._store.complete_chunk(chunk, results)
+        finally:
+            with self._active_chunks_lock:
+                del self._active_chunks[(chunk.job_id, chunk.index)]
+        return True
+
+    def renew_leases(self):
+        """ Extends the leases of all chunks being translated, with one call to the store. """
+        with self._active_chunks_lock:
+            chunks = list(self._active_chunks.values())
+        if not chunks:
+            return
+        try:
+            self._store.renew_chunks(chunks)
+        except redis.RedisError as e:
+            _logger.warning(f"Failed to renew the leases of {len(chunks)} translation job chunks: {type(e).__name__} - {e}")
+
+    def _renew_leases_periodically(self):
+        while not self._stopped.wait(self._store.chunk_lease_seconds / 3.0):
+            self.renew_leases()
+
+    def _translate_chunk(self, chunk: ClaimedChunk) -> List[Dict[str, str]]:
+        indices_by_languages: Dict[Tuple[str, Optional[str]], List[int]] = {}
+        for i, item in enumerate(chunk.items):
+            indices_by_languages.setdefault((item.target_language, item.source_language), []).append(i)
+        results: List[Dict[str, str]] = [{}] * len(chunk.items)
+        with priority_context(PriorityClass.bulk), \
+                self._request_limit_context(cost=estimate_cost([item.text for item in chunk.items]), priority=PriorityClass.bulk):
+            for (target_language, source_language), indices in indices_by_languages.items():
+                try:
+                    translations = self._translate_batch([chunk.items[i].text for i in indices], target_language, source_language)
+                    for i, translation in zip(indices, translations):
+                        results[i] = {"text": translation}
+                except Exception as e:
+                    if _is_temporary(e):
+                        raise
+                    _logger.warning(f"Translating texts of job {chunk.job_id} to {target_language} failed: {type(e).__name__} - {e}")
+                    for i in indices:
+                        results[i] = {"error": getattr(e, "message", None) or str(e)}
+        return results
+
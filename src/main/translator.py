@@ -1,22 +1,47 @@
 import asyncio
+import concurrent.futures
+import contextvars
 import functools
+import inspect
 import logging
-import random
+import time
 from abc import ABC, abstractmethod
-from typing import List, Tuple, Type, Dict
+from typing import List, Tuple, Type, Dict, Optional, Any, Awaitable, Callable, TypeVar, Set, Iterator, AsyncIterator
 
 from tenacity import retry, before_sleep_log, wait_fixed, retry_if_exception_type
 
 from detector import Detector
+from instrumentation import batch_queue_depth, batch_size, cache_lookups, model_inference_duration, model_load_duration, \
+    proxy_circuit_state, proxy_circuit_transitions, proxy_client_errors, proxy_client_request_duration
 from schemas import TranslatorApiResponseHealthSchema, TranslatorApiTranslationSchema, TranslatorApiDetectionSchema, TranslatorApiResponseModelsSchema
 from translator_models import models, TranslatorModel
 from translator_models.translator_model import TranslatorModelName
-from translator_proxy_client import TranslatorProxyClient, FailedTranslatorProxyRequest
+from translator_proxy_client import TranslatorProxyClient, FailedTranslatorProxyRequest, ForwardedTranslatorProxyError
+from utils.batch_scheduler import BatchScheduler
+from utils.document_segmenter import DocumentSegmenter, flatten_segments, join_segments
+from utils.circuit_breaker import CircuitBreaker, CircuitState
+from utils.event_loop import BackgroundEventLoop
+from utils.health_monitor import HealthMonitor
+from utils.load_balancer import LoadBalancer
+from utils.request_hedger import RequestHedger
+from utils.translation_cache import TranslationCache, TranslationCacheKey, make_translation_cache_key
+from utils.shared_translation_cache import SharedTranslationCache
+from utils.tracing import span, traced
 from utils.translation_graph import TranslationGraph
 from settings import settings
 
 _logger = logging.getLogger(__name__)
 
+_T = TypeVar("_T")
+
+_DEFAULT_RETRY_AFTER_SECONDS = 5
+
+
+def _run_in_executor(executor: Optional[concurrent.futures.Executor], func: Callable[..., _T], *args, **kwargs) -> Awaitable[_T]:
+    """ Runs the function in the executor with the context variables of the caller, e.g. the priority class of the request. """
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+
 
 class UnexpectedTranslationError(Exception):
     def __init__(self, message):
@@ -67,22 +92,82 @@ def _require_models_determined(func):
     return _func
 
 
+def _step_description(model_class: Type[TranslatorModel], language_pair: Tuple[str, str]) -> str:
+    model_name = getattr(model_class.model_name, "value", model_class.model_name)
+    return f"{model_name} {language_pair[0]}->{language_pair[1]}"
+
+
+def _is_client_failure(e: Exception) -> bool:
+    """ Whether the error of a request to a client is a failure of the client: a failed request or a 5xx answer. """
+    return not isinstance(e, ForwardedTranslatorProxyError) or e.status_code >= 500
+
+
+def _unexpected_proxy_error(e: FailedTranslatorProxyRequest) -> UnexpectedTranslationError:
+    _logger.error(f"Call to client {e.client} failed with {e}")
+    return UnexpectedTranslationError("There was an unexpected error with the translator proxy client.")
+
+
 def _catch_proxy_error(func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def _coroutine(self, *args, **kwargs):
+            try:
+                return await func(self, *args, **kwargs)
+            except FailedTranslatorProxyRequest as e:
+                raise _unexpected_proxy_error(e) from e
+        return _coroutine
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def _async_generator(self, *args, **kwargs):
+            generator = func(self, *args, **kwargs)
+            try:
+                async for item in generator:
+                    yield item
+            except FailedTranslatorProxyRequest as e:
+                raise _unexpected_proxy_error(e) from e
+            finally:
+                await generator.aclose()
+        return _async_generator
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def _generator(self, *args, **kwargs):
+            try:
+                yield from func(self, *args, **kwargs)
+            except FailedTranslatorProxyRequest as e:
+                raise _unexpected_proxy_error(e) from e
+        return _generator
+
     @functools.wraps(func)
     def _func(self, *args, **kwargs):
         try:
             return func(self, *args, **kwargs)
         except FailedTranslatorProxyRequest as e:
-            _logger.error(f"Call to client {e.client} failed with {e}")
-            raise UnexpectedTranslationError("There was an unexpected error with the translator proxy client.")
+            raise _unexpected_proxy_error(e) from e
     return _func
 
 
+class _TranslationLookup:
+    """ Cached translations of a batch of texts and the distinct texts that still have to be translated. """
+
+    def __init__(self, translations: List[Optional[str]], indices_by_missing_key: Dict[TranslationCacheKey, List[int]],
+                 untranslated_keys: List[TranslationCacheKey], untranslated_texts: List[str]):
+        self.translations = translations
+        self.indices_by_missing_key = indices_by_missing_key
+        self.untranslated_keys = untranslated_keys
+        self.untranslated_texts = untranslated_texts
+
+
 class _TranslatorBase(ABC):
 
     def __init__(self):
 
         self._translation_graph_cache = None
+        self._translation_cache = TranslationCache(max_bytes=settings.translation_cache_max_bytes,
+                                                   ttl_seconds=settings.translation_cache_ttl_seconds)
+        self._shared_translation_cache = SharedTranslationCache.from_settings(settings) if settings.shared_cache_enabled else None
+        cache_lookups.set_callback(self._cache_lookups)
 
     @property
     @abstractmethod
@@ -104,7 +189,8 @@ class _TranslatorBase(ABC):
             self._translation_graph_cache = TranslationGraph(self.list_models())
         return self._translation_graph_cache
 
-    def __determine_translation_steps(self, source_language, target_language):
+    @traced("route")
+    def _determine_translation_steps(self, source_language, target_language):
         try:
             translation_path = self._translation_graph.find_optimal_translation_path(source_language, target_language)
             _logger.debug(self._translation_graph.format_translation_path(translation_path, source_language, target_language))
@@ -112,21 +198,159 @@ class _TranslatorBase(ABC):
         except Exception:
             raise UnsupportedLanguagePairException(source_language, target_language)
 
-    def __process_input_languages(self, text: str, source_language: str, target_language: str) -> Tuple[str, str]:
-        if not source_language:
-            source_language = self.detect_language(text)
-        for language in (source_language, target_language):
-            if language not in self._translation_graph:
-                raise UnsupportedLanguageException(language)
-        return source_language, target_language
+    def _group_by_source_language(self, source_languages: List[str], target_language: str) -> Dict[str, List[int]]:
+        """ Groups the indices of texts by their source language. """
+        indices_by_source_language: Dict[str, List[int]] = {}
+        for i, text_source_language in enumerate(source_languages):
+            for language in (text_source_language, target_language):
+                if language not in self._translation_graph:
+                    raise UnsupportedLanguageException(language)
+            indices_by_source_language.setdefault(text_source_language, []).append(i)
+        return indices_by_source_language
 
-    @_require_model_loaded
     def translate(self, text, target_language, source_language=None):
-        source_language, target_language = self.__process_input_languages(text, source_language, target_language)
-        translation_steps = self.__determine_translation_steps(source_language, target_language)
-        for language_pair, translation_model_class in translation_steps:
-            text = self._direct_translate_with_model(translation_model_class, text, language_pair)
-        return text
+        return self.translate_batch([text], target_language, source_language=source_language)[0]
+
+    @_require_model_loaded
+    def translate_batch(self, texts: List[str], target_language: str, source_language: Optional[str] = None) -> List[str]:
+        """ Translates all texts into the target language.
+
+        Cached translations (in memory or in the shared cache) are returned directly. Each remaining distinct text is translated once; texts with the same
+        source language share a translation path and are passed through each of its translation steps as one batch.
+
+        :param texts: Texts to be translated
+        :param target_language: Language to translate into
+        :param source_language: Language of all texts; detected for each text individually if omitted
+        :return: The translated texts in the order of the given texts
+        """
+        lookup = self._lookup_translations(texts, target_language, source_language)
+        if lookup.untranslated_texts:
+            self._complete_translations(lookup, self.__translate_uncached(lookup.untranslated_texts, target_language, source_language))
+        return lookup.translations
+
+    async def translate_batch_async(self, texts: List[str], target_language: str, source_language: Optional[str] = None,
+                                    executor: Optional[concurrent.futures.Executor] = None) -> List[str]:
+        """ Translates all texts like translate_batch, without blocking the event loop.
+
+        Runs translate_batch in the given executor; implementations that can translate natively asynchronously should
+        override this.
+        """
+        return await _run_in_executor(executor, self.translate_batch, texts, target_language, source_language=source_language)
+
+    @_require_model_loaded
+    def translate_batch_stream(self, texts: List[str], target_language: str, source_language: Optional[str] = None) -> Iterator[Tuple[int, str]]:
+        """ Translates all texts like translate_batch, but yields each translation with the index of its text as soon as it is available.
+
+        Cached translations are yielded first, the remaining texts are translated in chunks of `stream_chunk_size` texts. Errors that can be
+        detected up front (e.g. an unsupported language pair) are raised by this call, all others while iterating.
+        """
+        lookup = self._prepare_stream(texts, target_language, source_language)
+        return self._stream_translations(lookup, target_language, source_language)
+
+    @_require_model_loaded
+    async def translate_batch_stream_async(self, texts: List[str], target_language: str, source_language: Optional[str] = None,
+                                           executor: Optional[concurrent.futures.Executor] = None) -> AsyncIterator[Tuple[int, str]]:
+        """ Translates all texts like translate_batch_stream, without blocking the event loop.
+
+        Runs the lookup and the translation of each chunk in the given executor; implementations that can translate natively
+        asynchronously should override this.
+        """
+        lookup = await _run_in_executor(executor, self._prepare_stream, texts, target_language, source_language)
+        return self._stream_translations_async(lookup, target_language, source_language, executor)
+
+    def _prepare_stream(self, texts: List[str], target_language: str, source_language: Optional[str]) -> _TranslationLookup:
+        """ Looks up the cached translations and, if the source language is given, checks that it can be translated to the target language. """
+        lookup = self._lookup_translations(texts, target_language, source_language)
+        if lookup.untranslated_texts and source_language:
+            self._group_by_source_language([source_language], target_language)
+            self._determine_translation_steps(source_language, target_language)
+        return lookup
+
+    def _stream_translations(self, lookup: _TranslationLookup, target_language: str, source_language: Optional[str]) -> Iterator[Tuple[int, str]]:
+        yield from self._cached_translations(lookup)
+        for untranslated_keys, untranslated_texts in self._chunk_untranslated(lookup):
+            yield from self._complete_translations(lookup, self.__translate_uncached(untranslated_texts, target_language, source_language),
+                                                   untranslated_keys)
+
+    async def _stream_translations_async(self, lookup: _TranslationLookup, target_language: str, source_language: Optional[str],
+                                         executor: Optional[concurrent.futures.Executor]) -> AsyncIterator[Tuple[int, str]]:
+        for translation in self._cached_translations(lookup):
+            yield translation
+        for untranslated_keys, untranslated_texts in self._chunk_untranslated(lookup):
+            new_translations = await _run_in_executor(executor, self.__translate_uncached, untranslated_texts, target_language, source_language)
+            for translation in self._complete_translations(lookup, new_translations, untranslated_keys):
+                yield translation
+
+    @staticmethod
+    def _cached_translations(lookup: _TranslationLookup) -> List[Tuple[int, str]]:
+        return [(i, translation) for i, translation in enumerate(lookup.translations) if translation is not None]
+
+    @staticmethod
+    def _chunk_untranslated(lookup: _TranslationLookup) -> List[Tuple[List[TranslationCacheKey], List[str]]]:
+        """ Splits the untranslated texts of the lookup (and their cache keys) into chunks of at most `stream_chunk_size` texts. """
+        chunk_size = settings.stream_chunk_size if settings.stream_chunk_size > 0 else len(lookup.untranslated_texts)
+        return [(lookup.untranslated_keys[i:i + chunk_size], lookup.untranslated_texts[i:i + chunk_size])
+                for i in range(0, len(lookup.untranslated_texts), chunk_size)]
+
+    @traced("cache")
+    def _lookup_translations(self, texts: List[str], target_language: str, source_language: Optional[str]) -> _TranslationLookup:
+        """ Looks up the translations of the texts in the in-memory and the shared cache. """
+        models = tuple(sorted(m.model_name for m in self.list_models()))
+        cache_keys = [make_translation_cache_key(text, source_language, target_language, models) for text in texts]
+        translations = self._translation_cache.get_many(cache_keys)
+
+        indices_by_missing_key: Dict[TranslationCacheKey, List[int]] = {}
+        for i, (cache_key, translation) in enumerate(zip(cache_keys, translations)):
+            if translation is None:
+                indices_by_missing_key.setdefault(cache_key, []).append(i)
+        untranslated_keys = []
+        if indices_by_missing_key:
+            missing_keys = list(indices_by_missing_key)
+            missing_translations = self.__get_shared_cached_translations(missing_keys)
+            self._translation_cache.put_many((key, translation) for key, translation in zip(missing_keys, missing_translations)
+                                             if translation is not None)
+            for cache_key, translation in zip(missing_keys, missing_translations):
+                if translation is None:
+                    untranslated_keys.append(cache_key)
+                else:
+                    for i in indices_by_missing_key[cache_key]:
+                        translations[i] = translation
+        return _TranslationLookup(translations, indices_by_missing_key, untranslated_keys,
+                                  [texts[indices_by_missing_key[key][0]] for key in untranslated_keys])
+
+    def _complete_translations(self, lookup: _TranslationLookup, new_translations: List[str],
+                               untranslated_keys: Optional[List[TranslationCacheKey]] = None) -> List[Tuple[int, str]]:
+        """ Caches the translations of the untranslated texts of the lookup (or of the given part of them) and fills them in.
+
+        :return: The filled in translations with the indices of their texts
+        """
+        untranslated_keys = lookup.untranslated_keys if untranslated_keys is None else untranslated_keys
+        self._translation_cache.put_many(zip(untranslated_keys, new_translations))
+        if self._shared_translation_cache:
+            self._shared_translation_cache.put_many(zip(untranslated_keys, new_translations))
+        completed = []
+        for cache_key, translation in zip(untranslated_keys, new_translations):
+            for i in lookup.indices_by_missing_key[cache_key]:
+                lookup.translations[i] = translation
+                completed.append((i, translation))
+        return completed
+
+    def __get_shared_cached_translations(self, cache_keys: List[TranslationCacheKey]) -> List[Optional[str]]:
+        if not self._shared_translation_cache:
+            return [None] * len(cache_keys)
+        return self._shared_translation_cache.get_many(cache_keys)
+
+    def __translate_uncached(self, texts: List[str], target_language: str, source_language: Optional[str]) -> List[str]:
+        source_languages = [source_language] * len(texts) if source_language else self._detect_languages(texts)
+        translations: List[Optional[str]] = [None] * len(texts)
+        for text_source_language, indices in self._group_by_source_language(source_languages, target_language).items():
+            batch = [texts[i] for i in indices]
+            for language_pair, translation_model_class in self._determine_translation_steps(text_source_language, target_language):
+                with span("hop", _step_description(translation_model_class, language_pair)):
+                    batch = self._direct_translate_batch_with_model(translation_model_class, batch, language_pair)
+            for i, translation in zip(indices, batch):
+                translations[i] = translation
+        return translations
 
     @abstractmethod
     def _direct_translate_with_model(self, model_class: Type[TranslatorModel], text: str, language_pair: Tuple[str, str]) -> str:
@@ -135,23 +359,53 @@ class _TranslatorBase(ABC):
         Direct meaning no further Dijkstra-Path-Finding involved."""
         pass
 
-    def list_available_languages(self, base_language: str) -> List[str]:
+    def _direct_translate_batch_with_model(self, model_class: Type[TranslatorModel], texts: List[str], language_pair: Tuple[str, str]) -> List[str]:
+        """ Directly translates a batch of texts from source to target language with the given model.
+
+        Defaults to translating text by text; implementations that can translate whole batches should override this."""
+        return [self._direct_translate_with_model(model_class, text, language_pair) for text in texts]
+
+    def list_available_languages(self, base_language: str) -> Tuple[str, ...]:
         """ Lists all available language, i.e. languages that be translated into as well as from.
 
         :param base_language: One language that must be contained in the list (as possibly the models could
          yield two (or more) sets of languages with no connection in between).
-        :return:
+        :return: The sorted languages
         """
-        return list(self._translation_graph.get_strongly_connected_component(base_language))
+        return self._translation_graph.get_connected_languages(base_language)
 
     @abstractmethod
     def detect_language(self, text: str) -> str:
         pass
 
+    async def detect_language_async(self, text: str, executor: Optional[concurrent.futures.Executor] = None) -> str:
+        """ Detects the language like detect_language, without blocking the event loop. """
+        return await _run_in_executor(executor, self.detect_language, text)
+
+    def _detect_languages(self, texts: List[str]) -> List[str]:
+        """ Detects the language of each text; implementations may override this to detect languages concurrently. """
+        return [self.detect_language(text) for text in texts]
+
     @abstractmethod
     def list_models(self) -> List[Type[TranslatorModel]]:
         pass
 
+    def _cache_lookups(self) -> Dict[Tuple[str, str], int]:
+        caches = {"local": self._translation_cache, "shared": self._shared_translation_cache}
+        return {(name, result): count for name, cache in caches.items() if cache is not None
+                for result, count in (("hit", cache.hits), ("miss", cache.misses))}
+
+    def statistics(self) -> Dict[str, Any]:
+        """ Runtime statistics of the translator, e.g. for monitoring. """
+        translation_statistics = {"translationCache": self._translation_cache.statistics()}
+        if self._shared_translation_cache:
+            translation_statistics["sharedTranslationCache"] = self._shared_translation_cache.statistics()
+        return translation_statistics
+
+    async def statistics_async(self) -> Dict[str, Any]:
+        """ Runtime statistics like statistics, without blocking the event loop. """
+        return self.statistics()
+
 
 class Translator(_TranslatorBase):
 
@@ -160,6 +414,11 @@ class Translator(_TranslatorBase):
         self._models = None
         self._models_loaded = False
         self._detector = Detector()
+        self._batch_scheduler = BatchScheduler(max_batch_size=settings.batch_max_size,
+                                               max_wait_ms=settings.batch_max_wait_ms,
+                                               max_queue_depth=settings.batch_max_queue_depth,
+                                               weights=settings.priority_weights)
+        batch_queue_depth.set_callback(self._batch_scheduler.queue_depths)
         super().__init__()
 
     @property
@@ -176,7 +435,10 @@ class Translator(_TranslatorBase):
     def initialize_models(self, preload: bool = False):
 
         _logger.info(f"Starting initialization of models {[m.model_name for m in self._model_selection]}.")
-        self._models = {model.model_name: model() for model in self._model_selection}
+        self._models = {model.model_name: self._load_model(model) for model in self._model_selection}
+        for model_name, max_tokens in settings.batch_max_tokens.items():
+            if model_name in self._models:
+                self._models[model_name].batch_max_tokens = max_tokens
 
         if preload:
             for model in self._models.values():
@@ -185,9 +447,47 @@ class Translator(_TranslatorBase):
         self._models_loaded = True
         _logger.info(f"Models {list(self._models)} have been loaded")
 
+    @staticmethod
+    def _load_model(model_class: Type[TranslatorModel]) -> TranslatorModel:
+        with model_load_duration.labels(model_class.model_name).time():
+            return model_class()
+
     @_require_model_loaded
     def _direct_translate_with_model(self, model_class: Type[TranslatorModel], text: str, language_pair: Tuple[str, str]):
-        return self._models[model_class.model_name].translate(text, language_pair[0], language_pair[1])
+        return self._direct_translate_batch_with_model(model_class, [text], language_pair)[0]
+
+    @_require_model_loaded
+    def _direct_translate_batch_with_model(self, model_class: Type[TranslatorModel], texts: List[str], language_pair: Tuple[str, str]) -> List[str]:
+        """ Translates the texts together with the texts of concurrent requests for the same model and language pair.
+
+        Texts that are too long for the model are split into segments first, which are translated as part of the same batch and then
+        reassembled with their original whitespace.
+        """
+        model = self._models[model_class.model_name]
+        segmenter = self._get_segmenter(model, language_pair)
+        step = _step_description(model_class, language_pair)
+        with span("segment", step):
+            segmented_texts = [segmenter.segment(text) for text in texts] if segmenter else None
+        # includes the time waiting for the batch, which may be translated by the thread of another request
+        with span("batch", step):
+            translated = self._batch_scheduler.translate_batch(model_class.model_name, language_pair,
+                                                               flatten_segments(segmented_texts) if segmented_texts else texts,
+                                                               lambda batch: self._translate_model_batch(model, batch, language_pair))
+        return join_segments(segmented_texts, translated) if segmented_texts else translated
+
+    @staticmethod
+    def _translate_model_batch(model: TranslatorModel, batch: List[str], language_pair: Tuple[str, str]) -> List[str]:
+        batch_size.labels(model.model_name, *language_pair).observe(len(batch))
+        with model_inference_duration.labels(model.model_name, *language_pair).time(), \
+                span("inference", _step_description(type(model), language_pair)):
+            return model.translate_batch(batch, language_pair[0], language_pair[1])
+
+    @staticmethod
+    def _get_segmenter(model: TranslatorModel, language_pair: Tuple[str, str]) -> Optional[DocumentSegmenter]:
+        if not model.max_input_tokens:
+            return None
+        max_tokens = min(settings.segment_max_tokens, model.max_input_tokens) if settings.segment_max_tokens > 0 else model.max_input_tokens
+        return DocumentSegmenter(max_tokens, lambda text: model.count_tokens(text, language_pair[0], language_pair[1]), model.special_tokens)
 
     def detect_language(self, text: str) -> str:
         return self._detector.detect_language(text)
@@ -195,6 +495,9 @@ class Translator(_TranslatorBase):
     def list_models(self) -> List[Type[TranslatorModel]]:
         return self._model_selection
 
+    def statistics(self) -> Dict[str, Any]:
+        return {**super().statistics(), "batchQueues": self._batch_scheduler.statistics()}
+
 
 class TranslatorProxy(_TranslatorBase):
 
@@ -204,9 +507,45 @@ class TranslatorProxy(_TranslatorBase):
         self._clients = settings.translator_clients
         self._client_models = {}
         self._model_to_clients: Dict[TranslatorModelName, List[str]] = {}
+        self._event_loop = BackgroundEventLoop(name="translator-proxy-event-loop")
+        self._proxy_clients: Dict[str, TranslatorProxyClient] = {}
+        self._circuit_breakers: Dict[str, CircuitBreaker] = {
+            client: CircuitBreaker(client,
+                                   failure_rate_threshold=settings.proxy_circuit_failure_rate_threshold,
+                                   minimum_requests=settings.proxy_circuit_minimum_requests,
+                                   window_size=settings.proxy_circuit_window_size,
+                                   open_seconds=settings.proxy_circuit_open_seconds,
+                                   max_open_seconds=settings.proxy_circuit_max_open_seconds)
+            for client in self._clients}
+        proxy_circuit_transitions.set_callback(self._circuit_transitions)
+        proxy_circuit_state.set_callback(self._circuit_states)
+        self._load_balancer = LoadBalancer(settings.proxy_balancing_policy,
+                                           ewma_decay_seconds=settings.proxy_ewma_decay_seconds)
+        self._request_hedger = RequestHedger(percentile=settings.proxy_hedging_percentile,
+                                             min_delay_seconds=settings.proxy_hedging_min_delay_ms / 1000.0,
+                                             budget_ratio=settings.proxy_hedging_budget_ratio) if settings.proxy_hedging_enabled else None
+        self._health_monitor = HealthMonitor(self._clients, self._check_client_health,
+                                             interval_seconds=settings.proxy_health_interval_seconds,
+                                             max_backoff_seconds=settings.proxy_health_max_backoff_seconds,
+                                             stale_after_seconds=settings.proxy_health_stale_after_seconds)
+
+    def _circuit_transitions(self) -> Dict[Tuple[str, CircuitState, CircuitState], int]:
+        return {(client, from_state, to_state): count for client, circuit_breaker in self._circuit_breakers.items()
+                for (from_state, to_state), count in list(circuit_breaker.transitions.items())}
+
+    def _circuit_states(self) -> Dict[Tuple[str, CircuitState], int]:
+        return {(client, state): int(circuit_breaker.state == state) for client, circuit_breaker in self._circuit_breakers.items()
+                for state in CircuitState}
+
+    def _get_proxy_client(self, client: str) -> TranslatorProxyClient:
+        """ Returns the long-lived proxy client (with its pooled session) of the given translator client. """
+        proxy_client = self._proxy_clients.get(client)
+        if proxy_client is None:
+            proxy_client = self._proxy_clients.setdefault(client, TranslatorProxyClient(client))
+        return proxy_client
 
     async def _determine_client_models(self):
-        client_model_responses: List[TranslatorApiResponseModelsSchema] = await asyncio.gather(*[TranslatorProxyClient(client).get_models() for client in self._clients])
+        client_model_responses: List[TranslatorApiResponseModelsSchema] = await asyncio.gather(*[self._get_proxy_client(client).get_models() for client in self._clients])
         for client, model_response in zip(self._clients, client_model_responses):
             assert model_response.models, f"Client {client} did not return any models."
             _logger.debug(f"Received models {model_response.models} from client {client}")
@@ -218,24 +557,26 @@ class TranslatorProxy(_TranslatorBase):
            retry=retry_if_exception_type((FailedTranslatorProxyRequest, AssertionError)))
     def initialize_models(self, preload: bool = False) -> None:
         _logger.info("Starting translator proxy initialization.")
-        asyncio.run(self._determine_client_models())
+        self._event_loop.run(self._determine_client_models())
         for client, client_models in self._client_models.items():
             for model in client_models:
                 self._model_to_clients.setdefault(model.model_name, []).append(client)
         _logger.info(f"Detected client models: { {client: [m.model_name for m in _models] for client, _models in self._client_models.items()} }")
+        self._event_loop.run(self._start_health_monitor())
         self._models_determined = True
 
-    async def _get_client_health_status(self) -> List[TranslatorApiResponseHealthSchema]:
-        return await asyncio.gather(*[TranslatorProxyClient(client).get_health() for client in self._clients])
+    async def _check_client_health(self, client: str) -> bool:
+        health: TranslatorApiResponseHealthSchema = await self._get_proxy_client(client).get_health()
+        return health.serviceAvailable
+
+    async def _start_health_monitor(self):
+        await self._health_monitor.refresh()
+        self._health_monitor.start()
 
     @property
-    @_catch_proxy_error
     def models_loaded(self) -> bool:
-        if not self._models_determined:
-            return False
-        health_status: List[TranslatorApiResponseHealthSchema] = asyncio.run(self._get_client_health_status())
-        _logger.debug(f"Client health status: {health_status}")
-        return all(h.serviceAvailable for h in health_status)
+        """ Whether all clients are available, according to the health state polled in the background. """
+        return self._models_determined and self._health_monitor.all_available
 
     @property
     def models_determined(self) -> bool:
@@ -243,23 +584,251 @@ class TranslatorProxy(_TranslatorBase):
 
     @_catch_proxy_error
     def _direct_translate_with_model(self, model_class: Type[TranslatorModel], text: str, language_pair: Tuple[str, str]) -> str:
-        client = random.choice(self._model_to_clients[model_class.model_name])
-        _logger.debug(f"Using client {client} for model {model_class.model_name} to translate {language_pair}")
-        translation = asyncio.run(TranslatorProxyClient(client).post_translation(
-            TranslatorApiTranslationSchema(texts=[text],
-                                           sourceLanguage=language_pair[0],
-                                           targetLanguage=language_pair[1])))
-        return translation.texts[0]
+        return self._direct_translate_batch_with_model(model_class, [text], language_pair)[0]
+
+    @_catch_proxy_error
+    def _direct_translate_batch_with_model(self, model_class: Type[TranslatorModel], texts: List[str], language_pair: Tuple[str, str]) -> List[str]:
+        return self._event_loop.run(self._post_translations(model_class, texts, language_pair))
+
+    async def _access_cache(self, executor: Optional[concurrent.futures.Executor], func: Callable[..., _T], *args) -> _T:
+        """ Calls a function accessing the translation caches, in the executor if it calls the shared cache, which blocks on Redis. """
+        if self._shared_translation_cache:
+            return await _run_in_executor(executor, func, *args)
+        return func(*args)
+
+    @_catch_proxy_error
+    async def translate_batch_async(self, texts: List[str], target_language: str, source_language: Optional[str] = None,
+                                    executor: Optional[concurrent.futures.Executor] = None) -> List[str]:
+        """ Translates all texts like translate_batch, with native coroutines on the proxy event loop; the executor only
+        accesses the shared cache. """
+        if not self.models_loaded:
+            raise TranslatorNotReadyException("Models have not been loaded yet.")
+        lookup = await self._access_cache(executor, self._lookup_translations, texts, target_language, source_language)
+        if lookup.untranslated_texts:
+            new_translations = await self._run_on_event_loop(self._translate_uncached(lookup.untranslated_texts, target_language, source_language))
+            await self._access_cache(executor, self._complete_translations, lookup, new_translations)
+        return lookup.translations
+
+    async def translate_batch_stream_async(self, texts: List[str], target_language: str, source_language: Optional[str] = None,
+                                           executor: Optional[concurrent.futures.Executor] = None) -> AsyncIterator[Tuple[int, str]]:
+        """ Translates all texts like translate_batch_stream, with native coroutines on the proxy event loop; the executor
+        only accesses the shared cache. """
+        if not self.models_loaded:
+            raise TranslatorNotReadyException("Models have not been loaded yet.")
+        lookup = await self._access_cache(executor, self._prepare_stream, texts, target_language, source_language)
+        return self._stream_translations_async(lookup, target_language, source_language, executor)
+
+    @_catch_proxy_error
+    def _stream_translations(self, lookup: _TranslationLookup, target_language: str, source_language: Optional[str]) -> Iterator[Tuple[int, str]]:
+        """ Forwards all chunks concurrently and yields the translations of each chunk as soon as it has passed all translation steps. """
+        yield from self._cached_translations(lookup)
+        futures = [self._event_loop.submit(self._translate_chunk(untranslated_keys, untranslated_texts, target_language, source_language))
+                   for untranslated_keys, untranslated_texts in self._chunk_untranslated(lookup)]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                untranslated_keys, new_translations = future.result()
+                yield from self._complete_translations(lookup, new_translations, untranslated_keys)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    @_catch_proxy_error
+    async def _stream_translations_async(self, lookup: _TranslationLookup, target_language: str, source_language: Optional[str],
+                                         executor: Optional[concurrent.futures.Executor]) -> AsyncIterator[Tuple[int, str]]:
+        for translation in self._cached_translations(lookup):
+            yield translation
+        futures = [asyncio.wrap_future(self._event_loop.submit(self._translate_chunk(untranslated_keys, untranslated_texts,
+                                                                                     target_language, source_language)))
+                   for untranslated_keys, untranslated_texts in self._chunk_untranslated(lookup)]
+        try:
+            for next_chunk in asyncio.as_completed(futures):
+                untranslated_keys, new_translations = await next_chunk
+                for translation in await self._access_cache(executor, self._complete_translations, lookup, new_translations, untranslated_keys):
+                    yield translation
+        finally:
+            for future in futures:
+                future.cancel()
+
+    async def _translate_chunk(self, untranslated_keys: List[TranslationCacheKey], texts: List[str], target_language: str,
+                               source_language: Optional[str]) -> Tuple[List[TranslationCacheKey], List[str]]:
+        return untranslated_keys, await self._translate_uncached(texts, target_language, source_language)
+
+    async def _run_on_event_loop(self, coroutine: Awaitable[_T]) -> _T:
+        """ Awaits the coroutine on the proxy event loop, which owns the client sessions, from another event loop. """
+        return await asyncio.wrap_future(self._event_loop.submit(coroutine))
+
+    async def _translate_uncached(self, texts: List[str], target_language: str, source_language: Optional[str]) -> List[str]:
+        source_languages = [source_language] * len(texts) if source_language else await self._post_detections(texts)
+        translations: List[Optional[str]] = [None] * len(texts)
+        for text_source_language, indices in self._group_by_source_language(source_languages, target_language).items():
+            batch = [texts[i] for i in indices]
+            for language_pair, translation_model_class in self._determine_translation_steps(text_source_language, target_language):
+                with span("hop", _step_description(translation_model_class, language_pair)):
+                    batch = await self._post_translations(translation_model_class, batch, language_pair)
+            for i, translation in zip(indices, batch):
+                translations[i] = translation
+        return translations
+
+    async def _post_translations(self, model_class: Type[TranslatorModel], texts: List[str], language_pair: Tuple[str, str]) -> List[str]:
+        """ Forwards the texts to the clients of the model in batches of at most `proxy_batch_max_size` texts. """
+        batch_size = settings.proxy_batch_max_size if settings.proxy_batch_max_size > 0 else len(texts)
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        translated_batches = await asyncio.gather(*[self._post_translation(model_class, batch, language_pair) for batch in batches])
+        return [translation for translated_batch in translated_batches for translation in translated_batch]
+
+    async def _send_balanced(self, request_kind: str, clients: List[str], request: Callable[[TranslatorProxyClient], Awaitable[_T]],
+                             clients_in_use: Optional[Set[str]] = None, batch_size: int = 1) -> Tuple[str, _T]:
+        """ Sends the request to the client chosen by the load balancer.
+
+        Clients with an open circuit are skipped. If the request to a client fails, or the client rejects it with 503
+        (which also skips the client until its Retry-After has passed), the request is sent to the next client; only
+        if no client is left, the error is raised. Clients in use by another copy of the same (hedged) request are
+        only chosen if no other client is left.
+        """
+        remaining_clients = list(clients)
+        clients_in_use = set() if clients_in_use is None else clients_in_use
+        while True:
+            remaining_clients = [c for c in remaining_clients if self._circuit_breakers[c].allows_requests]
+            if not remaining_clients:
+                raise FailedTranslatorProxyRequest(",".join(clients), f"No client available for {request_kind} request; circuits of {clients} are open.")
+            client = self._load_balancer.choose([c for c in remaining_clients if c not in clients_in_use] or remaining_clients)
+            circuit_breaker = self._circuit_breakers[client]
+            if not circuit_breaker.try_acquire():
+                remaining_clients.remove(client)
+                continue
+            clients_in_use.add(client)
+            try:
+                with self._load_balancer.track(client, is_failure=_is_client_failure):
+                    start = time.monotonic()
+                    response = await request(self._get_proxy_client(client))
+            except FailedTranslatorProxyRequest:
+                proxy_client_errors.labels(client, request_kind, "failed").inc()
+                circuit_breaker.record_failure()
+                remaining_clients.remove(client)
+                if not remaining_clients:
+                    raise
+                continue
+            except ForwardedTranslatorProxyError as e:
+                proxy_client_errors.labels(client, request_kind, e.status_code).inc()
+                circuit_breaker.record_success()  # the client answered
+                if e.status_code != 503:
+                    raise
+                self._load_balancer.mark_unavailable(client, e.retry_after if e.retry_after is not None else _DEFAULT_RETRY_AFTER_SECONDS)
+                remaining_clients.remove(client)
+                if not remaining_clients:
+                    raise
+                continue
+            except BaseException:
+                circuit_breaker.release()
+                raise
+            circuit_breaker.record_success()
+            latency = time.monotonic() - start
+            proxy_client_request_duration.labels(client, request_kind).observe(latency)
+            if self._request_hedger:
+                self._request_hedger.record(request_kind, latency, batch_size)
+            return client, response
+
+    async def _send(self, request_kind: str, clients: List[str], request: Callable[[TranslatorProxyClient], Awaitable[_T]],
+                    batch_size: int = 1) -> Tuple[str, _T]:
+        """ Sends the request to one of the clients, hedged if enabled.
+
+        A hedged request that has not been answered after a percentile of the recent latencies of requests of the same
+        kind and similar batch size is sent to a second client as well (within the hedging budget). The first successful
+        answer is used and the other request is cancelled.
+        """
+        delay = self._request_hedger.delay(request_kind, batch_size) if self._request_hedger and len(clients) > 1 else None
+        if delay is None:
+            return await self._send_balanced(request_kind, clients, request, batch_size=batch_size)
+
+        clients_in_use: Set[str] = set()
+        original = asyncio.ensure_future(self._send_balanced(request_kind, clients, request, clients_in_use, batch_size))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({original}, timeout=delay)
+            if done or not self._request_hedger.try_acquire():
+                return await original
+            _logger.debug(f"Hedging {request_kind} request after {delay:.3f}s")
+            hedge = asyncio.ensure_future(self._send_balanced(request_kind, clients, request, clients_in_use, batch_size))
+            pending = {original, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._request_hedger.record_hedge_won()
+                        return task.result()
+            return original.result()  # both failed, raises the error of the original request
+        finally:
+            for task in (original, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _post_translation(self, model_class: Type[TranslatorModel], texts: List[str], language_pair: Tuple[str, str]) -> List[str]:
+        body = TranslatorApiTranslationSchema(texts=texts, sourceLanguage=language_pair[0], targetLanguage=language_pair[1])
+        client, translation = await self._send(model_class.model_name, self._model_to_clients[model_class.model_name],
+                                               lambda proxy_client: proxy_client.post_translation(body), batch_size=len(texts))
+        _logger.debug(f"Used client {client} for model {model_class.model_name} to translate {len(texts)} texts {language_pair}")
+        if len(translation.texts) != len(texts):
+            raise FailedTranslatorProxyRequest(client, f"Received {len(translation.texts)} translations for {len(texts)} texts.")
+        return translation.texts
+
+    async def _post_detection(self, text: str) -> str:
+        body = TranslatorApiDetectionSchema(text=text)
+        client, detection = await self._send("detection", self._clients, lambda proxy_client: proxy_client.post_detection(body))
+        _logger.debug(f"Used client {client} for language detection")
+        return detection.text
+
+    @traced("detect")
+    async def _post_detections(self, texts: List[str]) -> List[str]:
+        """ Detects the languages of the texts, one request per text, at most `proxy_detection_max_concurrency` at a time. """
+        if settings.proxy_detection_max_concurrency <= 0:
+            return list(await asyncio.gather(*[self._post_detection(text) for text in texts]))
+        semaphore = asyncio.Semaphore(settings.proxy_detection_max_concurrency)
+
+        async def _post_limited_detection(text: str) -> str:
+            async with semaphore:
+                return await self._post_detection(text)
+
+        return list(await asyncio.gather(*[_post_limited_detection(text) for text in texts]))
 
     @_require_models_determined
     @_catch_proxy_error
     def detect_language(self, text: str) -> str:
-        client = random.choice(self._clients)
-        _logger.debug(f"Language detection call to {client}")
-        detection = asyncio.run(TranslatorProxyClient(client).post_detection(
-            TranslatorApiDetectionSchema(text=text)))
-        return detection.text
+        return self._event_loop.run(self._post_detection(text))
+
+    @_require_models_determined
+    @_catch_proxy_error
+    async def detect_language_async(self, text: str, executor: Optional[concurrent.futures.Executor] = None) -> str:
+        return await self._run_on_event_loop(self._post_detection(text))
+
+    @_require_models_determined
+    @_catch_proxy_error
+    def _detect_languages(self, texts: List[str]) -> List[str]:
+        return self._event_loop.run(self._post_detections(texts))
 
     @_require_models_determined
     def list_models(self) -> List[Type[TranslatorModel]]:
         return [m for m in models if m.model_name in self._model_to_clients]
+
+    async def _get_proxy_statistics(self) -> Dict[str, Any]:
+        proxy_statistics = {"clients": self._load_balancer.statistics(),
+                            "clientHealth": self._health_monitor.statistics(),
+                            "circuitBreakers": {client: circuit_breaker.statistics() for client, circuit_breaker in self._circuit_breakers.items()}}
+        if self._request_hedger:
+            proxy_statistics["hedging"] = self._request_hedger.statistics()
+        return proxy_statistics
+
+    def statistics(self) -> Dict[str, Any]:
+        return {**super().statistics(), **self._event_loop.run(self._get_proxy_statistics())}
+
+    async def statistics_async(self) -> Dict[str, Any]:
+        return {**super().statistics(), **await self._run_on_event_loop(self._get_proxy_statistics())}
+
+    async def _close_proxy_clients(self):
+        await self._health_monitor.stop()
+        await asyncio.gather(*[proxy_client.close() for proxy_client in self._proxy_clients.values()])
+
+    def close(self):
+        """ Closes the pooled sessions of all proxy clients and stops the event loop. """
+        self._event_loop.run(self._close_proxy_clients())
+        self._event_loop.close()
@@ -0,0 +1,245 @@
+""" Asynchronous variant of translator_service: serves the same routes with aiohttp, so that requests waiting for a
+model or, in proxy mode, for a translator client do not hold a thread each.
+
+Run with gunicorn via `gunicorn aiohttp_app:app --worker-class aiohttp.GunicornWebWorker`. """
+
+import asyncio
+import concurrent.futures
+import logging
+import time
+from _thread import start_new_thread
+from typing import AsyncIterator, Tuple
+
+from aiohttp import web
+
+from constants import PriorityClass, TranslatorMode
+from instrumentation import registry, request_duration
+from request_limitation import RequestLimiter, estimate_cost
+from service_api import NDJSON_MIMETYPE, base_language, detection_text, error_record, error_response, health_body, \
+    job_items_from_json, job_items_from_upload, job_location, request_priority, results_page, translation_record, \
+    translation_request
+from settings import settings
+from translator import Translator, TranslatorProxy
+from translation_jobs import InvalidJobException, JobWorkers, create_job_store
+from utils.logger import configure_logger
+from utils.metrics import CONTENT_TYPE
+from utils.priority import priority_context
+from utils.tracing import SERVER_TIMING_HEADER, TRACE_HEADER, start_trace, trace_context
+
+_logger = logging.getLogger(__name__)
+
+configure_logger()
+if settings.mode == TranslatorMode.proxy:
+    _logger.info("Starting translator in proxy mode.")
+    translator = TranslatorProxy()
+else:
+    _logger.info("Starting translator in client mode.")
+    translator = Translator()
+
+start_new_thread(translator.initialize_models, (), {"preload": settings.preload_models})
+
+# Model inference blocks, so it runs in a bounded pool of threads; the proxy forwards requests with coroutines instead.
+inference_executor = concurrent.futures.ThreadPoolExecutor(max_workers=settings.async_inference_threads,
+                                                           thread_name_prefix="translator-inference")
+
+if settings.rate_limit > 0:
+    _logger.info(f"Rate limiting enabled with limit of {settings.rate_limit}")
+    request_limiter = RequestLimiter(settings.rate_limit)
+    request_limit_context = request_limiter.limited_requests
+else:
+    _logger.info(f"Rate limiting disabled")
+    request_limit_context = RequestLimiter.no_limit_context
+
+# the job workers translate in their own threads, as in the WSGI service; they are started with the app
+job_store = create_job_store()
+job_workers = JobWorkers(job_store, translator.translate_batch, request_limit_context, settings.job_workers)
+registry.start()
+
+routes = web.RouteTableDef()
+
+
+@web.middleware
+async def _record_request_duration(request: web.Request, handler):
+    start = time.monotonic()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        endpoint = resource.canonical if resource is not None else "unmatched"
+        request_duration.labels(endpoint, request.method, status).observe(time.monotonic() - start)
+
+
+@web.middleware
+async def _trace_request(request: web.Request, handler):
+    trace = start_trace(request.headers.get(TRACE_HEADER), settings.tracing_sample_rate, settings.tracing_log_enabled)
+    if trace is None:
+        return await handler(request)
+    with trace_context(trace):
+        response = await handler(request)
+    server_timing = trace.finish()
+    if not response.prepared:  # streamed responses have sent their headers already
+        response.headers[SERVER_TIMING_HEADER] = server_timing
+    return response
+
+
+@web.middleware
+async def _handle_errors(request: web.Request, handler):
+    try:
+        return await handler(request)
+    except web.HTTPException:
+        raise
+    except Exception as e:
+        response = error_response(e)
+        if response is None:
+            raise
+        return web.json_response(response.body, status=response.status, headers=response.headers)
+
+
+@routes.route('GET', '/health')
+@routes.route('POST', '/health')
+async def health(request: web.Request):
+    return web.json_response(health_body(translator.models_loaded))
+
+
+@routes.post('/translation')
+async def translate(request: web.Request):
+    texts, target_language, source_language = translation_request(await request.json())
+    priority = request_priority(request.headers, PriorityClass.interactive)
+    with priority_context(priority):
+        async with request_limit_context(cost=estimate_cost(texts), priority=priority):
+            return web.json_response({"texts": await translator.translate_batch_async(texts, target_language,
+                                                                                      source_language=source_language,
+                                                                                      executor=inference_executor)})
+
+
+@routes.post('/translation/stream')
+async def translate_stream(request: web.Request):
+    """ Streams the translations as NDJSON records {"index": ..., "text": ...} in the order in which they are translated.
+
+    Bulk priority by default, as streaming is meant for many texts.
+    """
+    texts, target_language, source_language = translation_request(await request.json())
+    priority = request_priority(request.headers, PriorityClass.bulk)
+    with priority_context(priority):
+        async with request_limit_context(cost=estimate_cost(texts), priority=priority):
+            translations = await translator.translate_batch_stream_async(texts, target_language,
+                                                                         source_language=source_language,
+                                                                         executor=inference_executor)
+            response = web.StreamResponse(headers={'Content-Type': NDJSON_MIMETYPE})
+            await response.prepare(request)
+            await _write_translation_records(response, translations)
+            await response.write_eof()
+            return response
+
+
+async def _write_translation_records(response: web.StreamResponse, translations: AsyncIterator[Tuple[int, str]]):
+    try:
+        async for index, text in translations:
+            await response.write(translation_record(index, text).encode())
+    except ConnectionResetError:
+        raise
+    except Exception as e:
+        await response.write(error_record(e).encode())
+    finally:
+        await translations.aclose()
+
+
+@routes.post('/detection')
+async def detect(request: web.Request):
+    text = detection_text(await request.json())
+    priority = request_priority(request.headers, PriorityClass.interactive)
+    with priority_context(priority):
+        async with request_limit_context(cost=estimate_cost([text]), priority=priority):
+            return web.json_response({"text": await translator.detect_language_async(text, executor=inference_executor)})
+
+
+# Not rate limited, as jobs are only queued here and translated by the job workers.
+@routes.post('/jobs')
+async def submit_job(request: web.Request):
+    """ Submits a translation job of the texts of a JSON body like for /translation, or of a CSV or JSONL file uploaded
+    as form field 'file' or as the request body; the languages of the file may be given as parameters. """
+    if request.content_type == 'application/json':
+        items = job_items_from_json(await request.json())
+    elif request.content_type == 'multipart/form-data':
+        form = await request.post()
+        upload = form.get('file')
+        if not isinstance(upload, web.FileField):
+            raise InvalidJobException("Missing file")
+        items = job_items_from_upload(upload.file.read(), upload.content_type, upload.filename,
+                                      form.get('targetLanguage') or request.query.get('targetLanguage'),
+                                      form.get('sourceLanguage') or request.query.get('sourceLanguage'))
+    else:
+        items = job_items_from_upload(await request.read(), request.content_type, None,
+                                      request.query.get('targetLanguage'), request.query.get('sourceLanguage'))
+    job = await asyncio.get_running_loop().run_in_executor(None, job_store.create_job, items)
+    return web.json_response(job, status=202, headers=job_location(job))
+
+
+@routes.get('/jobs/{job_id}')
+async def get_job(request: web.Request):
+    return web.json_response(await asyncio.get_running_loop().run_in_executor(None, job_store.get_job, request.match_info['job_id']))
+
+
+@routes.get('/jobs/{job_id}/results')
+async def get_job_results(request: web.Request):
+    """ The results from the parameter 'offset' on, as far as they are translated; continue from 'nextOffset' of the response. """
+    offset, limit = results_page(request.query.get('offset'), request.query.get('limit'))
+    return web.json_response(await asyncio.get_running_loop().run_in_executor(None, job_store.get_results,
+                                                                              request.match_info['job_id'], offset, limit))
+
+
+# Not rate limited, as the languages are precomputed lists of the translation graph.
+@routes.post('/languages')
+async def list_connected_languages(request: web.Request):
+    return web.json_response({"languages": translator.list_available_languages(base_language(await request.json()))})
+
+
+@routes.get('/languages')
+async def list_all_languages(request: web.Request):
+    return web.json_response({"languages": translator.list_available_languages("en")})
+
+
+@routes.get('/models')
+async def list_provided_models(request: web.Request):
+    async with request_limit_context():
+        return web.json_response({"models": [m.model_name for m in translator.list_models()]})
+
+
+@routes.get('/statistics')
+async def statistics(request: web.Request):
+    return web.json_response(await translator.statistics_async())
+
+
+@routes.get('/metrics')
+async def metrics(request: web.Request):
+    return web.Response(body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def _start_job_workers(application: web.Application):
+    if settings.job_workers > 0:
+        job_workers.start()
+
+
+async def _stop_job_workers(application: web.Application):
+    # waits for the chunks being translated, so it must not block the event loop
+    await asyncio.get_running_loop().run_in_executor(None, job_workers.close)
+
+
+def create_app() -> web.Application:
+    application = web.Application(middlewares=[_record_request_duration, _trace_request, _handle_errors], client_max_size=settings.async_max_request_bytes)
+    application.add_routes(routes)
+    application.on_startup.append(_start_job_workers)
+    application.on_cleanup.append(_stop_job_workers)
+    return application
+
+
+app = create_app()
+
+if __name__ == "__main__":
+    web.run_app(app, port=80, host='0.0.0.0')
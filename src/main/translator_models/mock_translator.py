@@ -14,10 +14,13 @@ class MockTranslator(TranslatorModel):
         _logger.info("mock translator loaded")
 
     def translate(self, text, source_language, target_language):
+        return self.translate_batch([text], source_language, target_language)[0]
+
+    def translate_batch(self, texts, source_language, target_language):
         time.sleep(1)
         if source_language == "de":
-            return f"{text} auf Englisch"
+            return [f"{text} auf Englisch" for text in texts]
         elif source_language == "en":
-            return f"{text} in German"
+            return [f"{text} in German" for text in texts]
         else:
             raise ValueError(f"Direct Translation from {source_language} to {target_language} is not available!")
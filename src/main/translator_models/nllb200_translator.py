@@ -1,4 +1,5 @@
 from translator_models.translator_model import TranslatorModel, TranslatorModelName
+from utils.tracing import span
 from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
 import logging
 
@@ -156,6 +157,9 @@ class Nllb200Translator(TranslatorModel):
     model_name = TranslatorModelName.nlb200
     available_language_pairs = LANGUAGE_PAIRS
     translation_quality_grade = 2
+    max_input_tokens = 512
+    batch_max_tokens = 4096
+    special_tokens = 2  # source language tag and </s>
 
     def _initialize_model(self):
         self._model, self._tokenizers = self._load_model()
@@ -187,3 +191,25 @@ class Nllb200Translator(TranslatorModel):
         )
 
         return tokenizer.batch_decode(translated_tokens, skip_special_tokens=True)[0]
+
+    def count_tokens(self, text, source_language, target_language):
+        return len(self._tokenizers[source_language].tokenize(text))
+
+    def translate_batch(self, texts, source_language, target_language):
+        if not texts:
+            return []
+
+        tokenizer = self._tokenizers[source_language]
+        language_code = REVERSE_LANGUAGE_DICT[target_language]
+
+        def generate(token_ids):
+            inputs = tokenizer.pad({"input_ids": token_ids}, return_tensors='pt').to('cuda')
+            with span("generate"):
+                translated_tokens = self._model.generate(
+                    **inputs, forced_bos_token_id=tokenizer.lang_code_to_id[language_code], max_length=1000
+                )
+            return tokenizer.batch_decode(translated_tokens, skip_special_tokens=True)
+
+        with span("tokenize"):
+            token_ids = tokenizer(texts)["input_ids"]
+        return self._translate_token_batches(token_ids, generate)
@@ -34,6 +34,13 @@ class OpusMTTranslator(TranslatorModel):
         text_translated = self._model.translate(text, opus_mt_target_language, source_lang=opus_mt_source_language)
         return text_translated
 
+    def translate_batch(self, texts, source_language, target_language):
+        opus_mt_source_language, opus_mt_target_language = self.__iso639_to_opus_mt_language_codes(source_language,
+                                                                                                   target_language)
+        if not texts:
+            return []
+        return self._model.translate(list(texts), opus_mt_target_language, source_lang=opus_mt_source_language)
+
     @staticmethod
     def __iso639_to_opus_mt_language_codes(source_language: str, target_language: str) -> Tuple[str, str]:
         """
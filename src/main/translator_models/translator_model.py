@@ -1,9 +1,10 @@
 import logging
 from abc import ABC, abstractmethod
 from enum import Enum
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple
 
 from utils.timer import Timer
+from utils.token_batching import token_budget_batches
 
 _logger = logging.getLogger(__name__)
 
@@ -14,6 +15,13 @@ class TranslatorModelName(str, Enum):
     mock = "mock"
 
 class TranslatorModel(ABC):
+    max_input_tokens: Optional[int] = None
+    """ Maximum number of tokens the model translates well in one text; longer texts are split into segments before translation.
+    None if the model splits long texts itself. """
+    batch_max_tokens: Optional[int] = None
+    """ Maximum number of (padded) tokens a model translates in one call, if it batches texts by token length; None for no limit. """
+    special_tokens: int = 0
+    """ Number of special tokens (e.g. language tags, end of sentence) the tokenizer adds to every text; they count towards max_input_tokens. """
 
     def __init__(self):
         self.__initialize_model()
@@ -57,6 +65,38 @@ class TranslatorModel(ABC):
         """
         pass
 
+    def translate_batch(self, texts: List[str], source_language: str, target_language: str) -> List[str]:
+        """ Translates several texts from the same source into the same target language.
+
+        Defaults to translating text by text. Models that can process a padded batch in one call should override this.
+
+        :param texts: Texts to be translated
+        :param source_language: Source language code according to ISO-639-1 (2 letter) or ISO-639-3 (3 letter; if language not in ISO-639-1)
+        :param target_language: Target language code according to ISO-639-1 (2 letter) or ISO-639-3 (3 letter; if language not in ISO-639-1)
+        :return: The translated texts in the order of the given texts
+        """
+        return [self.translate(text, source_language, target_language) for text in texts]
+
+    def count_tokens(self, text: str, source_language: str, target_language: str) -> int:
+        """ Counts the tokens of the text (without special tokens) as the model would for the given language pair.
+
+        Defaults to counting words. Models with a max_input_tokens should override this with their tokenizer.
+        """
+        return len(text.split())
+
+    def _translate_token_batches(self, token_ids: List[List[int]], generate: Callable[[List[List[int]]], List[str]]) -> List[str]:
+        """ Translates tokenized texts in batches of similar length within the batch_max_tokens budget.
+
+        :param token_ids: Token ids of each text, without padding
+        :param generate: Pads and translates a batch of tokenized texts
+        :return: The translated texts in the order of the given texts
+        """
+        translations: List[Optional[str]] = [None] * len(token_ids)
+        for indices in token_budget_batches([len(ids) for ids in token_ids], self.batch_max_tokens):
+            for i, translation in zip(indices, generate([token_ids[i] for i in indices])):
+                translations[i] = translation
+        return translations
+
     def preload(self):
         """ Load all available models (to store them in cache). """
         for i, (source, target) in enumerate(self.available_language_pairs):
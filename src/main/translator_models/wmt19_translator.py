@@ -4,6 +4,7 @@ import logging
 from transformers import FSMTTokenizer, FSMTForConditionalGeneration
 
 from translator_models.translator_model import TranslatorModel, TranslatorModelName
+from utils.tracing import span
 
 _logger = logging.getLogger(__name__)
 
@@ -20,6 +21,9 @@ class Wmt19Translator(TranslatorModel):
     model_name = TranslatorModelName.wmt19
     available_language_pairs = LANGUAGE_TUPLES
     translation_quality_grade = 1
+    max_input_tokens = 512
+    batch_max_tokens = 8192
+    special_tokens = 1  # </s>
 
     def __init__(self):
         super().__init__()
@@ -54,3 +58,23 @@ class Wmt19Translator(TranslatorModel):
         translated_tokens = model.generate(**inputs)
 
         return tokenizer.decode(translated_tokens[0], skip_special_tokens=True)
+
+    def count_tokens(self, text, source_language, target_language):
+        return len(self._tokenizers[f"{source_language}-{target_language}"].tokenize(text))
+
+    def translate_batch(self, texts, source_language, target_language):
+        if not texts:
+            return []
+
+        tokenizer = self._tokenizers[f"{source_language}-{target_language}"]
+        model = self._models[f"{source_language}-{target_language}"]
+
+        def generate(token_ids):
+            inputs = tokenizer.pad({"input_ids": token_ids}, return_tensors='pt').to('cuda')
+            with span("generate"):
+                translated_tokens = model.generate(**inputs)
+            return tokenizer.batch_decode(translated_tokens, skip_special_tokens=True)
+
+        with span("tokenize"):
+            token_ids = tokenizer(texts)["input_ids"]
+        return self._translate_token_batches(token_ids, generate)
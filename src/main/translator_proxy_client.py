@@ -1,9 +1,9 @@
+import asyncio
 import functools
 import logging
-from contextlib import AsyncExitStack
+import time
 from typing import Any, Optional
 
-import aiodns
 import aiohttp
 import tenacity
 from tenacity import AsyncRetrying
@@ -11,6 +11,9 @@ from tenacity import AsyncRetrying
 from schemas import TranslatorApiResponseModelsSchema, TranslatorApiResponseHealthSchema, TranslatorApiResponseTranslationSchema, \
     TranslatorApiTranslationSchema, TranslatorApiResponseDetectionSchema, TranslatorApiDetectionSchema
 from settings import settings
+from utils.priority import PRIORITY_HEADER, current_priority
+from utils.srv_resolver import SrvResolver, SrvResolutionError
+from utils.tracing import SERVER_TIMING_HEADER, TRACE_HEADER, current_trace, span
 
 _logger = logging.getLogger(__name__)
 
@@ -21,78 +24,113 @@ class FailedTranslatorProxyRequest(Exception):
         super().__init__(msg)
 
 class ForwardedTranslatorProxyError(Exception):
-    def __init__(self, error, client, status_code):
+    def __init__(self, error, client, status_code, retry_after: Optional[float] = None):
         self.client = client
         self.error = error
         self.status_code = status_code
+        self.retry_after = retry_after
         _logger.debug(f"received {status_code} from client: {error}")
         super().__init__(error)
 
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
 def _async_retry(coroutine):
     @functools.wraps(coroutine)
     async def _coroutine(self, *args, **kwargs):
         async for attempt in AsyncRetrying(stop=tenacity.stop_after_attempt(3),
                                            retry=tenacity.retry_if_exception_type(FailedTranslatorProxyRequest),
-                                           wait=tenacity.wait_fixed(5),
+                                           wait=tenacity.wait_exponential_jitter(initial=0.5, max=5),
                                            reraise=True
                                            ):
             with attempt:
                 return await coroutine(self, *args, **kwargs)
     return _coroutine
 
+_shared_srv_resolver: Optional[SrvResolver] = None
+
+
+def _get_shared_srv_resolver() -> SrvResolver:
+    global _shared_srv_resolver
+    if _shared_srv_resolver is None:
+        _shared_srv_resolver = SrvResolver(min_ttl_seconds=settings.proxy_dns_min_ttl_seconds,
+                                           max_ttl_seconds=settings.proxy_dns_max_ttl_seconds)
+    return _shared_srv_resolver
+
+
 class TranslatorProxyClient:
-    """ Makes http calls to the translator client in the local namespace."""
+    """ Makes http calls to the translator client in the local namespace.
+
+    Requests share one pooled session with keep-alive connections, so a client must only be used from the
+    event loop it first made a request in. Each request is sent to one of the targets of the SRV record of the
+    client, so that requests are spread across all pods of the client."""
 
 
-    def __init__(self, client: str, session: Optional[aiohttp.ClientSession] = None):
+    def __init__(self, client: str, session: Optional[aiohttp.ClientSession] = None, resolver: Optional[SrvResolver] = None):
         self.client = client
         self._session: aiohttp.ClientSession | None = session
-        self._client_url_cache = None
+        self._session_lock = asyncio.Lock()
+        self._resolver = resolver or _get_shared_srv_resolver()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        async with self._session_lock:
+            if self._session is None or self._session.closed:
+                connector = aiohttp.TCPConnector(limit=settings.proxy_connection_limit,
+                                                 limit_per_host=settings.proxy_connection_limit_per_host,
+                                                 keepalive_timeout=settings.proxy_keepalive_timeout_seconds)
+                timeout = aiohttp.ClientTimeout(total=settings.proxy_request_timeout_seconds,
+                                                connect=settings.proxy_connect_timeout_seconds)
+                self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
 
     @property
     def _client_domain(self) -> str:
         return f"{self.client}.{settings.dns_namespace}"
 
-    @_async_retry
     async def _get_client_url_from_srv_dns(self, domain):
-
-        if self._client_url_cache:
-            return self._client_url_cache
-
-        resolver = aiodns.DNSResolver()
-        # resolve the SRV record
         try:
-            srv_records = await resolver.query(domain, 'SRV')
-        except aiodns.error.DNSError as e:
-            raise FailedTranslatorProxyRequest(self.client, f'Failed to resolve SRV domain: {str(e)}')
+            srv_target = await self._resolver.choose(domain)
+        except SrvResolutionError as e:
+            raise FailedTranslatorProxyRequest(self.client, str(e))
+        return f"http://{srv_target.host}:{srv_target.port}"
 
-        if not srv_records:
-            raise FailedTranslatorProxyRequest(self.client, f"No SRV records found for {domain}.")
-        # pick the first available SRV record
-        srv_record = srv_records[0]
-        self._client_url_cache =  f"http://{srv_record.host}:{srv_record.port}"
-        return self._client_url_cache
-
-    @_async_retry
     async def _request(self, endpoint: str, method = "GET", **kwargs) -> Any:
+        with span("proxy", f"{self.client} /{endpoint}"):
+            return await self._send_request(endpoint, method, **kwargs)
+
+    async def _send_request(self, endpoint: str, method: str, **kwargs) -> Any:
         base_url = await self._get_client_url_from_srv_dns(self._client_domain)
+        trace = current_trace.get()
+        headers = {'Accept': 'application/json',
+                   'Content-Type': 'application/json',
+                   PRIORITY_HEADER: current_priority.get().value}
+        if trace is not None:
+            headers[TRACE_HEADER] = trace.traceparent()
         try:
-            async with AsyncExitStack() as stack:
-                session = self._session
-                if not session:
-                    session = await stack.enter_async_context(aiohttp.ClientSession())
-                _logger.debug(f"Send {method} request to {base_url}/{endpoint}")
-                response = await stack.enter_async_context(session.request(method,
-                                                                           f"{base_url}/{endpoint}",
-                                                                           headers={'Accept': 'application/json',
-                                                                                    'Content-Type': 'application/json'},
-                                                                           raise_for_status=False,
-                                                                           **kwargs
-                                                                           ))
+            session = await self._get_session()
+            _logger.debug(f"Send {method} request to {base_url}/{endpoint}")
+            async with session.request(method,
+                                       f"{base_url}/{endpoint}",
+                                       headers=headers,
+                                       raise_for_status=False,
+                                       **kwargs
+                                       ) as response:
+                if trace is not None:
+                    trace.add_remote_timings(response.headers.get(SERVER_TIMING_HEADER), "client", self.client, time.monotonic())
                 result = await response.json()
                 if not response.ok:
-                    raise ForwardedTranslatorProxyError(result.get("error", ""), self.client, response.status)
+                    raise ForwardedTranslatorProxyError(result.get("error", ""), self.client, response.status,
+                                                        retry_after=_parse_retry_after(response.headers.get("Retry-After")))
                 return result
+        except ForwardedTranslatorProxyError:
+            raise
         except Exception as e:
             raise FailedTranslatorProxyRequest(self.client, f'Failed to get /{endpoint}: {str(e)}')
 
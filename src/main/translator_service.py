@@ -1,15 +1,24 @@
 import logging
+import time
 from _thread import start_new_thread
+from contextlib import ExitStack
+from typing import Iterator, Tuple
 
-from flask import Flask, request, make_response, jsonify
+from flask import Flask, Response, request, make_response, jsonify, g
 
-from constants import TranslatorMode
-from request_limitation import RequestLimiter, RequestLimitExceededException
+from constants import PriorityClass, TranslatorMode
+from instrumentation import registry, request_duration
+from request_limitation import RequestLimiter, estimate_cost
+from service_api import HANDLED_EXCEPTIONS, NDJSON_MIMETYPE, base_language, detection_text, error_record, error_response, \
+    health_body, job_items_from_json, job_items_from_upload, job_location, request_priority, results_page, \
+    translation_record, translation_request
 from settings import settings
-from translator import Translator, UnexpectedTranslationError, UnsupportedTranslationInputException, \
-    TranslatorNotReadyException, TranslatorProxy
-from translator_proxy_client import ForwardedTranslatorProxyError
+from translator import Translator, TranslatorProxy
+from translation_jobs import JobWorkers, create_job_store
 from utils.logger import configure_logger
+from utils.metrics import CONTENT_TYPE
+from utils.priority import iterate_in_context, priority_context
+from utils.tracing import SERVER_TIMING_HEADER, TRACE_HEADER, current_trace, start_trace
 
 _logger = logging.getLogger(__name__)
 
@@ -32,89 +41,151 @@ else:
     _logger.info(f"Rate limiting disabled")
     request_limit_context = RequestLimiter.no_limit_context
 
+job_store = create_job_store()
+job_workers = JobWorkers(job_store, translator.translate_batch, request_limit_context, settings.job_workers)
+registry.start()
 
-class MissingArgumentError(Exception):
-    pass
+
+def start_job_workers():
+    """ Starts the job workers of this process; called by gunicorn once a worker has loaded the app (see gunicorn.conf.py). """
+    if settings.job_workers > 0:
+        job_workers.start()
+
+
+def stop_job_workers():
+    job_workers.close()
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.monotonic()
+    g.trace_token = current_trace.set(start_trace(request.headers.get(TRACE_HEADER), settings.tracing_sample_rate, settings.tracing_log_enabled))
+
+
+@app.after_request
+def _record_request_duration(response: Response):
+    if 'request_start' in g:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        request_duration.labels(endpoint, request.method, response.status_code).observe(time.monotonic() - g.request_start)
+    trace = current_trace.get()
+    if trace is not None:
+        response.headers[SERVER_TIMING_HEADER] = trace.finish()
+    return response
+
+
+@app.teardown_request
+def _end_trace(e):
+    if 'trace_token' in g:
+        current_trace.reset(g.pop('trace_token'))
 
 
 @app.route('/health', methods=['GET', 'POST'])
 def health():
-    return jsonify(healthy=True, serviceAvailable=translator.models_loaded)
+    return jsonify(health_body(translator.models_loaded))
 
 
 @app.route('/translation', methods=['POST'])
 def translate():
-    with request_limit_context():
-        return jsonify(
-            texts=[translator.translate(text,
-                                        request.json['targetLanguage'],
-                                        source_language=request.json.get('sourceLanguage')
-                                        )
-                   for text in request.json['texts']])
+    texts, target_language, source_language = translation_request(request.json)
+    priority = request_priority(request.headers, PriorityClass.interactive)
+    with priority_context(priority), request_limit_context(cost=estimate_cost(texts), priority=priority):
+        return jsonify(texts=translator.translate_batch(texts, target_language, source_language=source_language))
+
+
+@app.route('/translation/stream', methods=['POST'])
+def translate_stream():
+    """ Streams the translations as NDJSON records {"index": ..., "text": ...} in the order in which they are translated.
+
+    Bulk priority by default, as streaming is meant for many texts.
+    """
+    texts, target_language, source_language = translation_request(request.json)
+    priority = request_priority(request.headers, PriorityClass.bulk)
+    with priority_context(priority), ExitStack() as stack:
+        stack.enter_context(request_limit_context(cost=estimate_cost(texts), priority=priority))
+        # the translations are streamed after this function returned, so they take the priority along
+        translations = iterate_in_context(translator.translate_batch_stream(texts, target_language, source_language=source_language))
+        # the request limitation ends once the response has been streamed, unless this function fails before
+        deferred = stack.pop_all()
+    response = Response(_translation_records(translations), mimetype=NDJSON_MIMETYPE)
+    response.call_on_close(deferred.close)
+    return response
+
+
+def _translation_records(translations: Iterator[Tuple[int, str]]) -> Iterator[str]:
+    try:
+        for index, text in translations:
+            yield translation_record(index, text)
+    except Exception as e:
+        yield error_record(e)
 
 
 @app.route('/detection', methods=['POST'])
 def detect():
-    with request_limit_context():
-        return jsonify(
-            text=translator.detect_language(request.json['text']))
+    text = detection_text(request.json)
+    priority = request_priority(request.headers, PriorityClass.interactive)
+    with priority_context(priority), request_limit_context(cost=estimate_cost([text]), priority=priority):
+        return jsonify(text=translator.detect_language(text))
 
 
+# Not rate limited, as jobs are only queued here and translated by the job workers.
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """ Submits a translation job of the texts of a JSON body like for /translation, or of a CSV or JSONL file uploaded
+    as form field 'file' or as the request body; the languages of the file may be given as parameters. """
+    if request.is_json:
+        items = job_items_from_json(request.json)
+    else:
+        upload = request.files.get('file')
+        content, mimetype, filename = (upload.read(), upload.mimetype, upload.filename) if upload is not None \
+            else (request.get_data(), request.mimetype, None)
+        items = job_items_from_upload(content, mimetype, filename, request.values.get('targetLanguage'), request.values.get('sourceLanguage'))
+    job = job_store.create_job(items)
+    return make_response(jsonify(job), 202, job_location(job))
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str):
+    return jsonify(job_store.get_job(job_id))
+
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id: str):
+    """ The results from the parameter 'offset' on, as far as they are translated; continue from 'nextOffset' of the response. """
+    offset, limit = results_page(request.args.get('offset'), request.args.get('limit'))
+    return jsonify(job_store.get_results(job_id, offset, limit))
+
+
+# Not rate limited, as the languages are precomputed lists of the translation graph.
 @app.route('/languages', methods=['POST'])
 def list_connected_languages():
-    with request_limit_context():
-        if 'baseLanguage' not in request.json:
-            raise MissingArgumentError("Missing parameter 'baseLanguage'")
-        return jsonify(languages=translator.list_available_languages(request.json['baseLanguage']))
+    return jsonify(languages=translator.list_available_languages(base_language(request.json)))
 
 
 @app.route('/languages', methods=['GET'])
 def list_all_languages():
-    with request_limit_context():
-        return jsonify(languages=translator.list_available_languages("en"))
+    return jsonify(languages=translator.list_available_languages("en"))
 
 @app.route('/models', methods=['GET'])
 def list_provided_models():
     with request_limit_context():
         return jsonify(models=[m.model_name for m in translator.list_models()])
 
-@app.errorhandler(UnexpectedTranslationError)
-def handle_translation_error(e):
-    _logger.error(f"Handling UnexpectedTranslationError '{e}'; returning 500")
-    return jsonify(error=e.message), 500
+@app.route('/statistics', methods=['GET'])
+def statistics():
+    return jsonify(translator.statistics())
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
 
-@app.errorhandler(UnsupportedTranslationInputException)
-def handle_unsupported_translation_input_exception(e):
-    return jsonify(error=str(e)), 400
 
+def _handle_error(e: Exception):
+    status, body, headers = error_response(e)
+    return make_response(jsonify(body), status, headers)
 
-@app.errorhandler(MissingArgumentError)
-def handle_missing_argument_error(e: MissingArgumentError):
-    return make_response(jsonify(error=str(e)), 400)
 
-
-@app.errorhandler(RequestLimitExceededException)
-def handle_request_limit_exceeded(e):
-    _logger.debug(f"Handling RequestLimitExceededException '{e}'; return 503")
-    response = make_response(jsonify(error=e.message), 503)
-    response.headers['Retry-After'] = '5'
-    return response
-
-
-@app.errorhandler(TranslatorNotReadyException)
-def handle_translator_not_ready(e):
-    _logger.debug(f"Handling TranslatorNotReadyException '{e}'; return 503")
-    response = make_response(jsonify(error=e.message), 503)
-    response.headers['Retry-After'] = '5'
-    return response
-
-@app.errorhandler(ForwardedTranslatorProxyError)
-def handle_forwarded_exception(e: ForwardedTranslatorProxyError):
-    _logger.debug(f"Handling forwarded ForwardedTranslatorProxyError '{e}'; return {e.status_code}")
-    response = make_response(jsonify(error=e.error), e.status_code)
-    response.headers['Retry-After'] = '5'
-    return response
+for _exception_class in HANDLED_EXCEPTIONS:
+    app.register_error_handler(_exception_class, _handle_error)
 
 if __name__ == "__main__":
     app.run(port=80, host='0.0.0.0', debug=True, threaded=True, processes=1)
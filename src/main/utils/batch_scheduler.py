@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from constants import PriorityClass
+from utils.priority import current_priority
+from utils.weighted_fair_queue import WeightedFairQueue
+
+_logger = logging.getLogger(__name__)
+
+BatchKey = Tuple[str, str, str]
+""" Model name, source language and target language of a batch. """
+
+
+class BatchQueueFullException(Exception):
+    """Raised when a batch queue cannot take any further segments."""
+
+    def __init__(self):
+        self.message = 'Translation queue is full'
+        Exception.__init__(self)
+
+
+class _Segment:
+    __slots__ = ("text", "translation", "error", "done")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.translation: Optional[str] = None
+        self.error: Optional[Exception] = None
+        self.done = False
+
+
+class _BatchQueue:
+
+    def __init__(self, weights: Mapping[PriorityClass, float]):
+        self.condition = threading.Condition()
+        self.pending: WeightedFairQueue[_Segment] = WeightedFairQueue(weights)
+        self.leader_active = False
+        self.batches = 0
+        self.segments = 0
+        self.max_batch_size = 0
+        self.last_batch_size = 0
+
+
+class BatchScheduler:
+    """ Merges the segments of concurrent translation calls into batches per model and language pair.
+
+    There are no dedicated worker threads: the first waiting caller of a queue becomes its leader, collects segments
+    until the batch is full or the maximum wait time expired, translates the batch and hands every caller its own
+    results. Once the segments of the leader are translated, the next waiting caller takes over.
+
+    Segments are queued per priority class and batches are collected from these queues in proportion to the weights of
+    the classes, so that a large bulk request is preempted at the next batch boundary by the segments of interactive ones.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float, max_queue_depth: int,
+                 weights: Optional[Mapping[PriorityClass, float]] = None):
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait = max(0.0, max_wait_ms / 1000.0)
+        self._max_queue_depth = max_queue_depth
+        self._weights = weights or {}
+        self._queues: Dict[BatchKey, _BatchQueue] = {}
+        self._queues_lock = threading.Lock()
+
+    def _get_queue(self, key: BatchKey) -> _BatchQueue:
+        queue = self._queues.get(key)
+        if queue is None:
+            with self._queues_lock:
+                queue = self._queues.setdefault(key, _BatchQueue(self._weights))
+        return queue
+
+    def translate_batch(self, model_name: str, language_pair: Tuple[str, str], texts: List[str],
+                        translate_batch: Callable[[List[str]], List[str]], priority: Optional[PriorityClass] = None) -> List[str]:
+        """ Queues the texts and blocks until all of them have been translated.
+
+        :param model_name: Name of the model translating the texts
+        :param language_pair: Source and target language
+        :param texts: Texts to be translated
+        :param translate_batch: Translates a batch of texts with the model; all callers of the same model and language
+         pair are expected to pass equivalent functions, as a batch may contain the texts of several callers.
+        :param priority: Priority class of the texts; the priority class of the current request if omitted
+        :return: The translated texts in the order of the given texts
+        """
+        if not texts:
+            return []
+        queue = self._get_queue((model_name, *language_pair))
+        segments = [_Segment(text) for text in texts]
+        with queue.condition:
+            # a call with more segments than the maximum depth is admitted while nothing else is queued, as it would never fit otherwise
+            if self._max_queue_depth > 0 and queue.pending and len(queue.pending) + len(segments) > self._max_queue_depth:
+                _logger.debug(f"Raise BatchQueueFullException as {len(queue.pending)} segments are queued for {model_name} {language_pair}")
+                raise BatchQueueFullException()
+            queue.pending.extend(priority or current_priority.get(), segments)
+            queue.condition.notify_all()
+            while not all(segment.done for segment in segments):
+                if queue.leader_active:
+                    queue.condition.wait()
+                else:
+                    self._translate_next_batch(queue, translate_batch)
+
+        for segment in segments:
+            if segment.error is not None:
+                raise segment.error
+        return [segment.translation for segment in segments]
+
+    def _translate_next_batch(self, queue: _BatchQueue, translate_batch: Callable[[List[str]], List[str]]):
+        """ Collects and translates the next batch of the queue. Must be called while holding the queue condition. """
+        queue.leader_active = True
+        try:
+            deadline = time.monotonic() + self._max_wait
+            while len(queue.pending) < self._max_batch_size and (remaining := deadline - time.monotonic()) > 0:
+                queue.condition.wait(remaining)
+            batch = [queue.pending.pop() for _ in range(min(self._max_batch_size, len(queue.pending)))]
+
+            queue.condition.release()
+            try:
+                translations = translate_batch([segment.text for segment in batch])
+                for segment, translation in zip(batch, translations):
+                    segment.translation = translation
+            except Exception as e:
+                for segment in batch:
+                    segment.error = e
+            finally:
+                queue.condition.acquire()
+
+            for segment in batch:
+                segment.done = True
+            queue.batches += 1
+            queue.segments += len(batch)
+            queue.last_batch_size = len(batch)
+            queue.max_batch_size = max(queue.max_batch_size, len(batch))
+        finally:
+            queue.leader_active = False
+            queue.condition.notify_all()
+
+    def queue_depths(self) -> Dict[Tuple[str, str, str, PriorityClass], int]:
+        """ Number of queued segments per model, source language, target language and priority class. """
+        return {(*key, priority): queue.pending.depth(priority) for key, queue in list(self._queues.items()) for priority in PriorityClass}
+
+    def statistics(self) -> Dict[str, Dict[str, float]]:
+        """ Queue depth and batch size statistics per model and language pair. """
+        return {f"{model_name}:{source_language}->{target_language}": {
+            "queued": len(queue.pending),
+            "queuedByPriority": {priority.value: queue.pending.depth(priority) for priority in PriorityClass},
+            "batches": queue.batches,
+            "segments": queue.segments,
+            "averageBatchSize": queue.segments / queue.batches if queue.batches else 0.0,
+            "lastBatchSize": queue.last_batch_size,
+            "maxBatchSize": queue.max_batch_size,
+        } for (model_name, source_language, target_language), queue in list(self._queues.items())}
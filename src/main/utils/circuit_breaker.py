@@ -0,0 +1,108 @@
+import logging
+import random
+import time
+from collections import deque, Counter
+from enum import Enum
+from typing import Callable, Deque, Dict, Optional
+
+_logger = logging.getLogger(__name__)
+
+
+class CircuitState(str, Enum):
+    closed = "CLOSED"
+    open = "OPEN"
+    half_open = "HALF_OPEN"
+
+
+class CircuitBreaker:
+    """ Stops sending requests to a client whose recent requests mostly failed.
+
+    Closed: requests pass; once at least `minimum_requests` of the last `window_size` requests were made and the
+    failure rate reaches the threshold, the circuit opens.
+    Open: requests are rejected without being sent, for a jittered time that doubles with each consecutive opening.
+    Half-open: once the open time has passed, a single probe request is let through; it closes the circuit if it
+    succeeds and opens it again otherwise.
+
+    Not thread-safe; meant to be used from the event loop of the proxy only.
+    """
+
+    def __init__(self, name: str, failure_rate_threshold: float, minimum_requests: int, window_size: int,
+                 open_seconds: float, max_open_seconds: float,
+                 clock: Callable[[], float] = time.monotonic, rng: Optional[random.Random] = None):
+        self.name = name
+        self._failure_rate_threshold = failure_rate_threshold
+        self._minimum_requests = max(1, minimum_requests)
+        self._outcomes: Deque[bool] = deque(maxlen=max(window_size, self._minimum_requests))
+        self._open_seconds = open_seconds
+        self._max_open_seconds = max(max_open_seconds, open_seconds)
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._state = CircuitState.closed
+        self._open_until = 0.0
+        self._consecutive_openings = 0
+        self._probe_in_flight = False
+        self.transitions: Counter = Counter()
+
+    @property
+    def state(self) -> CircuitState:
+        return self._state
+
+    def _transition(self, state: CircuitState):
+        _logger.info(f"Circuit of {self.name} changes from {self._state.value} to {state.value}.")
+        self.transitions[(self._state, state)] += 1
+        self._state = state
+
+    def _open(self):
+        self._consecutive_openings += 1
+        open_seconds = min(self._max_open_seconds, self._open_seconds * 2 ** (self._consecutive_openings - 1))
+        self._open_until = self._clock() + open_seconds / 2 + self._rng.uniform(0, open_seconds / 2)
+        self._probe_in_flight = False
+        self._transition(CircuitState.open)
+
+    @property
+    def allows_requests(self) -> bool:
+        """ Whether a request would currently be let through, without reserving it. """
+        if self._state == CircuitState.closed:
+            return True
+        if self._state == CircuitState.open:
+            return self._clock() >= self._open_until
+        return not self._probe_in_flight
+
+    def try_acquire(self) -> bool:
+        """ Reserves a request; every successful call must be followed by record_success, record_failure or release. """
+        if self._state == CircuitState.open and self._clock() >= self._open_until:
+            self._transition(CircuitState.half_open)
+        if self._state == CircuitState.closed:
+            return True
+        if self._state == CircuitState.half_open and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        if self._state == CircuitState.half_open:
+            self._outcomes.clear()
+            self._consecutive_openings = 0
+            self._probe_in_flight = False
+            self._transition(CircuitState.closed)
+        elif self._state == CircuitState.closed:
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        if self._state == CircuitState.half_open:
+            self._open()
+        elif self._state == CircuitState.closed:
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self._minimum_requests and failures / len(self._outcomes) >= self._failure_rate_threshold:
+                self._outcomes.clear()
+                self._open()
+
+    def release(self):
+        """ Gives back a reservation whose request neither succeeded nor failed (e.g. was cancelled). """
+        if self._state == CircuitState.half_open:
+            self._probe_in_flight = False
+
+    def statistics(self) -> Dict:
+        return {"state": self._state.value,
+                "transitions": {f"{from_state.value}->{to_state.value}": count for (from_state, to_state), count in self.transitions.items()}}
@@ -0,0 +1,104 @@
+import re
+from typing import Callable, List, NamedTuple
+
+# a sentence ends with a terminal punctuation mark, optionally followed by closing quotes or brackets
+_SENTENCE_BOUNDARY = re.compile(r"(?:(?<=[.!?…。！？])|(?<=[.!?…。！？][\"'”’)\]]))(\s+)")
+_PARAGRAPH_BOUNDARY = re.compile(r"(\s*\n\s*)")
+_WORD_BOUNDARY = re.compile(r"(\s+)")
+
+
+class SegmentedText(NamedTuple):
+    """ A text split into segments, with the whitespace around and between them kept to reassemble the text. """
+    segments: List[str]
+    separators: List[str]  # one more than segments: the leading whitespace, the whitespace between segments and the trailing whitespace
+
+    def join(self, translated_segments: List[str]) -> str:
+        parts = [self.separators[0]]
+        for translated_segment, separator in zip(translated_segments, self.separators[1:]):
+            parts.append(translated_segment)
+            parts.append(separator)
+        return "".join(parts)
+
+
+class DocumentSegmenter:
+    """ Splits texts that are too long for a model into segments of at most `max_tokens` tokens.
+
+    Paragraphs are never merged; within a paragraph, consecutive sentences are packed into one segment as long as they
+    fit, and sentences that do not fit on their own are split between words. Texts that fit are left untouched.
+    """
+
+    def __init__(self, max_tokens: int, count_tokens: Callable[[str], int], special_tokens: int = 0):
+        """
+        :param max_tokens: Maximum number of tokens of a segment, including the special tokens
+        :param count_tokens: Counts the tokens of a text as the model would, without special tokens
+        :param special_tokens: Number of special tokens (e.g. language tags, end of sentence) the model adds to every text
+        """
+        self._max_tokens = max(1, max_tokens - special_tokens)
+        self._count_tokens = count_tokens
+
+    def _fits(self, text: str) -> bool:
+        # a token covers at least one character, so texts with no more characters than the tokens left besides the special
+        # tokens do not need to be tokenized
+        return len(text) <= self._max_tokens or self._count_tokens(text) <= self._max_tokens
+
+    def segment(self, text: str) -> SegmentedText:
+        stripped = text.strip()
+        if not stripped or self._fits(text):
+            return SegmentedText([text], ["", ""])
+
+        leading = text[:len(text) - len(text.lstrip())]
+        trailing = text[len(text.rstrip()):]
+        segments: List[str] = []
+        separators: List[str] = [leading]
+        paragraphs = _PARAGRAPH_BOUNDARY.split(stripped)  # alternating paragraphs and the whitespace between them
+        for i in range(0, len(paragraphs), 2):
+            if i > 0:
+                separators.append(paragraphs[i - 1])
+            self.__segment_paragraph(paragraphs[i], segments, separators)
+        separators.append(trailing)
+        return SegmentedText(segments, separators)
+
+    def __segment_paragraph(self, paragraph: str, segments: List[str], separators: List[str]):
+        """ Appends the segments of the paragraph and the separators between them. """
+        if self._fits(paragraph):
+            segments.append(paragraph)
+            return
+        self.__pack(_SENTENCE_BOUNDARY.split(paragraph), segments, separators, split_long_parts=True)
+
+    def __pack(self, parts: List[str], segments: List[str], separators: List[str], split_long_parts: bool):
+        """ Greedily packs consecutive parts (alternating with their separators) into segments of at most max_tokens tokens. """
+        segment = ""
+        segment_tokens = 0
+        for i in range(0, len(parts), 2):
+            part = parts[i]
+            part_tokens = self._count_tokens(part)
+            if segment and segment_tokens + part_tokens <= self._max_tokens:
+                segment += parts[i - 1] + part
+                segment_tokens += part_tokens
+                continue
+            if segment:
+                segments.append(segment)
+                separators.append(parts[i - 1])
+            if part_tokens > self._max_tokens and split_long_parts:
+                self.__pack(_WORD_BOUNDARY.split(part), segments, separators, split_long_parts=False)
+                # the following sentences may still be packed into the last segment of the split sentence
+                segment = segments.pop()
+                segment_tokens = self._count_tokens(segment)
+            else:
+                segment, segment_tokens = part, part_tokens
+        segments.append(segment)
+
+
+def flatten_segments(segmented_texts: List[SegmentedText]) -> List[str]:
+    """ The segments of all texts as one batch. """
+    return [segment for segmented_text in segmented_texts for segment in segmented_text.segments]
+
+
+def join_segments(segmented_texts: List[SegmentedText], translated_segments: List[str]) -> List[str]:
+    """ Reassembles the translated texts from the translations of the flattened segments. """
+    translations = []
+    offset = 0
+    for segmented_text in segmented_texts:
+        translations.append(segmented_text.join(translated_segments[offset:offset + len(segmented_text.segments)]))
+        offset += len(segmented_text.segments)
+    return translations
@@ -0,0 +1,48 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Coroutine, Optional
+
+_logger = logging.getLogger(__name__)
+
+
+class BackgroundEventLoop:
+    """ Runs an asyncio event loop in a daemon thread for the lifetime of the object.
+
+    Synchronous code (e.g. Flask request handlers) submits coroutines to this loop instead of creating a new event
+    loop per call, so that loop-bound resources such as pooled HTTP sessions can be reused across calls.
+    """
+
+    def __init__(self, name: str = "background-event-loop"):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name=name, daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def submit(self, coroutine: Coroutine) -> concurrent.futures.Future:
+        """ Schedules the coroutine on the loop and returns a future for its result. """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def run(self, coroutine: Coroutine, timeout: Optional[float] = None) -> Any:
+        """ Runs the coroutine on the loop and blocks until it is done.
+
+        Must not be called from within the loop itself, as this would block the loop forever.
+        """
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError("BackgroundEventLoop.run must not be called from within its own event loop.")
+        return self.submit(coroutine).result(timeout)
+
+    def close(self):
+        """ Stops the loop and waits for its thread to finish. """
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
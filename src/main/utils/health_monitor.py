@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+_logger = logging.getLogger(__name__)
+
+
+class _ClientHealth:
+    __slots__ = ("available", "last_check", "last_success", "consecutive_failures", "last_error")
+
+    def __init__(self):
+        self.available = False
+        self.last_check: Optional[float] = None
+        self.last_success: Optional[float] = None
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+
+
+class HealthMonitor:
+    """ Keeps the health state of the translator clients up to date by polling them in the background.
+
+    Every client is polled by its own task on the event loop of the proxy, once per interval while its checks
+    succeed and with exponentially growing delays while they fail. All delays are jittered, so that the replicas of
+    the proxy do not probe the clients in lockstep. Reading the health state never waits for a client; a client whose
+    last successful check is older than the staleness limit counts as unavailable.
+    """
+
+    def __init__(self, clients: List[str], check_health: Callable[[str], Awaitable[bool]], interval_seconds: float,
+                 max_backoff_seconds: float, stale_after_seconds: float,
+                 clock: Callable[[], float] = time.monotonic, rng: Optional[random.Random] = None):
+        self._clients = list(clients)
+        self._check_health = check_health
+        self._interval_seconds = interval_seconds
+        self._max_backoff_seconds = max(max_backoff_seconds, interval_seconds)
+        self._stale_after_seconds = stale_after_seconds
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._health: Dict[str, _ClientHealth] = {client: _ClientHealth() for client in self._clients}
+        self._tasks: List[asyncio.Task] = []
+
+    async def _check_client(self, client: str):
+        health = self._health[client]
+        try:
+            available = await self._check_health(client)
+            error = None
+        except Exception as e:
+            available = False
+            error = f"{type(e).__name__}: {e}"
+            _logger.warning(f"Health check of client {client} failed: {error}")
+        now = self._clock()
+        if available != health.available:
+            _logger.info(f"Client {client} is now {'available' if available else 'unavailable'}.")
+        health.available = available
+        health.last_check = now
+        health.last_error = error
+        if error is None:
+            health.last_success = now
+            health.consecutive_failures = 0
+        else:
+            health.consecutive_failures += 1
+
+    async def refresh(self):
+        """ Checks the health of all clients once. """
+        await asyncio.gather(*[self._check_client(client) for client in self._clients])
+
+    def _next_delay(self, client: str) -> float:
+        """ Interval, doubled per consecutive failure up to the maximum backoff, with jitter of up to half of it. """
+        failures = self._health[client].consecutive_failures
+        delay = min(self._max_backoff_seconds, self._interval_seconds * 2 ** failures) if failures else self._interval_seconds
+        return delay / 2 + self._rng.uniform(0, delay / 2)
+
+    async def _poll(self, client: str):
+        while True:
+            await asyncio.sleep(self._next_delay(client))
+            await self._check_client(client)
+
+    def start(self):
+        """ Starts polling all clients; must be called from within the event loop. """
+        if not self._tasks:
+            self._tasks = [asyncio.get_running_loop().create_task(self._poll(client), name=f"health-monitor-{client}")
+                           for client in self._clients]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _is_stale(self, health: _ClientHealth, now: float) -> bool:
+        return health.last_success is None or now - health.last_success > self._stale_after_seconds
+
+    def is_available(self, client: str) -> bool:
+        health = self._health[client]
+        return health.available and not self._is_stale(health, self._clock())
+
+    @property
+    def all_available(self) -> bool:
+        now = self._clock()
+        return all(health.available and not self._is_stale(health, now) for health in self._health.values())
+
+    def statistics(self) -> Dict[str, Dict]:
+        now = self._clock()
+        return {client: {"available": health.available,
+                         "stale": self._is_stale(health, now),
+                         "secondsSinceLastCheck": None if health.last_check is None else now - health.last_check,
+                         "secondsSinceLastSuccess": None if health.last_success is None else now - health.last_success,
+                         "consecutiveFailures": health.consecutive_failures,
+                         "lastError": health.last_error}
+                for client, health in self._health.items()}
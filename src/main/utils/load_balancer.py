@@ -0,0 +1,126 @@
+import contextlib
+import logging
+import math
+import random
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+from constants import BalancingPolicy
+
+_logger = logging.getLogger(__name__)
+
+
+class _ClientLoad:
+    __slots__ = ("in_flight", "latency", "last_update", "requests", "failures", "unavailable_until")
+
+    def __init__(self):
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self.last_update = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.unavailable_until = 0.0
+
+
+class LoadBalancer:
+    """ Chooses the translator client for a request based on the load of the clients.
+
+    Tracks the requests in flight and an exponentially weighted moving average of the latency of every client.
+    Clients that rejected a request (e.g. 503 with Retry-After) are skipped until their retry delay has passed,
+    unless no other client is left. Not thread-safe; meant to be used from the event loop of the proxy only.
+
+    Policies:
+        - random: uniformly random client
+        - least outstanding: client with the fewest requests in flight
+        - ewma: the better of two random clients (power of two choices), scored by latency times load
+    """
+
+    def __init__(self, policy: BalancingPolicy, ewma_decay_seconds: float,
+                 clock: Callable[[], float] = time.monotonic, rng: Optional[random.Random] = None):
+        self._policy = BalancingPolicy(policy)
+        self._ewma_decay_seconds = ewma_decay_seconds
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._loads: Dict[str, _ClientLoad] = {}
+
+    @property
+    def policy(self) -> BalancingPolicy:
+        return self._policy
+
+    def _get_load(self, client: str) -> _ClientLoad:
+        load = self._loads.get(client)
+        if load is None:
+            load = self._loads[client] = _ClientLoad()
+        return load
+
+    def is_available(self, client: str) -> bool:
+        return self._clock() >= self._get_load(client).unavailable_until
+
+    def _score(self, client: str) -> float:
+        """ Expected latency of one more request; clients without measurements score 0 so they get probed. """
+        load = self._get_load(client)
+        return (load.latency or 0.0) * (load.in_flight + 1)
+
+    def choose(self, clients: Sequence[str]) -> str:
+        """ Chooses one of the clients, preferring those that are available. """
+        if not clients:
+            raise ValueError("No clients to choose from.")
+        candidates: List[str] = [client for client in clients if self.is_available(client)] or list(clients)
+        if len(candidates) == 1:
+            return candidates[0]
+
+        if self._policy == BalancingPolicy.least_outstanding:
+            least_in_flight = min(self._get_load(client).in_flight for client in candidates)
+            return self._rng.choice([client for client in candidates if self._get_load(client).in_flight == least_in_flight])
+        if self._policy == BalancingPolicy.ewma:
+            first, second = self._rng.sample(candidates, 2)
+            return first if self._score(first) <= self._score(second) else second
+        return self._rng.choice(candidates)
+
+    @contextlib.contextmanager
+    def track(self, client: str, is_failure: Callable[[Exception], bool] = lambda e: True) -> Iterator[None]:
+        """ Counts a request to the client as in flight and records its latency if it succeeds.
+
+        Errors for which is_failure is false (e.g. a client rejecting invalid input) still count as answered requests.
+        """
+        load = self._get_load(client)
+        load.in_flight += 1
+        load.requests += 1
+        start = self._clock()
+        try:
+            yield
+        except Exception as e:
+            # cancellation (e.g. of a hedged request that lost) is not a failure of the client
+            if is_failure(e):
+                load.failures += 1
+            else:
+                self._record_latency(load, self._clock() - start)
+            raise
+        else:
+            self._record_latency(load, self._clock() - start)
+        finally:
+            load.in_flight -= 1
+
+    def _record_latency(self, load: _ClientLoad, latency: float):
+        now = self._clock()
+        if load.latency is None:
+            load.latency = latency
+        else:
+            # the older the average, the less weight it keeps
+            weight = math.exp(-(now - load.last_update) / self._ewma_decay_seconds) if self._ewma_decay_seconds > 0 else 0.0
+            load.latency = weight * load.latency + (1 - weight) * latency
+        load.last_update = now
+
+    def mark_unavailable(self, client: str, retry_after_seconds: float):
+        """ Skips the client when choosing until the retry delay has passed. """
+        load = self._get_load(client)
+        load.unavailable_until = max(load.unavailable_until, self._clock() + retry_after_seconds)
+        _logger.info(f"Routing around client {client} for {retry_after_seconds}s.")
+
+    def statistics(self) -> Dict[str, Dict[str, float]]:
+        return {client: {"inFlight": load.in_flight,
+                         "latencySeconds": load.latency,
+                         "requests": load.requests,
+                         "failures": load.failures,
+                         "available": self.is_available(client)}
+                for client, load in self._loads.items()}
@@ -0,0 +1,405 @@
+import atexit
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from enum import Enum
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+_logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+""" Content type of the Prometheus text exposition format. """
+
+LATENCY_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+Labels = Tuple[str, ...]
+_Samples = Dict[Labels, List[float]]
+
+
+def _label_value(value: Any) -> str:
+    return value.value if isinstance(value, Enum) else str(value)
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(labels: List[str]) -> str:
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _ThreadShards:
+    """ Values recorded by each thread in its own shard, so that recording takes no lock; the shards are summed up on collection. """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Dict[Labels, List[float]]] = []
+        self._shards_lock = threading.Lock()
+
+    def values(self, key: Labels, size: int) -> List[float]:
+        """ The values of the current thread for the labels; only the current thread may change them. """
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0.0] * size
+        return values
+
+    def totals(self) -> _Samples:
+        with self._shards_lock:
+            shards = list(self._shards)
+        totals: _Samples = {}
+        for shard in shards:
+            for key, values in list(shard.items()):
+                total = totals.setdefault(key, [0.0] * len(values))
+                for i, value in enumerate(values):
+                    total[i] += value
+        return totals
+
+
+class _Metric(ABC):
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Labels, Any] = {}
+        self._callback: Optional[Callable[[], Mapping[Sequence[Any], float]]] = None
+
+    def labels(self, *values: Any):
+        """ The series of the label values, in the order of the label names; enums are labelled with their values. """
+        key = tuple(_label_value(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} has labels {self.labelnames}, got {values}")
+            child = self._children.setdefault(key, self._child(key))
+        return child
+
+    @abstractmethod
+    def _child(self, key: Labels):
+        """ A new series of the label values. """
+
+    def set_callback(self, callback: Callable[[], Mapping[Sequence[Any], float]]):
+        """ Reads the values of the series on collection from the callback, which maps label values to values and replaces any previous one.
+
+        This way, values that are counted anyway (e.g. by a cache) are exported without any cost on the hot path.
+        """
+        self._callback = callback
+
+    def _callback_samples(self) -> _Samples:
+        if self._callback is None:
+            return {}
+        try:
+            return {tuple(_label_value(value) for value in labels): [float(value)] for labels, value in self._callback().items()}
+        except Exception as e:
+            _logger.warning(f"Failed to collect metric {self.name}: {type(e).__name__} - {e}")
+            return {}
+
+    @abstractmethod
+    def samples(self) -> _Samples:
+        """ The values of each series of this process, keyed by their label values. """
+
+    def describe(self) -> Dict[str, Any]:
+        return {"type": self.type, "help": self.documentation, "labelnames": list(self.labelnames)}
+
+
+class _CounterChild:
+    __slots__ = ("_shards", "_key")
+
+    def __init__(self, shards: _ThreadShards, key: Labels):
+        self._shards = shards
+        self._key = key
+
+    def inc(self, amount: float = 1.0):
+        self._shards.values(self._key, 1)[0] += amount
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        super().__init__(name, documentation, labelnames)
+        self._shards = _ThreadShards()
+
+    def _child(self, key: Labels) -> _CounterChild:
+        return _CounterChild(self._shards, key)
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def samples(self) -> _Samples:
+        return {**self._shards.totals(), **self._callback_samples()}
+
+
+class _GaugeChild:
+    __slots__ = ("_values", "_key")
+
+    def __init__(self, values: Dict[Labels, float], key: Labels):
+        self._values = values
+        self._key = key
+
+    def set(self, value: float):
+        self._values[self._key] = value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """ Sets the gauge to the seconds the block took. """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.set(time.monotonic() - start)
+
+
+class Gauge(_Metric):
+    """ A value of each process, combined across processes by the multiprocess mode: 'sum' or 'max' of the live processes. """
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], multiprocess_mode: str = "sum"):
+        if multiprocess_mode not in ("sum", "max"):
+            raise ValueError(f"Unknown multiprocess mode {multiprocess_mode}")
+        super().__init__(name, documentation, labelnames)
+        self.multiprocess_mode = multiprocess_mode
+        self._values: Dict[Labels, float] = {}
+
+    def _child(self, key: Labels) -> _GaugeChild:
+        return _GaugeChild(self._values, key)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def samples(self) -> _Samples:
+        return {**{key: [value] for key, value in list(self._values.items())}, **self._callback_samples()}
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "multiprocessMode": self.multiprocess_mode}
+
+
+class _HistogramChild:
+    __slots__ = ("_shards", "_key", "_buckets")
+
+    def __init__(self, shards: _ThreadShards, key: Labels, buckets: Tuple[float, ...]):
+        self._shards = shards
+        self._key = key
+        self._buckets = buckets
+
+    def observe(self, value: float):
+        # the count of each bucket (not cumulative), the count above the last bucket and the sum
+        values = self._shards.values(self._key, len(self._buckets) + 2)
+        values[bisect.bisect_left(self._buckets, value)] += 1
+        values[-1] += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """ Observes the seconds the block took, also if it raised. """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS_SECONDS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(bucket) for bucket in buckets))
+        self._shards = _ThreadShards()
+
+    def _child(self, key: Labels) -> _HistogramChild:
+        return _HistogramChild(self._shards, key, self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def set_callback(self, callback):
+        raise TypeError("Histograms can only be observed")
+
+    def samples(self) -> _Samples:
+        return self._shards.totals()
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "buckets": list(self.buckets)}
+
+
+class _Family:
+
+    def __init__(self, description: Dict[str, Any], samples: _Samples):
+        self.description = description
+        self.samples = samples
+
+    def merge(self, samples: _Samples):
+        max_values = self.description["type"] == "gauge" and self.description.get("multiprocessMode") == "max"
+        for key, values in samples.items():
+            total = self.samples.get(key)
+            if total is None:
+                self.samples[key] = list(values)
+            elif len(total) == len(values):
+                self.samples[key] = [max(a, b) if max_values else a + b for a, b in zip(total, values)]
+
+
+class MetricsRegistry:
+    """ Metrics of the translator, exported in the Prometheus text format.
+
+    Counters and histograms are recorded in per-thread shards without taking a lock, gauges are plain assignments or
+    read from callbacks on collection. With a multiprocess directory (e.g. for several gunicorn workers), each process
+    writes its metrics to a file there periodically and on exit, and any process exports the metrics of all of them:
+    counters and histograms summed up including those of exited processes, gauges of live processes only. The
+    directory should be emptied before the service starts.
+    """
+
+    def __init__(self, multiprocess_dir: Optional[str] = None, write_interval_seconds: float = 5.0):
+        self._metrics: Dict[str, _Metric] = {}
+        self._metrics_lock = threading.Lock()
+        self._multiprocess_dir = multiprocess_dir
+        self._write_interval_seconds = write_interval_seconds
+        self._closed = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+    def _register(self, metric_class, name: str, *args, **kwargs):
+        """ The metric of the name, registered if it does not exist yet, so that reloaded modules get the same metric. """
+        with self._metrics_lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+            elif type(metric) is not metric_class:
+                raise ValueError(f"Metric {name} is already registered as {metric.type}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), multiprocess_mode: str = "sum") -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames, multiprocess_mode=multiprocess_mode)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS_SECONDS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """ The metrics of this process, as JSON serializable dictionary. """
+        with self._metrics_lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: {**metric.describe(), "samples": [[list(key), values] for key, values in metric.samples().items()]}
+                for metric in metrics}
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self._multiprocess_dir, f"metrics_{pid}.json")
+
+    def write_snapshot(self):
+        """ Writes the metrics of this process to the multiprocess directory, replacing its previous file atomically. """
+        if not self._multiprocess_dir:
+            return
+        path = self._snapshot_path(os.getpid())
+        try:
+            with open(f"{path}.tmp", "w") as file:
+                json.dump(self.snapshot(), file)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            _logger.warning(f"Failed to write metrics to {path}: {type(e).__name__} - {e}")
+
+    def _read_snapshots(self) -> Iterator[Tuple[int, Dict[str, Dict[str, Any]]]]:
+        for path in glob.glob(os.path.join(self._multiprocess_dir, "metrics_*.json")):
+            try:
+                pid = int(os.path.basename(path)[len("metrics_"):-len(".json")])
+                with open(path) as file:
+                    yield pid, json.load(file)
+            except (OSError, ValueError) as e:
+                _logger.warning(f"Failed to read metrics from {path}: {type(e).__name__} - {e}")
+
+    def collect(self) -> Dict[str, _Family]:
+        """ The metrics of this process, and of all other processes sharing the multiprocess directory. """
+        families = {name: _Family({k: v for k, v in data.items() if k != "samples"}, {tuple(key): values for key, values in data["samples"]})
+                    for name, data in self.snapshot().items()}
+        if not self._multiprocess_dir:
+            return families
+        own_pid = os.getpid()
+        for pid, snapshot in self._read_snapshots():
+            if pid == own_pid:
+                continue
+            alive = None
+            for name, data in snapshot.items():
+                family = families.get(name)
+                if family is None:
+                    family = families[name] = _Family({k: v for k, v in data.items() if k != "samples"}, {})
+                if family.description["type"] != data["type"]:
+                    continue
+                if data["type"] == "gauge":
+                    alive = _process_alive(pid) if alive is None else alive
+                    if not alive:
+                        continue
+                family.merge({tuple(key): values for key, values in data["samples"]})
+        return families
+
+    def render(self) -> str:
+        """ The metrics in the Prometheus text exposition format. """
+        lines = []
+        for name, family in sorted(self.collect().items()):
+            description = family.description
+            lines.append(f"# HELP {name} {_escape(description['help'])}")
+            lines.append(f"# TYPE {name} {description['type']}")
+            labelnames = description["labelnames"]
+            for key, values in sorted(family.samples.items()):
+                labels = [f'{labelname}="{_escape(value)}"' for labelname, value in zip(labelnames, key)]
+                if description["type"] != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(values[0])}")
+                    continue
+                cumulative = 0.0
+                for bound, count in zip([*description["buckets"], math.inf], values):
+                    cumulative += count
+                    bucket_labels = [*labels, 'le="' + _format_value(bound) + '"']
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {_format_value(cumulative)}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-1])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {_format_value(cumulative)}")
+        return "\n".join(lines) + "\n"
+
+    def start(self):
+        """ Starts writing the metrics of this process to the multiprocess directory, if there is one. """
+        if not self._multiprocess_dir or self._writer is not None:
+            return
+        os.makedirs(self._multiprocess_dir, exist_ok=True)
+        self._writer = threading.Thread(target=self._write_periodically, name="metrics-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _write_periodically(self):
+        self.write_snapshot()
+        while not self._closed.wait(self._write_interval_seconds):
+            self.write_snapshot()
+
+    def close(self):
+        """ Stops writing periodically, after writing the final metrics of this process. """
+        self._closed.set()
+        self.write_snapshot()
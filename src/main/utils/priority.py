@@ -0,0 +1,55 @@
+import contextvars
+from contextlib import contextmanager
+from typing import Iterator, Optional, TypeVar
+
+from constants import PriorityClass
+
+_T = TypeVar("_T")
+
+PRIORITY_HEADER = "X-Translator-Priority"
+
+current_priority: contextvars.ContextVar[PriorityClass] = contextvars.ContextVar("current_priority", default=PriorityClass.interactive)
+""" Priority class of the request being processed; read by the admission control, the batch scheduler and the proxy clients. """
+
+
+class InvalidPriorityException(Exception):
+    """Raised when a request names an unknown priority class"""
+
+    def __init__(self, value: str):
+        self.message = f"Unknown priority class '{value}', expected one of {', '.join(p.value for p in PriorityClass)}"
+        Exception.__init__(self, self.message)
+
+
+def parse_priority(value: Optional[str], default: PriorityClass) -> PriorityClass:
+    """ The priority class named by the header value (case-insensitive), or the default of the endpoint if there is none. """
+    if not value:
+        return default
+    try:
+        return PriorityClass(value.strip().upper())
+    except ValueError:
+        raise InvalidPriorityException(value)
+
+
+@contextmanager
+def priority_context(priority: PriorityClass):
+    token = current_priority.set(priority)
+    try:
+        yield priority
+    finally:
+        current_priority.reset(token)
+
+
+def iterate_in_context(iterator: Iterator[_T]) -> Iterator[_T]:
+    """ Iterates with the context variables of the caller, e.g. for a streamed response that is consumed after its request handler returned. """
+    context = contextvars.copy_context()
+
+    def _iterate():
+        end = object()
+        try:
+            while (item := context.run(next, iterator, end)) is not end:
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                context.run(close)
+    return _iterate()
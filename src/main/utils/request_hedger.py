@@ -0,0 +1,69 @@
+import math
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+_WINDOW_SIZE = 256
+""" Number of recent latencies per key and batch size class the hedging delay is computed from. """
+_MIN_SAMPLES = 20
+""" Requests are only hedged once this many latencies are known for their key and batch size class. """
+_MAX_BUDGET = 10.0
+""" Maximum number of hedges that can be saved up while requests are fast. """
+
+
+def _size_class(batch_size: int) -> int:
+    """ Batch sizes are grouped by powers of two: 1, 2, 3-4, 5-8, ... """
+    return max(0, batch_size - 1).bit_length()
+
+
+class RequestHedger:
+    """ Decides when a request gets a hedge, i.e. is sent to a second client while the first has not answered yet.
+
+    The hedging delay is a percentile of the recent latencies of requests of the same kind (e.g. per model) and of
+    similar batch size, so only the slowest requests are hedged rather than all large batches. Hedges are limited by
+    a budget: every request earns a fraction of a hedge and every hedge spends one, which bounds the extra load on
+    the clients to that fraction. Not thread-safe; meant to be used from the event loop of the proxy only.
+    """
+
+    def __init__(self, percentile: float, min_delay_seconds: float, budget_ratio: float):
+        self._percentile = min(100.0, max(0.0, percentile))
+        self._min_delay_seconds = min_delay_seconds
+        self._budget_ratio = budget_ratio
+        self._budget = 0.0
+        self._latencies: Dict[Tuple[str, int], Deque[float]] = {}
+        self.requests = 0
+        self.hedges = 0
+        self.hedges_won = 0
+        self.budget_exhausted = 0
+
+    def record(self, key: str, latency: float, batch_size: int = 1):
+        self._latencies.setdefault((key, _size_class(batch_size)), deque(maxlen=_WINDOW_SIZE)).append(latency)
+
+    def delay(self, key: str, batch_size: int = 1) -> Optional[float]:
+        """ Time after which a request of the given kind and batch size is hedged; None if too few latencies are known yet. """
+        self.requests += 1
+        self._budget = min(_MAX_BUDGET, self._budget + self._budget_ratio)
+        latencies = self._latencies.get((key, _size_class(batch_size)))
+        if latencies is None or len(latencies) < _MIN_SAMPLES:
+            return None
+        sorted_latencies = sorted(latencies)
+        index = min(len(sorted_latencies) - 1, math.ceil(self._percentile / 100 * len(sorted_latencies)) - 1)
+        return max(self._min_delay_seconds, sorted_latencies[max(0, index)])
+
+    def try_acquire(self) -> bool:
+        """ Spends one hedge of the budget, if available. """
+        if self._budget < 1:
+            self.budget_exhausted += 1
+            return False
+        self._budget -= 1
+        self.hedges += 1
+        return True
+
+    def record_hedge_won(self):
+        self.hedges_won += 1
+
+    def statistics(self) -> Dict[str, float]:
+        return {"requests": self.requests,
+                "hedges": self.hedges,
+                "hedgesWon": self.hedges_won,
+                "budgetExhausted": self.budget_exhausted,
+                "budget": self._budget}
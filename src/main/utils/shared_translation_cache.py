@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import time
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import redis
+
+from utils.translation_cache import TranslationCacheKey
+
+_logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "translation:"
+_RAW_VALUE = b"r"
+_COMPRESSED_VALUE = b"z"
+
+
+class SharedTranslationCache:
+    """ Second-level translation cache stored in Redis, shared by all replicas.
+
+    Whole request batches are read with one MGET and written with one pipeline. Values are utf-8 encoded and
+    zlib compressed beyond a configurable size. Redis being slow or down never fails a translation: lookups are
+    treated as misses, and Redis is not asked again until the retry delay has passed.
+    """
+
+    def __init__(self, redis_client: redis.Redis, ttl_seconds: int, compression_min_bytes: int,
+                 retry_after_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self._redis = redis_client
+        self._ttl_seconds = ttl_seconds
+        self._compression_min_bytes = compression_min_bytes
+        self._retry_after_seconds = retry_after_seconds
+        self._clock = clock
+        self._unavailable_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @classmethod
+    def from_settings(cls, translator_settings) -> "SharedTranslationCache":
+        timeout = translator_settings.shared_cache_timeout_ms / 1000.0
+        redis_client = redis.Redis(host=translator_settings.redis_host, port=translator_settings.redis_port, db=0,
+                                   socket_timeout=timeout, socket_connect_timeout=timeout)
+        return cls(redis_client,
+                   ttl_seconds=translator_settings.shared_cache_ttl_seconds,
+                   compression_min_bytes=translator_settings.shared_cache_compression_min_bytes,
+                   retry_after_seconds=translator_settings.shared_cache_retry_after_seconds)
+
+    @property
+    def available(self) -> bool:
+        return self._clock() >= self._unavailable_until
+
+    @staticmethod
+    def _redis_key(key: TranslationCacheKey) -> str:
+        key_string = "\x1f".join((key.text, key.source_language or "", key.target_language, *key.models))
+        return _KEY_PREFIX + hashlib.blake2b(key_string.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _encode(self, translation: str) -> bytes:
+        value = translation.encode("utf-8")
+        if 0 < self._compression_min_bytes <= len(value):
+            return _COMPRESSED_VALUE + zlib.compress(value)
+        return _RAW_VALUE + value
+
+    @staticmethod
+    def _decode(value: bytes) -> str:
+        if value[:1] == _COMPRESSED_VALUE:
+            return zlib.decompress(value[1:]).decode("utf-8")
+        return value[1:].decode("utf-8")
+
+    def _handle_error(self, e: Exception):
+        self.errors += 1
+        self._unavailable_until = self._clock() + self._retry_after_seconds
+        _logger.warning(f"Shared translation cache unavailable for {self._retry_after_seconds}s: {type(e).__name__} - {e}")
+
+    def get_many(self, keys: List[TranslationCacheKey]) -> List[Optional[str]]:
+        """ Looks up the translations for all keys with one MGET; None for keys not cached or if Redis is unavailable. """
+        if not keys or not self.available:
+            return [None] * len(keys)
+        try:
+            values = self._redis.mget([self._redis_key(key) for key in keys])
+            translations = [None if value is None else self._decode(value) for value in values]
+        except (redis.RedisError, zlib.error, UnicodeDecodeError) as e:
+            self._handle_error(e)
+            return [None] * len(keys)
+        hits = sum(translation is not None for translation in translations)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return translations
+
+    def put_many(self, items: Iterable[Tuple[TranslationCacheKey, str]]):
+        """ Stores the translations with one pipelined round trip; failures are logged and otherwise ignored. """
+        if not self.available:
+            return
+        try:
+            pipeline = self._redis.pipeline(transaction=False)
+            for key, translation in items:
+                pipeline.set(self._redis_key(key), self._encode(translation), ex=self._ttl_seconds)
+            pipeline.execute()
+        except redis.RedisError as e:
+            self._handle_error(e)
+
+    def statistics(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "available": self.available,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": self.hits / lookups if lookups else 0.0,
+            "errors": self.errors,
+        }
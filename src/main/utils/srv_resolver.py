@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set
+
+import aiodns
+
+_logger = logging.getLogger(__name__)
+
+_REFRESH_AHEAD_FRACTION = 0.75
+""" Fraction of the TTL after which cached records are refreshed in the background. """
+
+
+class SrvResolutionError(Exception):
+    def __init__(self, domain: str, message: str):
+        self.domain = domain
+        super().__init__(message)
+
+
+class SrvTarget(NamedTuple):
+    host: str
+    port: int
+    priority: int
+    weight: int
+
+
+class _CachedTargets:
+    __slots__ = ("targets", "refresh_at", "expires_at")
+
+    def __init__(self, targets: List[SrvTarget], refresh_at: float, expires_at: float):
+        self.targets = targets
+        self.refresh_at = refresh_at
+        self.expires_at = expires_at
+
+
+class SrvResolver:
+    """ Resolves SRV records, caching them according to their TTL, and spreads requests across their targets.
+
+    Targets are chosen among those of the lowest priority, at random and proportional to their weight (RFC 2782).
+    Records are refreshed in the background once most of their TTL has passed, by a timer on the event loop if they
+    have been looked up since they were resolved (otherwise by the next lookup), so lookups only wait for DNS on the
+    first request or after the records expired. If a refresh fails, the previous records keep being used until
+    they expire. Meant to be shared by all clients running on one event loop.
+    """
+
+    def __init__(self, min_ttl_seconds: float, max_ttl_seconds: float,
+                 query: Optional[Callable[[str], Awaitable[List[Any]]]] = None,
+                 clock: Callable[[], float] = time.monotonic, rng: Optional[random.Random] = None):
+        """
+        :param query: Coroutine function returning the SRV records of a domain (with host, port, priority, weight
+            and ttl attributes); by default, records are queried with aiodns.
+        """
+        self._min_ttl_seconds = min_ttl_seconds
+        self._max_ttl_seconds = max(max_ttl_seconds, min_ttl_seconds)
+        self._query = query or self._query_dns
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._cache: Dict[str, _CachedTargets] = {}
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._refresh_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._looked_up: Set[str] = set()
+        self._dns_resolver: Optional[aiodns.DNSResolver] = None
+
+    async def _query_dns(self, domain: str) -> List[Any]:
+        loop = asyncio.get_running_loop()
+        if self._dns_resolver is None or self._dns_resolver.loop is not loop:
+            self._dns_resolver = aiodns.DNSResolver(loop=loop)
+        try:
+            return await self._dns_resolver.query(domain, 'SRV')
+        except aiodns.error.DNSError as e:
+            raise SrvResolutionError(domain, f"Failed to resolve SRV domain {domain}: {e}")
+
+    async def _resolve(self, domain: str) -> _CachedTargets:
+        records = await self._query(domain)
+        if not records:
+            raise SrvResolutionError(domain, f"No SRV records found for {domain}.")
+        ttl = min(self._max_ttl_seconds, max(self._min_ttl_seconds, min(getattr(record, "ttl", 0) for record in records)))
+        now = self._clock()
+        cached_targets = _CachedTargets([SrvTarget(record.host, record.port, record.priority, record.weight) for record in records],
+                                        refresh_at=now + _REFRESH_AHEAD_FRACTION * ttl, expires_at=now + ttl)
+        self._cache[domain] = cached_targets
+        self._schedule_refresh(domain, _REFRESH_AHEAD_FRACTION * ttl)
+        _logger.debug(f"Resolved {domain} to {cached_targets.targets} for {ttl}s")
+        return cached_targets
+
+    def _schedule_refresh(self, domain: str, delay: float):
+        timer = self._refresh_timers.pop(domain, None)
+        if timer is not None:
+            timer.cancel()
+        self._looked_up.discard(domain)
+        self._refresh_timers[domain] = asyncio.get_running_loop().call_later(delay, self._refresh_if_looked_up, domain)
+
+    def _refresh_if_looked_up(self, domain: str):
+        """ Refreshes the records ahead of their expiry, unless the domain is no longer in use. """
+        self._refresh_timers.pop(domain, None)
+        if domain in self._looked_up and domain not in self._pending:
+            self._refresh(domain).add_done_callback(self._log_failed_refresh)
+
+    def _refresh(self, domain: str) -> asyncio.Task:
+        """ Resolves the domain, unless a resolution of it is already in progress. """
+        task = self._pending.get(domain)
+        if task is None:
+            task = self._pending[domain] = asyncio.get_running_loop().create_task(self._resolve(domain))
+            task.add_done_callback(lambda _: self._pending.pop(domain, None))
+        return task
+
+    def _log_failed_refresh(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            _logger.warning(f"Background refresh of SRV records failed, using previous records: {task.exception()}")
+
+    async def resolve(self, domain: str) -> List[SrvTarget]:
+        """ All targets of the domain, from the cache if not expired. """
+        cached_targets = self._cache.get(domain)
+        now = self._clock()
+        if cached_targets is None or now >= cached_targets.expires_at:
+            cached_targets = await asyncio.shield(self._refresh(domain))
+        else:
+            self._looked_up.add(domain)
+            # e.g. if the refresh by the timer failed
+            if now >= cached_targets.refresh_at and domain not in self._pending:
+                self._refresh(domain).add_done_callback(self._log_failed_refresh)
+        return cached_targets.targets
+
+    def close(self):
+        """ Cancels the scheduled refreshes. """
+        for timer in self._refresh_timers.values():
+            timer.cancel()
+        self._refresh_timers.clear()
+
+    async def choose(self, domain: str) -> SrvTarget:
+        """ One target of the lowest priority of the domain, chosen at random proportionally to its weight. """
+        targets = await self.resolve(domain)
+        lowest_priority = min(target.priority for target in targets)
+        candidates = [target for target in targets if target.priority == lowest_priority]
+        if len(candidates) == 1:
+            return candidates[0]
+        # targets with weight 0 are only chosen (uniformly) if all targets have weight 0
+        weights = [target.weight for target in candidates]
+        if not any(weights):
+            return self._rng.choice(candidates)
+        return self._rng.choices(candidates, weights=weights)[0]
@@ -0,0 +1,25 @@
+from typing import List, Optional
+
+
+def token_budget_batches(lengths: List[int], max_tokens: Optional[int]) -> List[List[int]]:
+    """ Groups sequences into batches of similar length, so that little compute is spent on padding.
+
+    The sequences are sorted by length and each batch takes as many of the next sequences as fit into the budget, i.e.
+    as long as the padded batch (its longest sequence times its size) has at most `max_tokens` tokens. A sequence that
+    exceeds the budget on its own forms a batch of its own.
+
+    :param lengths: Number of tokens of each sequence
+    :param max_tokens: Token budget of a padded batch; None for one batch of all sequences
+    :return: The indices of the sequences of each batch, in ascending order of length
+    """
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    for i in sorted(range(len(lengths)), key=lengths.__getitem__):
+        # in ascending order, the next sequence is the longest of the batch it is added to
+        if batch and max_tokens is not None and lengths[i] * (len(batch) + 1) > max_tokens:
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
@@ -0,0 +1,195 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import random
+import re
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_logger = logging.getLogger(__name__)
+
+TRACE_HEADER = "traceparent"
+""" W3C trace context header, by which a sampled trace is continued by the translator clients. """
+SERVER_TIMING_HEADER = "Server-Timing"
+
+_TRACEPARENT_PATTERN = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_SERVER_TIMING_NAME_PATTERN = re.compile(r"[^!#$%&'*+\-.^_`|~0-9A-Za-z]")
+
+
+def _random_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "description", "start", "duration")
+
+    def __init__(self, name: str, description: Optional[str], parent_id: Optional[str], start: float, duration: float = 0.0):
+        self.span_id = _random_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.description = description
+        self.start = start
+        self.duration = duration
+
+
+class Trace:
+    """ Spans of the stages of a sampled request, from any thread or event loop the request is processed in. """
+
+    def __init__(self, trace_id: Optional[str] = None, parent_span_id: Optional[str] = None, log_spans: bool = False):
+        """
+        :param trace_id: Id of the trace, continued from the caller; a new one if omitted
+        :param parent_span_id: Span of the caller this request belongs to
+        :param log_spans: Log the spans as JSON once the trace is finished
+        """
+        self.trace_id = trace_id or _random_id(128)
+        self.parent_span_id = parent_span_id
+        self.log_spans = log_spans
+        self.start = time.monotonic()
+        self.duration: Optional[float] = None
+        self.spans: List[Span] = []
+
+    def traceparent(self) -> str:
+        """ Header value to continue the trace in a request to a translator client, as child of the current span. """
+        return f"00-{self.trace_id}-{_current_span_id.get() or _random_id(64)}-01"
+
+    def add_remote_timings(self, server_timing: Optional[str], prefix: str, description: str, end: float):
+        """ Adds the timings a translator client returned in its Server-Timing header as spans (ending when its response was received). """
+        for name, duration_ms, remote_description in parse_server_timing(server_timing or ""):
+            duration = duration_ms / 1000.0
+            self.spans.append(Span(f"{prefix}.{name}", f"{description} {remote_description}" if remote_description else description,
+                                   _current_span_id.get(), end - duration, duration))
+
+    def finish(self) -> str:
+        """ Ends the trace, logs it if enabled and returns the Server-Timing header value. """
+        self.duration = time.monotonic() - self.start
+        if self.log_spans:
+            _logger.info(json.dumps(self.to_json()))
+        return self.server_timing()
+
+    def server_timing(self) -> str:
+        """ Total time of the spans of each name and description in ms (in the order they started), and of the whole request. """
+        durations: Dict[Tuple[str, Optional[str]], float] = {}
+        for span in sorted(list(self.spans), key=lambda s: s.start):
+            durations[(span.name, span.description)] = durations.get((span.name, span.description), 0.0) + span.duration
+        duration = self.duration if self.duration is not None else time.monotonic() - self.start
+        entries = [_format_server_timing(name, description, duration) for (name, description), duration in durations.items()]
+        return ", ".join([*entries, _format_server_timing("total", None, duration)])
+
+    def to_json(self) -> Dict:
+        return {"traceId": self.trace_id, "parentSpanId": self.parent_span_id,
+                "durationMs": round((self.duration or 0.0) * 1000, 3),
+                "spans": [{"spanId": span.span_id, "parentSpanId": span.parent_id, "name": span.name, "description": span.description,
+                           "startMs": round((span.start - self.start) * 1000, 3), "durationMs": round(span.duration * 1000, 3)}
+                          for span in sorted(list(self.spans), key=lambda s: s.start)]}
+
+
+def _format_server_timing(name: str, description: Optional[str], duration: float) -> str:
+    entry = f"{_SERVER_TIMING_NAME_PATTERN.sub('_', name)};dur={duration * 1000:.3f}"
+    if description:
+        entry += ';desc="' + description.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return entry
+
+
+def parse_server_timing(value: str) -> List[Tuple[str, float, Optional[str]]]:
+    """ Name, duration in ms and description of each entry of a Server-Timing header value; entries without duration are skipped. """
+    entries = []
+    for entry in re.findall(r'(?:[^,"]|"(?:[^"\\]|\\.)*")+', value):
+        name, *parameters = [part.strip() for part in re.findall(r'(?:[^;"]|"(?:[^"\\]|\\.)*")+', entry)]
+        values = {}
+        for parameter in parameters:
+            key, _, parameter_value = parameter.partition("=")
+            values[key.strip().lower()] = parameter_value.strip()
+        try:
+            duration = float(values["dur"])
+        except (KeyError, ValueError):
+            continue
+        description = values.get("desc")
+        if description and description.startswith('"'):
+            description = re.sub(r"\\(.)", r"\1", description[1:-1])
+        entries.append((name, duration, description))
+    return entries
+
+
+current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+""" Trace of the request being processed, None if it is not sampled. """
+_current_span_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_span_id", default=None)
+
+
+def start_trace(traceparent: Optional[str], sample_rate: float, log_spans: bool = False) -> Optional[Trace]:
+    """ The trace of a new request: continued if the caller sent a sampled trace, otherwise sampled at the sample rate.
+
+    A request with the trace of a caller that was not sampled is not sampled either, so a trace is complete across the proxy and its clients.
+    """
+    match = _TRACEPARENT_PATTERN.match(traceparent.strip().lower()) if traceparent else None
+    if match:
+        trace_id, parent_span_id, flags = match.groups()
+        return Trace(trace_id, parent_span_id, log_spans) if int(flags, 16) & 1 else None
+    return Trace(log_spans=log_spans) if sample_rate > 0 and random.random() < sample_rate else None
+
+
+@contextmanager
+def trace_context(trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+
+
+class _SpanContext:
+    __slots__ = ("_trace", "_span", "_token")
+
+    def __init__(self, trace: Trace, name: str, description: Optional[str]):
+        self._trace = trace
+        self._span = Span(name, description, _current_span_id.get(), 0.0)
+        self._token = None
+
+    def __enter__(self) -> Span:
+        self._token = _current_span_id.set(self._span.span_id)
+        self._span.start = time.monotonic()
+        return self._span
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._span.duration = time.monotonic() - self._span.start
+        _current_span_id.reset(self._token)
+        self._trace.spans.append(self._span)
+
+
+class _NoSpanContext:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NO_SPAN = _NoSpanContext()
+
+
+def span(name: str, description: Optional[str] = None):
+    """ Context that records the time of the block as span of the current trace; does nothing if the request is not sampled. """
+    trace = current_trace.get()
+    return _NO_SPAN if trace is None else _SpanContext(trace, name, description)
+
+
+def traced(name: str):
+    """ Records each call of the (synchronous or asynchronous) function as span of the current trace. """
+    def _decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def _coroutine(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return _coroutine
+
+        @functools.wraps(func)
+        def _func(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return _func
+    return _decorator
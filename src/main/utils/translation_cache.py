@@ -0,0 +1,125 @@
+import logging
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+_logger = logging.getLogger(__name__)
+
+# rough memory overhead per entry for the key tuple, the ordered dict node and the expiry timestamp
+_ENTRY_OVERHEAD_BYTES = 256
+
+
+class TranslationCacheKey(NamedTuple):
+    text: str
+    source_language: Optional[str]
+    target_language: str
+    models: Tuple[str, ...]
+
+
+def make_translation_cache_key(text: str, source_language: Optional[str], target_language: str,
+                               models: Tuple[str, ...]) -> TranslationCacheKey:
+    """ Builds the cache key of a translation.
+
+    :param text: Text to be translated; unicode normalized so that equal texts in different encodings share an entry
+    :param source_language: Source language as requested, i.e. None if it is to be detected
+    :param target_language: Target language
+    :param models: Names of the available models; together with source and target language they determine the
+     translation path
+    """
+    return TranslationCacheKey(unicodedata.normalize("NFC", text), source_language, target_language, models)
+
+
+class TranslationCache:
+    """ Thread-safe in-memory LRU cache for translations, bounded by an (approximate) memory budget and a time to live. """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self._max_bytes = max_bytes
+        self._ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[TranslationCacheKey, Tuple[str, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_bytes > 0 and self._ttl_seconds > 0
+
+    @staticmethod
+    def _entry_size(key: TranslationCacheKey, translation: str) -> int:
+        return sys.getsizeof(key.text) + sys.getsizeof(translation) + _ENTRY_OVERHEAD_BYTES
+
+    def get_many(self, keys: Iterable[TranslationCacheKey]) -> List[Optional[str]]:
+        """ Looks up the translations for all keys; None for keys not (or no longer) cached. """
+        if not self.enabled:
+            return [None for _ in keys]
+        now = self._clock()
+        translations = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] <= now:
+                    self._remove(key)
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    translations.append(None)
+                else:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    translations.append(entry[0])
+        return translations
+
+    def get(self, key: TranslationCacheKey) -> Optional[str]:
+        return self.get_many([key])[0]
+
+    def put_many(self, items: Iterable[Tuple[TranslationCacheKey, str]]):
+        """ Caches the translations, evicting the least recently used entries if the memory budget is exceeded. """
+        if not self.enabled:
+            return
+        expires_at = self._clock() + self._ttl_seconds
+        with self._lock:
+            for key, translation in items:
+                size = self._entry_size(key, translation)
+                if size > self._max_bytes:
+                    continue
+                if key in self._entries:
+                    self._remove(key)
+                self._entries[key] = (translation, expires_at, size)
+                self._size_bytes += size
+            while self._size_bytes > self._max_bytes:
+                key, _ = next(iter(self._entries.items()))
+                self._remove(key)
+                self.evictions += 1
+
+    def put(self, key: TranslationCacheKey, translation: str):
+        self.put_many([(key, translation)])
+
+    def _remove(self, key: TranslationCacheKey):
+        _, _, size = self._entries.pop(key)
+        self._size_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def statistics(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "sizeBytes": self._size_bytes,
+            "maxBytes": self._max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
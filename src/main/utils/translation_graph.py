@@ -1,43 +1,110 @@
+import itertools
 import logging
-import math
 from typing import Tuple, Dict, List, Optional, Set, Type
 
-from dijkstra import Graph, DijkstraSPF
+import numpy as np
 
 from translator_models.translator_model import TranslatorModel
 _logger = logging.getLogger(__name__)
 
+_NO_NEXT_HOP = -1
+
+
 class TranslationGraph:
+    """ Directed graph of languages, with an edge for each language pair some model can translate directly.
+
+    Languages are indexed by integers; edge weights (the translation quality grade of the best model for a language
+    pair) are kept in a dense NumPy matrix. Shortest paths between all languages and the strongly connected components
+    are computed once, on the first lookup after models have been added.
+    """
+
     def __init__(self, model_classes: Optional[List[Type[TranslatorModel]]]):
         self.translation_models: Dict[Tuple[str, str], Type[TranslatorModel]] = {}
-        self.translation_graph = Graph()
+        self._languages: List[str] = []
+        self._language_index: Dict[str, int] = {}
+        self._weights = np.full((0, 0), np.inf)
+        self._distances: Optional[np.ndarray] = None
+        self._next_hops: Optional[np.ndarray] = None
+        self._connected_languages: Optional[Dict[str, Tuple[str, ...]]] = None
         if model_classes:
             for model in model_classes:
                 self.add_model(model)
 
     def add_model(self, model_class: Type[TranslatorModel]):
-        for language_pair in model_class.available_language_pairs:
-            self._add_translation_model(language_pair, model_class)
+        language_pairs = [tuple(language_pair) for language_pair in model_class.available_language_pairs]
+        self._add_languages(itertools.chain.from_iterable(language_pairs))
+
+        sources = np.fromiter((self._language_index[source] for source, _ in language_pairs), dtype=np.intp, count=len(language_pairs))
+        targets = np.fromiter((self._language_index[target] for _, target in language_pairs), dtype=np.intp, count=len(language_pairs))
+        # a model only replaces the model of a language pair if its translation quality grade is strictly better
+        is_better = model_class.translation_quality_grade < self._weights[sources, targets]
+        self._weights[sources[is_better], targets[is_better]] = model_class.translation_quality_grade
+
+        for language_pair, is_better_pair in zip(language_pairs, is_better.tolist()):
+            if is_better_pair:
+                self.translation_models[language_pair] = model_class
+        if not is_better.all():
+            _logger.info(f"Not adding {model_class.model_name} to the translation graph for {np.count_nonzero(~is_better)} "
+                         f"language pairs, since other models are a better option.")
+
+        # shortest paths and strongly connected components may have changed with the new edges
+        self._distances = None
+        self._next_hops = None
+        self._connected_languages = None
+
+    def _add_languages(self, languages):
+        for language in languages:
+            if language not in self._language_index:
+                self._language_index[language] = len(self._languages)
+                self._languages.append(language)
+
+        number_of_languages = len(self._languages)
+        if number_of_languages > self._weights.shape[0]:
+            weights = np.full((number_of_languages, number_of_languages), np.inf)
+            weights[:self._weights.shape[0], :self._weights.shape[1]] = self._weights
+            self._weights = weights
+
+    @property
+    def languages(self) -> List[str]:
+        return list(self._languages)
 
     def __contains__(self, language: str):
         """ Returns true if the translation graph contains the language as node. """
-        return language in self.translation_graph.get_nodes()
-
-    def _add_translation_model(self, language_pair: Tuple[str, str], model_class: Type[TranslatorModel]):
-        if language_pair in self.translation_models.keys():
-            current_translation_grade = self.translation_models[language_pair].translation_quality_grade
-            new_translation_grade = model_class.translation_quality_grade
-            if current_translation_grade <= new_translation_grade:
-                _logger.info(
-                    f"Not adding {model_class.model_name} to the translation graph for {language_pair}, since {self.translation_models[language_pair].model_name} is a better option.")
-                return
-
-        self.translation_models[language_pair] = model_class
-        self.translation_graph.add_edge(language_pair[0], language_pair[1], model_class.translation_quality_grade)
+        return language in self._language_index
+
+    def _compute_shortest_paths(self):
+        """ Computes the distances and next hops between all languages (vectorised Floyd-Warshall). """
+        number_of_languages = len(self._languages)
+        language_indices = np.arange(number_of_languages)
+        distances = self._weights.copy()
+        np.fill_diagonal(distances, 0)
+        next_hops = np.where(np.isfinite(self._weights), language_indices[np.newaxis, :], _NO_NEXT_HOP)
+        np.fill_diagonal(next_hops, language_indices)
+
+        for k in range(number_of_languages):
+            distances_via_k = distances[:, k, np.newaxis] + distances[np.newaxis, k, :]
+            is_shorter = distances_via_k < distances
+            distances = np.where(is_shorter, distances_via_k, distances)
+            next_hops = np.where(is_shorter, next_hops[:, k, np.newaxis], next_hops)
+
+        self._distances = distances
+        self._next_hops = next_hops
+
+    def _get_shortest_paths(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._distances is None or self._next_hops is None:
+            self._compute_shortest_paths()
+        return self._distances, self._next_hops
 
     def find_optimal_translation_path(self, source_language, target_language):
-        translation_path_finder = DijkstraSPF(self.translation_graph, source_language)
-        translation_path = translation_path_finder.get_path(target_language)
+        _, next_hops = self._get_shortest_paths()
+        current, target = self._language_index[source_language], self._language_index[target_language]
+        if next_hops[current, target] == _NO_NEXT_HOP:
+            raise ValueError(f"No translation path from {source_language} to {target_language}.")
+
+        translation_path = [source_language]
+        while current != target:
+            current = next_hops[current, target]
+            translation_path.append(self._languages[current])
 
         translation_steps = [(intermediate_translations, self.translation_models[intermediate_translations]) for
                              intermediate_translations in zip(translation_path[:-1], translation_path[1:])]
@@ -50,18 +117,72 @@ class TranslationGraph:
             translation_string += f" --|{translation_model.model_name}|--> {language_pair[1]}"
         return f"Translating from {source_language} to {target_language} via {translation_string}"
 
-    @property
-    def _inverted_translation_graph(self) -> Graph:
+    def _compute_strongly_connected_components(self) -> Dict[str, Tuple[str, ...]]:
+        """ Computes the strongly connected components with Tarjan's algorithm (iteratively, so large language sets
+        do not hit the recursion limit).
+
+        :return: The sorted languages of its strongly connected component for each language
         """
-        :return: The translation graph with edge-directions inverted.
+        adjacent_languages = [np.flatnonzero(row).tolist() for row in np.isfinite(self._weights)]
+        number_of_languages = len(self._languages)
+        indices = [-1] * number_of_languages
+        lowlinks = [0] * number_of_languages
+        is_on_stack = [False] * number_of_languages
+        stack: List[int] = []
+        next_index = 0
+        connected_languages: Dict[str, Tuple[str, ...]] = {}
+
+        for root in range(number_of_languages):
+            if indices[root] != -1:
+                continue
+            work_stack = [(root, 0)]
+            while work_stack:
+                language, next_edge = work_stack.pop()
+                if next_edge == 0:
+                    indices[language] = lowlinks[language] = next_index
+                    next_index += 1
+                    stack.append(language)
+                    is_on_stack[language] = True
+
+                for edge in range(next_edge, len(adjacent_languages[language])):
+                    adjacent_language = adjacent_languages[language][edge]
+                    if indices[adjacent_language] == -1:
+                        work_stack.append((language, edge + 1))
+                        work_stack.append((adjacent_language, 0))
+                        break
+                    if is_on_stack[adjacent_language]:
+                        lowlinks[language] = min(lowlinks[language], indices[adjacent_language])
+                else:
+                    if lowlinks[language] == indices[language]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            is_on_stack[member] = False
+                            component.append(self._languages[member])
+                            if member == language:
+                                break
+                        sorted_component = tuple(sorted(component))
+                        for member_language in sorted_component:
+                            connected_languages[member_language] = sorted_component
+                    if work_stack:
+                        parent = work_stack[-1][0]
+                        lowlinks[parent] = min(lowlinks[parent], lowlinks[language])
+
+        return connected_languages
+
+    @property
+    def connected_languages(self) -> Dict[str, Tuple[str, ...]]:
+        """ The sorted languages of its strongly connected component for each language.
+
+        Languages of the same component share one (immutable) tuple.
         """
-        adjacent_nodes = {n: self.translation_graph.get_adjacent_nodes(n)
-                          for n in self.translation_graph.get_nodes()}
-        inverted_graph = Graph()
-        for u, neighbors in adjacent_nodes.items():
-            for v in neighbors:
-                inverted_graph.add_edge(v, u, self.translation_graph.get_edge_weight(u, v))
-        return inverted_graph
+        if self._connected_languages is None:
+            self._connected_languages = self._compute_strongly_connected_components()
+        return self._connected_languages
+
+    def get_connected_languages(self, root_language: str) -> Tuple[str, ...]:
+        """ Sorted languages of the strongly connected component of the root language; empty for unknown languages. """
+        return self.connected_languages.get(root_language, ())
 
     def get_strongly_connected_component(self, root_language: str) -> Set[str]:
         """ Obtains the strongly connected component for a given root language, i.e. all languages
@@ -71,16 +192,9 @@ class TranslationGraph:
         :param root_language:
         :return:
         """
+        return set(self.get_connected_languages(root_language))
 
-        root_dijkstra = DijkstraSPF(self.translation_graph, root_language)
-        root_reachable_nodes = {n for n in self.translation_graph.get_nodes()
-                                if root_dijkstra.get_distance(n) < math.inf}
-
-        inverted_dijkstra = DijkstraSPF(self._inverted_translation_graph, root_language)
-
-        nodes_reaching_root = {n for n in self.translation_graph.get_nodes()
-                               if inverted_dijkstra.get_distance(n) < math.inf}
-
-        return nodes_reaching_root & root_reachable_nodes
-
-
+    @property
+    def nbytes(self) -> int:
+        """ Memory used by the weight and shortest path matrices. """
+        return sum(matrix.nbytes for matrix in (self._weights, self._distances, self._next_hops) if matrix is not None)
@@ -0,0 +1,61 @@
+from collections import deque
+from typing import Deque, Dict, Generic, Iterator, List, Mapping, Optional, Tuple, TypeVar
+
+from constants import PriorityClass
+
+_T = TypeVar("_T")
+
+
+class WeightedFairQueue(Generic[_T]):
+    """ FIFO queues per priority class, served in proportion to the weights of the classes that have items queued.
+
+    Each class has a virtual time that advances by cost / weight whenever one of its items is taken; the class whose
+    next item would finish first in virtual time is served next, the more important class (in the order of
+    PriorityClass) on ties. A class that had nothing queued starts at the virtual time of the last served item, so it
+    cannot claim the share it did not use while idle. Not thread-safe.
+    """
+
+    def __init__(self, weights: Mapping[PriorityClass, float]):
+        """
+        :param weights: Relative share of each class; classes without (or with a non-positive) weight get 1
+        """
+        self._weights = {priority: weight if (weight := weights.get(priority, 1.0)) > 0 else 1.0 for priority in PriorityClass}
+        self._queues: Dict[PriorityClass, Deque[_T]] = {priority: deque() for priority in PriorityClass}
+        self._virtual_times: Dict[PriorityClass, float] = {priority: 0.0 for priority in PriorityClass}
+        self._virtual_time = 0.0
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def depth(self, priority: PriorityClass) -> int:
+        return len(self._queues[priority])
+
+    def push(self, priority: PriorityClass, item: _T):
+        queue = self._queues[priority]
+        if not queue:
+            self._virtual_times[priority] = max(self._virtual_times[priority], self._virtual_time)
+        queue.append(item)
+
+    def extend(self, priority: PriorityClass, items: List[_T]):
+        for item in items:
+            self.push(priority, item)
+
+    def heads(self) -> Iterator[Tuple[PriorityClass, _T]]:
+        """ The first item of each class that has items queued, in the order in which the classes are served. """
+        for priority in sorted((p for p, queue in self._queues.items() if queue), key=lambda p: self._virtual_times[p] + 1 / self._weights[p]):
+            yield priority, self._queues[priority][0]
+
+    def peek(self) -> Optional[Tuple[PriorityClass, _T]]:
+        return next(self.heads(), None)
+
+    def pop(self, priority: Optional[PriorityClass] = None, cost: float = 1.0) -> _T:
+        """ Takes the first item of the class, or of the class to be served next if omitted. """
+        if priority is None:
+            priority, _ = self.peek()
+        item = self._queues[priority].popleft()
+        self._virtual_times[priority] += cost / self._weights[priority]
+        self._virtual_time = self._virtual_times[priority]
+        return item
+
+    def remove(self, priority: PriorityClass, item: _T):
+        self._queues[priority].remove(item)
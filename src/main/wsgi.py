@@ -1,4 +1,5 @@
-from translator_service import app
+from translator_service import app, start_job_workers
 
 if __name__ == "__main__":
+    start_job_workers()
     app.run()
\ No newline at end of file
@@ -52,6 +52,7 @@ def integration_test_environment():
         e.enter_context(patch("detector.Detector", detector_mock))
         e.enter_context(patch("translator.models", [TranslatorModelMockA, TranslatorModelMockB]))
         e.enter_context(patch("translator.settings", settings_mock))
+        e.enter_context(patch("translation_jobs.settings.job_queue_redis_enabled", False))
         import translator_service
         importlib.reload(translator_service)
         translator_service.translator.initialize_models()
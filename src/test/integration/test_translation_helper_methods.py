@@ -26,4 +26,28 @@ class TestTranslationHelperMethods:
     def test_get_models(self, app_mock):
         response_wrapper = app_mock.get("models")
         assert response_wrapper.status_code == 200
-        assert list(sorted(response_wrapper.json['models'])) == ["mockA", "mockB"]
\ No newline at end of file
+        assert list(sorted(response_wrapper.json['models'])) == ["mockA", "mockB"]
+
+    def test_get_statistics(self, app_mock):
+        app_mock.post("translation", json={"sourceLanguage": "de", "targetLanguage": "en", "texts": ["dummy_text"]})
+        response_wrapper = app_mock.get("statistics")
+        assert response_wrapper.status_code == 200
+        assert response_wrapper.json['batchQueues']['mockA:de->en']['queued'] == 0
+
+    def test_get_metrics(self, app_mock):
+        app_mock.post("translation", json={"sourceLanguage": "de", "targetLanguage": "en", "texts": ["dummy_text"]})
+        response_wrapper = app_mock.get("metrics")
+        assert response_wrapper.status_code == 200
+        metrics = response_wrapper.text
+        assert 'translator_batch_size_segments_count{model="mockA",source_language="de",target_language="en"}' in metrics
+        assert 'translator_model_inference_duration_seconds_count{model="mockA",source_language="de",target_language="en"}' in metrics
+        assert 'translator_batch_queue_depth_segments{model="mockA",source_language="de",target_language="en",priority="BULK"} 0.0' in metrics
+        assert 'translator_model_load_duration_seconds{model="mockA"}' in metrics
+        assert 'translator_cache_lookups_total{cache="local",result="miss"}' in metrics
+
+    def test_server_timing(self, app_mock):
+        headers = {"traceparent": "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"}
+        response_wrapper = app_mock.post("translation", headers=headers, json={"targetLanguage": "de", "texts": ["dummy_text"]})
+        assert response_wrapper.status_code == 200
+        names = [entry.split(";")[0] for entry in response_wrapper.headers["Server-Timing"].split(", ")]
+        assert names == ["cache", "detect", "route", "hop", "segment", "batch", "inference", "hop", "segment", "batch", "inference", "total"]
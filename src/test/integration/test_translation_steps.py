@@ -1,3 +1,8 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from src.test.mocks.translator_model_mocks import TranslatorModelMockA
 
 
 class TestTranslationSteps:
@@ -46,3 +51,83 @@ class TestTranslationSteps:
         assert response_wrapper.status_code == 200
 
         assert response_wrapper.json == {'texts': ['dummy_text[mockA;de->en][mockB;en->es]']}
+
+    def test_translation_batch(self, app_mock):
+        """ Test the /translation endpoint for several texts sharing the translation path en->fr->de.
+         Should pass all texts through each step as one batch. """
+
+        with patch.object(TranslatorModelMockA, "translate_batch", autospec=True,
+                          side_effect=TranslatorModelMockA.translate_batch) as translate_batch_spy:
+            response_wrapper = app_mock.post("translation",
+                                             json={
+                                                 "sourceLanguage": "en",
+                                                 "targetLanguage": "de",
+                                                 "texts": ["first_text", "second_text"]})
+        assert response_wrapper.status_code == 200
+
+        assert response_wrapper.json == {'texts': ['first_text[mockA;en->fr][mockA;fr->de]',
+                                                   'second_text[mockA;en->fr][mockA;fr->de]']}
+        assert [c.args[1:] for c in translate_batch_spy.mock_calls] == [
+            (["first_text", "second_text"], "en", "fr"),
+            (["first_text[mockA;en->fr]", "second_text[mockA;en->fr]"], "fr", "de")]
+
+    def test_translation_cache(self, app_mock):
+        """ Test the /translation endpoint to translate repeated texts only once. """
+
+        request_json = {"sourceLanguage": "de", "targetLanguage": "en", "texts": ["cached_text", "cached_text"]}
+        with patch.object(TranslatorModelMockA, "translate_batch", autospec=True,
+                          side_effect=TranslatorModelMockA.translate_batch) as translate_batch_spy:
+            first_response_wrapper = app_mock.post("translation", json=request_json)
+            second_response_wrapper = app_mock.post("translation", json=request_json)
+
+        assert first_response_wrapper.json == second_response_wrapper.json == {
+            'texts': ['cached_text[mockA;de->en]', 'cached_text[mockA;de->en]']}
+        assert [c.args[1:] for c in translate_batch_spy.mock_calls] == [(["cached_text"], "de", "en")]
+
+    def test_translation_long_text(self, app_mock):
+        """ Test the /translation endpoint to split texts that are too long for a model into segments, translate them in one batch
+        and reassemble them. """
+
+        with patch.object(TranslatorModelMockA, "max_input_tokens", 3), \
+                patch.object(TranslatorModelMockA, "translate_batch", autospec=True,
+                             side_effect=TranslatorModelMockA.translate_batch) as translate_batch_spy:
+            response_wrapper = app_mock.post("translation",
+                                             json={
+                                                 "sourceLanguage": "de",
+                                                 "targetLanguage": "en",
+                                                 "texts": ["Erster Satz. Zweiter Satz.\n\nDritter Satz.", "Kurz."]})
+        assert response_wrapper.status_code == 200
+
+        assert response_wrapper.json == {'texts': ['Erster Satz.[mockA;de->en] Zweiter Satz.[mockA;de->en]\n\nDritter Satz.[mockA;de->en]',
+                                                   'Kurz.[mockA;de->en]']}
+        assert [c.args[1:] for c in translate_batch_spy.mock_calls] == [
+            (["Erster Satz.", "Zweiter Satz.", "Dritter Satz.", "Kurz."], "de", "en")]
+
+    def test_translation_stream(self, app_mock):
+        """ Test the /translation/stream endpoint to stream cached translations first and the others chunk by chunk. """
+
+        app_mock.post("translation", json={"sourceLanguage": "en", "targetLanguage": "de", "texts": ["streamed_cached_text"]})
+        with patch("translator.settings.stream_chunk_size", 1):
+            response_wrapper = app_mock.post("translation/stream",
+                                             json={
+                                                 "sourceLanguage": "en",
+                                                 "targetLanguage": "de",
+                                                 "texts": ["streamed_text", "streamed_cached_text"]})
+        assert response_wrapper.status_code == 200
+
+        assert [json.loads(line) for line in response_wrapper.get_data(as_text=True).splitlines()] == [
+            {"index": 1, "text": "streamed_cached_text[mockA;en->fr][mockA;fr->de]"},
+            {"index": 0, "text": "streamed_text[mockA;en->fr][mockA;fr->de]"}]
+
+    def test_translation_stream_unsupported_language(self, app_mock):
+        """ Test the /translation/stream endpoint to reject unsupported languages before streaming. """
+
+        response_wrapper = app_mock.post("translation/stream", json={"sourceLanguage": "xx", "targetLanguage": "de", "texts": ["text"]})
+        assert response_wrapper.status_code == 400
+
+    def test_translation_batch_async(self, integration_test_environment):
+        """ Test translating asynchronously, with the models running in an executor. """
+
+        translations = asyncio.run(integration_test_environment.translator.translate_batch_async(
+            ["first_text_async", "second_text_async"], "de", source_language="en"))
+        assert translations == ["first_text_async[mockA;en->fr][mockA;fr->de]", "second_text_async[mockA;en->fr][mockA;fr->de]"]
@@ -0,0 +1,8 @@
+class ClockMock:
+    """ Replaces time.monotonic in tests; the time only changes when `now` is set. """
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
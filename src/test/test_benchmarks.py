@@ -0,0 +1,57 @@
+from run_benchmarks import RATE, SIZE, TIME, compare, relative_value, updated_baselines
+
+_BASELINES = {"detector": {"textsPerSecond": 100.0},
+              "proxy": {"fanOutOverheadMilliseconds": 10.0, "singleTextOverheadMilliseconds": 2.0}}
+
+
+def _statuses(comparisons):
+    return {(c["benchmark"], c["metric"]): c["status"] for c in comparisons if c["status"] != "skipped"}
+
+
+def test_compare():
+    results = {"detector": {"textsPerSecond": 60.0},
+               "proxy": {"fanOutOverheadMilliseconds": 16.0, "singleTextOverheadMilliseconds": 1.0},
+               "request_limiter": {"local": {"requestMicroseconds": 5.0}}}
+    assert _statuses(compare(results, _BASELINES, tolerance=0.5, reference_seconds=1.0)) == {
+        ("detector", "textsPerSecond"): "regressed",  # below 100 / 1.5
+        ("proxy", "fanOutOverheadMilliseconds"): "regressed",  # above 10 * 1.5
+        ("proxy", "singleTextOverheadMilliseconds"): "ok",
+        ("request_limiter", "local.requestMicroseconds"): "new",
+    }
+    assert _statuses(compare(results, _BASELINES, tolerance=1.0, reference_seconds=1.0)) == {
+        ("detector", "textsPerSecond"): "ok",
+        ("proxy", "fanOutOverheadMilliseconds"): "ok",
+        ("proxy", "singleTextOverheadMilliseconds"): "ok",
+        ("request_limiter", "local.requestMicroseconds"): "new",
+    }
+
+
+def test_skipped_metrics_not_compared():
+    """ The limiter shared via Redis is skipped if redis-server is not installed. """
+    comparisons = compare({"request_limiter": {"local": {"requestMicroseconds": 5.0}}},
+                          {"request_limiter": {"local.requestMicroseconds": 5.0, "redis.requestMicroseconds": 50.0}}, tolerance=0.5,
+                          reference_seconds=1.0)
+    assert _statuses(comparisons) == {("request_limiter", "local.requestMicroseconds"): "ok"}
+
+
+def test_compare_relative_to_reference():
+    """ A machine that takes twice as long for the reference workload may take twice as long for the benchmarks. """
+    results = {"detector": {"textsPerSecond": 50.0},
+               "proxy": {"fanOutOverheadMilliseconds": 20.0, "singleTextOverheadMilliseconds": 4.0}}
+    assert set(_statuses(compare(results, _BASELINES, tolerance=0.1, reference_seconds=2.0)).values()) == {"ok"}
+    assert set(_statuses(compare(results, _BASELINES, tolerance=0.1, reference_seconds=1.0)).values()) == {"regressed"}
+
+
+def test_relative_value():
+    assert relative_value(3.0, TIME, reference_seconds=2.0) == 1.5
+    assert relative_value(3.0, RATE, reference_seconds=2.0) == 6.0
+    assert relative_value(3.0, SIZE, reference_seconds=2.0) == 3.0
+
+
+def test_updated_baselines():
+    results = {"detector": {"textsPerSecond": 120.0, "texts": 200}, "request_limiter": {"local": {"requestMicroseconds": 5.0}}}
+    assert updated_baselines(results, _BASELINES, reference_seconds=0.5) == {
+        "detector": {"textsPerSecond": 60.0},
+        "proxy": {"fanOutOverheadMilliseconds": 10.0, "singleTextOverheadMilliseconds": 2.0},
+        "request_limiter": {"local.requestMicroseconds": 10.0},
+    }
@@ -0,0 +1,361 @@
+import asyncio
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+import redis
+
+from constants import PriorityClass
+from instrumentation import rate_limit_rejections, rate_limit_waiting
+from request_limitation import RequestLimiter, RequestLimitExceededException, estimate_cost, leases_key
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def redis_server():
+    """ A local redis-server (as in the Docker image), if installed. """
+    if shutil.which("redis-server") is None:
+        pytest.skip("redis-server is not installed")
+    port = _free_port()
+    process = subprocess.Popen(["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    client = redis.Redis(connection_pool=redis.ConnectionPool(host="localhost", port=port, db=0))
+    try:
+        for _ in range(100):
+            try:
+                client.ping()
+                break
+            except redis.ConnectionError:
+                time.sleep(0.05)
+        yield client
+    finally:
+        process.terminate()
+        process.wait()
+
+
+@pytest.fixture(params=["fakeredis", "redis-server"])
+def redis_client(request):
+    if request.param == "fakeredis":
+        pytest.importorskip("lupa", reason="fakeredis requires lupa to run Lua scripts")
+        import fakeredis
+        client = fakeredis.FakeRedis()
+    else:
+        client = request.getfixturevalue("redis_server")
+    client.flushall()
+    return client
+
+
+@pytest.fixture(autouse=True)
+def no_queueing():
+    """ Requests are rejected right away unless a test sets queue timeouts. """
+    with patch("request_limitation.settings.priority_queue_timeouts_seconds", {}):
+        yield
+
+
+class TestRequestLimiter:
+
+    def test_limit(self, redis_client):
+        request_limiter = RequestLimiter(2, redis_client=redis_client)
+        first, second = request_limiter.new_request(), request_limiter.new_request()
+        with pytest.raises(RequestLimitExceededException):
+            request_limiter.new_request()
+        assert request_limiter.rejected == 1
+
+        request_limiter.end_request(first)
+        third = request_limiter.new_request()
+        assert redis_client.zcard(leases_key) == 2
+        request_limiter.end_request(second)
+        request_limiter.end_request(third)
+        assert redis_client.zcard(leases_key) == 0
+        request_limiter.close()
+
+    def test_cost(self, redis_client):
+        request_limiter = RequestLimiter(4, redis_client=redis_client)
+        large = request_limiter.new_request(cost=3)
+        small = request_limiter.new_request()
+        with pytest.raises(RequestLimitExceededException):
+            request_limiter.new_request(cost=2)
+        request_limiter.end_request(large)
+        request_limiter.end_request(request_limiter.new_request(cost=3))
+        request_limiter.end_request(small)
+        assert redis_client.zcard(leases_key) == 0
+        request_limiter.close()
+
+    def test_cost_above_capacity(self, redis_client):
+        """ A request costing more than the capacity is only admitted while no other request is in progress. """
+        request_limiter = RequestLimiter(2, redis_client=redis_client)
+        with request_limiter.limited_requests():
+            with pytest.raises(RequestLimitExceededException):
+                request_limiter.new_request(cost=10)
+        with request_limiter.limited_requests(cost=10):
+            with pytest.raises(RequestLimitExceededException):
+                request_limiter.new_request()
+        request_limiter.close()
+
+    def test_capacity_share(self, redis_client):
+        """ Bulk requests leave the capacity beyond their share to interactive requests. """
+        request_limiter = RequestLimiter(4, redis_client=redis_client, capacity_shares={PriorityClass.bulk: 0.5})
+        bulk = request_limiter.new_request(cost=2, priority=PriorityClass.bulk)
+        with pytest.raises(RequestLimitExceededException):
+            request_limiter.new_request(priority=PriorityClass.bulk)
+        interactive = request_limiter.new_request(cost=2, priority=PriorityClass.interactive)
+        with pytest.raises(RequestLimitExceededException):
+            request_limiter.new_request(priority=PriorityClass.interactive)
+        request_limiter.end_request(bulk)
+        request_limiter.end_request(interactive)
+        assert redis_client.zcard(leases_key) == 0
+        request_limiter.close()
+
+    def test_queue_timeout(self, redis_client):
+        request_limiter = RequestLimiter(1, redis_client=redis_client, queue_timeouts_seconds={PriorityClass.interactive: 0.1})
+        lease = request_limiter.new_request()
+        start_time = time.monotonic()
+        with pytest.raises(RequestLimitExceededException):
+            request_limiter.new_request()
+        assert time.monotonic() - start_time >= 0.1
+        threading.Timer(0.05, request_limiter.end_request, args=(lease,)).start()
+        request_limiter.end_request(request_limiter.new_request())  # admitted once the first request ended
+        request_limiter.close()
+
+    def test_waiting_requests_admitted_weighted_fair(self, redis_client):
+        request_limiter = RequestLimiter(1, redis_client=redis_client, capacity_shares={},
+                                         queue_timeouts_seconds={PriorityClass.interactive: 5, PriorityClass.bulk: 5},
+                                         weights={PriorityClass.interactive: 3, PriorityClass.bulk: 1})
+        lease = request_limiter.new_request()
+        admitted = []
+        admitted_lock = threading.Lock()
+
+        def send_request(priority: PriorityClass):
+            with request_limiter.limited_requests(priority=priority):
+                with admitted_lock:
+                    admitted.append(priority)
+                time.sleep(0.005)
+
+        threads = []
+        for i in range(8):
+            for priority in (PriorityClass.bulk, PriorityClass.interactive):
+                threads.append(threading.Thread(target=send_request, args=(priority,)))
+                threads[-1].start()
+        time.sleep(0.1)  # all requests are waiting
+        request_limiter.end_request(lease)
+        for thread in threads:
+            thread.join()
+
+        # while both classes are waiting, three interactive requests are admitted per bulk request
+        assert admitted[:8].count(PriorityClass.interactive) == 6
+        assert len(admitted) == 16
+        request_limiter.close()
+
+    def test_limit_shared_between_workers(self, redis_client):
+        workers = [RequestLimiter(1, redis_client=redis_client) for _ in range(2)]
+        with workers[0].limited_requests():
+            with pytest.raises(RequestLimitExceededException):
+                with workers[1].limited_requests():
+                    pass
+        with workers[1].limited_requests():
+            pass
+        for worker in workers:
+            worker.close()
+
+    def test_crashed_worker_releases_slots(self, redis_client):
+        crashed_worker = RequestLimiter(1, redis_client=redis_client, lease_ttl_seconds=0.2)
+        crashed_worker.new_request()
+        crashed_worker.close()  # the lease is neither renewed nor released
+        worker = RequestLimiter(1, redis_client=redis_client, lease_ttl_seconds=0.2)
+        with pytest.raises(RequestLimitExceededException):
+            worker.new_request()
+
+        time.sleep(0.3)
+        worker.end_request(worker.new_request())
+        worker.close()
+
+    def test_renew_leases(self, redis_client):
+        request_limiter = RequestLimiter(1, redis_client=redis_client, lease_ttl_seconds=0.3)
+        other_worker = RequestLimiter(1, redis_client=redis_client, lease_ttl_seconds=0.3)
+        with request_limiter.limited_requests():
+            time.sleep(0.6)  # renewed every 0.1s
+            with pytest.raises(RequestLimitExceededException):
+                other_worker.new_request()
+        other_worker.end_request(other_worker.new_request())
+        request_limiter.close()
+        other_worker.close()
+
+    def test_expired_lease_not_renewed(self, redis_client):
+        request_limiter = RequestLimiter(2, redis_client=redis_client, lease_ttl_seconds=0.2)
+        request_limiter.close()  # renewed by hand below
+        lease = request_limiter.new_request()
+        # keeps the set of leases from expiring, so that the expired lease is still a member of it
+        other_worker = RequestLimiter(2, redis_client=redis_client, lease_ttl_seconds=60)
+        other_lease = other_worker.new_request()
+        time.sleep(0.3)
+
+        request_limiter.renew_leases()
+        assert redis_client.zscore(leases_key, lease.member) is None
+        other_worker.end_request(other_worker.new_request())
+        other_worker.end_request(other_lease)
+        request_limiter.end_request(lease)
+        other_worker.close()
+
+    def test_concurrent_load(self, redis_client):
+        limit = 3
+        workers = [RequestLimiter(limit, redis_client=redis_client) for _ in range(4)]
+        lock = threading.Lock()
+        in_progress = 0
+        max_in_progress = 0
+        admitted = 0
+
+        def send_requests(request_limiter):
+            nonlocal in_progress, max_in_progress, admitted
+            for _ in range(25):
+                try:
+                    with request_limiter.limited_requests():
+                        with lock:
+                            in_progress += 1
+                            admitted += 1
+                            max_in_progress = max(max_in_progress, in_progress)
+                        time.sleep(0.002)
+                        with lock:
+                            in_progress -= 1
+                except RequestLimitExceededException:
+                    pass
+
+        threads = [threading.Thread(target=send_requests, args=(workers[i % len(workers)],)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert max_in_progress <= limit
+        assert admitted > 0
+        assert admitted + sum(worker.rejected for worker in workers) == 16 * 25
+        assert redis_client.zcard(leases_key) == 0
+        for worker in workers:
+            worker.close()
+
+    def test_local_limit(self):
+        with patch("request_limitation.settings.rate_limit_redis_enabled", False):
+            request_limiter = RequestLimiter(1)
+        with request_limiter.limited_requests():
+            with pytest.raises(RequestLimitExceededException):
+                request_limiter.new_request()
+        with request_limiter.limited_requests():
+            pass
+
+    def test_local_cost(self):
+        with patch("request_limitation.settings.rate_limit_redis_enabled", False):
+            request_limiter = RequestLimiter(3)
+        with request_limiter.limited_requests(cost=2):
+            with pytest.raises(RequestLimitExceededException):
+                request_limiter.new_request(cost=2)
+            request_limiter.end_request(request_limiter.new_request())
+        with request_limiter.limited_requests(cost=3):
+            pass
+
+    def test_local_metrics(self):
+        with patch("request_limitation.settings.rate_limit_redis_enabled", False):
+            request_limiter = RequestLimiter(1, queue_timeouts_seconds={PriorityClass.bulk: 5})
+        rejected = rate_limit_rejections.samples().get(("INTERACTIVE",), [0])[0]
+        with request_limiter.limited_requests():
+            with pytest.raises(RequestLimitExceededException):
+                request_limiter.new_request()
+            waiting = threading.Thread(target=lambda: request_limiter.end_request(request_limiter.new_request(priority=PriorityClass.bulk)))
+            waiting.start()
+            time.sleep(0.1)
+            assert rate_limit_waiting.samples()[("BULK",)] == [1.0]
+        waiting.join()
+        assert rate_limit_rejections.samples()[("INTERACTIVE",)] == [rejected + 1]
+        assert rate_limit_waiting.samples()[("BULK",)] == [0.0]
+
+    def test_queue_timeout_counts_from_arrival(self):
+        with patch("request_limitation.settings.rate_limit_redis_enabled", False):
+            request_limiter = RequestLimiter(1, queue_timeouts_seconds={PriorityClass.bulk: 5})
+        with request_limiter.limited_requests():
+            start_time = time.monotonic()
+            with pytest.raises(RequestLimitExceededException):
+                request_limiter.new_request(priority=PriorityClass.bulk, queued_at=start_time - 5)
+            assert time.monotonic() - start_time < 1
+
+    def test_no_overtaking_of_waiting_requests(self):
+        """ New requests check the queue and take capacity under the lock of the queue, as waiting requests are admitted. """
+        with patch("request_limitation.settings.rate_limit_redis_enabled", False):
+            request_limiter = RequestLimiter(1, queue_timeouts_seconds={PriorityClass.bulk: 5})
+        try_acquire = request_limiter._try_acquire
+        locked = []
+
+        def _try_acquire(cost, priority):
+            locked.append(request_limiter._waiting_condition._is_owned())
+            return try_acquire(cost, priority)
+
+        with patch.object(request_limiter, "_try_acquire", _try_acquire):
+            lease = request_limiter.new_request()
+            waiter = threading.Thread(target=lambda: request_limiter.end_request(request_limiter.new_request(priority=PriorityClass.bulk)))
+            waiter.start()
+            time.sleep(0.1)
+            with pytest.raises(RequestLimitExceededException):
+                request_limiter.new_request()  # must not take the capacity of the waiting request
+            request_limiter.end_request(lease)
+            waiter.join()
+        assert locked and all(locked)
+
+    def test_async_wait_in_admission_threads(self):
+        """ Waiting asynchronous requests do not take the threads of the default executor of the event loop. """
+        with patch("request_limitation.settings.rate_limit_redis_enabled", False):
+            request_limiter = RequestLimiter(1, queue_timeouts_seconds={PriorityClass.bulk: 5})
+        admission_threads = []
+
+        async def send_request():
+            async with request_limiter.limited_requests(priority=PriorityClass.bulk):
+                pass
+
+        async def test():
+            lease = request_limiter.new_request()
+            waiting = asyncio.create_task(send_request())
+            await asyncio.sleep(0.1)
+            admission_threads.extend(t.name for t in threading.enumerate() if t.name.startswith("request-admission"))
+            # releasing the capacity admits the waiting request
+            await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(None, request_limiter.end_request, lease), 1)
+            await asyncio.wait_for(waiting, 1)
+
+        asyncio.run(test())
+        assert admission_threads
+        request_limiter.close()
+
+    def test_redis_unavailable(self):
+        redis_client = Mock(spec=redis.Redis)
+        redis_client.register_script.return_value.side_effect = redis.ConnectionError("unavailable")
+        request_limiter = RequestLimiter(1, redis_client=redis_client)
+
+        lease = request_limiter.new_request()  # falls back to the in-process capacity
+        assert lease.member is None
+        with pytest.raises(RequestLimitExceededException):
+            request_limiter.new_request()
+        request_limiter.end_request(lease)
+        request_limiter.close()
+
+
+@pytest.mark.parametrize("texts, cost", [
+    ([], 1),
+    (["short"], 1),
+    (["a" * 1900], 1),
+    (["a" * 1901], 2),
+    (["short"] * 20, 2),
+    (["a" * 10000], 6),
+])
+def test_estimate_cost(texts, cost):
+    with patch("request_limitation.settings.rate_limit_characters_per_cost_unit", 2000), \
+            patch("request_limitation.settings.rate_limit_text_cost_characters", 100):
+        assert estimate_cost(texts) == cost
+
+
+def test_estimate_cost_disabled():
+    with patch("request_limitation.settings.rate_limit_characters_per_cost_unit", 0):
+        assert estimate_cost(["a" * 10000] * 10) == 1
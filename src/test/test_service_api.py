@@ -0,0 +1,30 @@
+import pytest
+
+from service_api import MissingArgumentError, TranslationRequest, error_response, results_page, translation_request
+from settings import settings
+from translation_jobs import InvalidJobException, JobNotFoundException
+from translator import TranslatorNotReadyException
+from translator_proxy_client import ForwardedTranslatorProxyError
+
+
+def test_translation_request():
+    assert translation_request({"texts": ["text"], "targetLanguage": "en"}) == TranslationRequest(["text"], "en", None)
+    with pytest.raises(MissingArgumentError, match="targetLanguage"):
+        translation_request({"texts": ["text"]})
+    with pytest.raises(MissingArgumentError, match="texts"):
+        translation_request(["text"])
+
+
+def test_results_page():
+    assert results_page(None, None) == (0, settings.job_results_page_size)
+    assert results_page("-3", "0") == (0, 1)
+    assert results_page("5", str(settings.job_results_page_size + 1)) == (5, settings.job_results_page_size)
+    with pytest.raises(InvalidJobException):
+        results_page("x", None)
+
+
+def test_error_response():
+    assert error_response(JobNotFoundException("unknown")) == (404, {"error": "Translation job 'unknown' not found"}, {})
+    assert error_response(TranslatorNotReadyException("not ready")) == (503, {"error": "not ready"}, {"Retry-After": "5"})
+    assert error_response(ForwardedTranslatorProxyError("bad input", "client", 422)) == (422, {"error": "bad input"}, {"Retry-After": "5"})
+    assert error_response(KeyError("texts")) is None
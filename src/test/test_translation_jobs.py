@@ -0,0 +1,227 @@
+import time
+from contextlib import nullcontext
+from typing import List, Optional
+from unittest.mock import Mock
+
+import pytest
+
+from constants import PriorityClass, make_absolute_path
+from request_limitation import RequestLimitExceededException
+from src.test.mocks.clock_mock import ClockMock
+from translation_jobs import ClaimedChunk, InvalidJobException, JobItem, JobNotFoundException, JobWorkers, LocalJobStore, \
+    RedisJobStore, claimed_key, job_file_format, job_items_from_file, job_items_from_texts
+from translator import TranslatorNotReadyException, UnexpectedTranslationError, UnsupportedLanguagePairException
+from translator_proxy_client import FailedTranslatorProxyRequest
+from utils.priority import current_priority
+
+
+@pytest.fixture
+def redis_client():
+    pytest.importorskip("lupa", reason="fakeredis requires lupa to run Lua scripts")
+    import fakeredis
+    client = fakeredis.FakeRedis()
+    client.flushall()
+    return client
+
+
+@pytest.fixture(params=["local", "redis"])
+def job_store(request):
+    if request.param == "local":
+        return LocalJobStore(chunk_size=2, ttl_seconds=60, max_texts=10)
+    return RedisJobStore(request.getfixturevalue("redis_client"), chunk_size=2, ttl_seconds=60, max_texts=10, chunk_lease_seconds=60)
+
+
+def _items(*texts: str) -> List[JobItem]:
+    return job_items_from_texts(list(texts), "en")
+
+
+class TestJobInput:
+
+    def test_csv(self):
+        with open(make_absolute_path("../../resources/test_texts.csv"), "rb") as file:
+            items = job_items_from_file(file.read(), job_file_format(None, "test_texts.csv"))
+        assert items[:2] == [JobItem("Hello", "de"), JobItem("Hallo", "en")]
+
+        assert job_items_from_file("a\n\nb,fr\n", "csv", target_language="en") == [JobItem("a", "en"), JobItem("b", "fr")]
+        with pytest.raises(InvalidJobException):
+            job_items_from_file("a\n", "csv")
+
+    def test_jsonl(self):
+        content = '{"text": "a"}\n{"text": "b", "targetLanguage": "fr", "sourceLanguage": "de"}\n'
+        assert job_items_from_file(content, job_file_format("application/x-ndjson", None), target_language="en") == [
+            JobItem("a", "en"), JobItem("b", "fr", "de")]
+        with pytest.raises(InvalidJobException):
+            job_items_from_file('{"texts": ["a"]}', "jsonl", target_language="en")
+        with pytest.raises(InvalidJobException):
+            job_items_from_file("a", "jsonl", target_language="en")
+
+    def test_invalid_input(self):
+        with pytest.raises(InvalidJobException):
+            job_items_from_texts("a", "en")
+        with pytest.raises(InvalidJobException):
+            job_file_format("text/plain", "texts.txt")
+        with pytest.raises(InvalidJobException):
+            job_items_from_file(b"\xff", "csv", target_language="en")
+
+
+class TestJobStore:
+
+    def test_progress_and_results(self, job_store):
+        job = job_store.create_job(_items("a", "b", "c"))
+        job_id = job["jobId"]
+        assert (job["status"], job["total"], job["completed"]) == ("QUEUED", 3, 0)
+
+        first, second = job_store.claim_chunk(), job_store.claim_chunk()
+        assert job_store.claim_chunk() is None
+        assert first == ClaimedChunk(job_id, 0, [JobItem("a", "en"), JobItem("b", "en")])
+        assert job_store.get_job(job_id)["status"] == "RUNNING"
+
+        job_store.complete_chunk(second, [{"error": "failed"}])
+        # results are returned up to the first chunk that has not been translated yet
+        assert job_store.get_results(job_id, 0, 10)["results"] == []
+        job_store.complete_chunk(first, [{"text": "A"}, {"text": "B"}])
+
+        job = job_store.get_job(job_id)
+        assert (job["status"], job["completed"], job["failed"]) == ("COMPLETED", 3, 1)
+        page = job_store.get_results(job_id, 1, 1)
+        assert page["results"] == [{"index": 1, "text": "B"}]
+        assert job_store.get_results(job_id, page["nextOffset"], 10)["results"] == [{"index": 2, "error": "failed"}]
+
+    def test_release_chunk(self, job_store):
+        job_store.create_job(_items("a"))
+        chunk = job_store.claim_chunk()
+        job_store.release_chunk(chunk)
+        assert job_store.claim_chunk() == chunk
+
+    def test_limits(self, job_store):
+        with pytest.raises(InvalidJobException):
+            job_store.create_job([])
+        with pytest.raises(InvalidJobException):
+            job_store.create_job(_items(*"abcdefghijk"))
+        with pytest.raises(JobNotFoundException):
+            job_store.get_job("unknown")
+
+    def test_expiry(self):
+        clock = ClockMock()
+        job_store = LocalJobStore(chunk_size=2, ttl_seconds=60, max_texts=10, clock=clock)
+        job_id = job_store.create_job(_items("a"))["jobId"]
+        clock.now = 61
+        with pytest.raises(JobNotFoundException):
+            job_store.get_job(job_id)
+
+
+class TestRedisJobStore:
+
+    def test_progress_survives_restart(self, redis_client):
+        job_store = RedisJobStore(redis_client, chunk_size=1, ttl_seconds=60, max_texts=10, chunk_lease_seconds=60)
+        job_id = job_store.create_job(_items("a", "b"))["jobId"]
+        job_store.complete_chunk(job_store.claim_chunk(), [{"text": "A"}])
+
+        restarted_job_store = RedisJobStore(redis_client, chunk_size=1, ttl_seconds=60, max_texts=10, chunk_lease_seconds=60)
+        assert restarted_job_store.get_job(job_id)["completed"] == 1
+        assert restarted_job_store.claim_chunk().items == [JobItem("b", "en")]
+
+    def test_chunk_of_crashed_worker_claimed_again(self, redis_client):
+        crashed_job_store = RedisJobStore(redis_client, chunk_size=2, ttl_seconds=60, max_texts=10, chunk_lease_seconds=0.1)
+        job_id = crashed_job_store.create_job(_items("a"))["jobId"]
+        crashed_chunk = crashed_job_store.claim_chunk()
+        job_store = RedisJobStore(redis_client, chunk_size=2, ttl_seconds=60, max_texts=10, chunk_lease_seconds=60)
+        assert job_store.claim_chunk() is None
+
+        time.sleep(0.2)
+        chunk = job_store.claim_chunk()
+        assert chunk == crashed_chunk
+        job_store.complete_chunk(chunk, [{"text": "A"}])
+        crashed_job_store.complete_chunk(crashed_chunk, [{"text": "A"}])  # completed late, but only counted once
+        assert job_store.get_job(job_id)["completed"] == 1
+        assert redis_client.zcard(claimed_key) == 0
+
+
+class TestJobWorkers:
+
+    @staticmethod
+    def _translate_batch(texts: List[str], target_language: str, source_language: Optional[str]) -> List[str]:
+        assert current_priority.get() == PriorityClass.bulk
+        if target_language == "xx":
+            raise UnsupportedLanguagePairException(source_language, target_language)
+        return [f"{text}[{target_language}]" for text in texts]
+
+    def test_translate_chunks(self):
+        job_store = LocalJobStore(chunk_size=3, ttl_seconds=60, max_texts=10)
+        translate_batch = Mock(side_effect=self._translate_batch)
+        request_limit_context = Mock(return_value=nullcontext())
+        workers = JobWorkers(job_store, translate_batch, request_limit_context, count=1)
+        job_id = job_store.create_job([JobItem("a", "en"), JobItem("b", "xx"), JobItem("c", "en"), JobItem("d", "en")])["jobId"]
+
+        assert workers.process_next_chunk()
+        assert workers.process_next_chunk()
+        assert not workers.process_next_chunk()
+
+        # the texts of a chunk are translated in one batch per language pair
+        assert translate_batch.call_args_list[0].args == (["a", "c"], "en", None)
+        assert request_limit_context.call_args.kwargs["priority"] == PriorityClass.bulk
+        results = job_store.get_results(job_id, 0, 10)["results"]
+        assert [result.get("text") for result in results] == ["a[en]", None, "c[en]", "d[en]"]
+        assert "xx" in results[1]["error"]
+        assert job_store.get_job(job_id)["status"] == "COMPLETED"
+
+    @pytest.mark.parametrize("error", [TranslatorNotReadyException("Models have not been loaded yet."), RequestLimitExceededException()])
+    def test_retry_later(self, error):
+        job_store = LocalJobStore(chunk_size=3, ttl_seconds=60, max_texts=10)
+        translate_batch = Mock(side_effect=[error, ["a[en]"]])
+        workers = JobWorkers(job_store, translate_batch, Mock(return_value=nullcontext()), count=1, retry_delay_seconds=0.01)
+        job_id = job_store.create_job(_items("a"))["jobId"]
+
+        workers.start()
+        for _ in range(100):
+            if job_store.get_job(job_id)["status"] == "COMPLETED":
+                break
+            time.sleep(0.01)
+        workers.close()
+
+        assert job_store.get_results(job_id, 0, 10)["results"] == [{"index": 0, "text": "a[en]"}]
+
+    def test_proxy_outage_retried(self):
+        job_store = LocalJobStore(chunk_size=3, ttl_seconds=60, max_texts=10)
+        outage = [FailedTranslatorProxyRequest("client", "No client available for mockA request; circuits of ['client'] are open."),
+                  UnexpectedTranslationError("There was an unexpected error with the translator proxy client."),
+                  ConnectionError("Connection refused")]
+        translate_batch = Mock(side_effect=[*outage, ["a[en]", "b[en]"]])
+        workers = JobWorkers(job_store, translate_batch, Mock(return_value=nullcontext()), count=1, retry_delay_seconds=0.01)
+        job_id = job_store.create_job(_items("a", "b"))["jobId"]
+
+        workers.start()
+        for _ in range(100):
+            if job_store.get_job(job_id)["status"] == "COMPLETED":
+                break
+            time.sleep(0.01)
+        workers.close()
+
+        assert translate_batch.call_count == 4
+        assert job_store.get_job(job_id)["failed"] == 0
+        assert job_store.get_results(job_id, 0, 10)["results"] == [{"index": 0, "text": "a[en]"}, {"index": 1, "text": "b[en]"}]
+
+    def test_lease_renewed_while_translating(self, redis_client):
+        job_store = RedisJobStore(redis_client, chunk_size=2, ttl_seconds=60, max_texts=10, chunk_lease_seconds=0.3)
+        other_job_store = RedisJobStore(redis_client, chunk_size=2, ttl_seconds=60, max_texts=10, chunk_lease_seconds=60)
+        claimed_again = []
+
+        def translate_batch(texts: List[str], target_language: str, source_language: Optional[str]) -> List[str]:
+            # takes longer than the lease, which would expire without renewal
+            for _ in range(4):
+                time.sleep(0.2)
+                claimed_again.append(other_job_store.claim_chunk())
+            return [f"{text}[{target_language}]" for text in texts]
+
+        workers = JobWorkers(job_store, translate_batch, Mock(return_value=nullcontext()), count=1)
+        job_id = job_store.create_job(_items("a"))["jobId"]
+        workers.start()
+        for _ in range(300):
+            if job_store.get_job(job_id)["status"] == "COMPLETED":
+                break
+            time.sleep(0.01)
+        workers.close()
+
+        assert claimed_again == [None] * 4
+        assert job_store.get_results(job_id, 0, 10)["results"] == [{"index": 0, "text": "a[en]"}]
+        assert redis_client.zcard(claimed_key) == 0
@@ -0,0 +1,210 @@
+import asyncio
+import importlib
+import json
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+from unittest.mock import Mock, MagicMock, AsyncMock, call, patch
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import request_limitation
+import translator
+from constants import PriorityClass
+from translator import TranslatorNotReadyException, UnexpectedTranslationError
+
+
+@pytest.fixture(scope="module")
+def patched_app():
+    # since Translator, RequestLimiter is initialized in module / at import and requires a Redis, we brute force mock it away
+    translator_mock = Mock(spec=translator.Translator)
+    request_limiter_mock = MagicMock(spec=request_limitation.RequestLimiter)
+    with ExitStack() as e:
+        e.enter_context(patch("request_limitation.RequestLimiter", request_limiter_mock))
+        e.enter_context(patch("translator.Translator", translator_mock))
+        e.enter_context(patch("translation_jobs.settings.job_queue_redis_enabled", False))
+        e.enter_context(patch("translation_jobs.JobWorkers", MagicMock()))
+        import translator_async_service
+        importlib.reload(translator_async_service)
+        yield translator_async_service.create_app, translator_mock, request_limiter_mock
+
+
+@dataclass
+class AppMockEnvironment:
+    create_app: Callable[[], web.Application]
+    translator: Mock
+    request_limiter: Mock
+
+    def run(self, test: Callable[[TestClient], Awaitable[None]]):
+        """ Runs the test with a client of a freshly started app. """
+        async def _run():
+            async with TestClient(TestServer(self.create_app())) as client:
+                await test(client)
+        asyncio.run(_run())
+
+
+@pytest.fixture(autouse=True)
+def app_mock(patched_app) -> AppMockEnvironment:
+    create_app, translator_mock, request_limiter_mock = patched_app
+    request_limiter_mock.reset_mock()
+    translator_mock.reset_mock()
+    translator_mock.return_value.translate_batch_async = AsyncMock(return_value=["dummy_translated_text"])
+    translator_mock.return_value.detect_language_async = AsyncMock(return_value="dummy_language")
+    return AppMockEnvironment(create_app, translator_mock, request_limiter_mock)
+
+
+class TestTranslatorAsyncService:
+    """ Unit tests for the asynchronous TranslatorService. """
+
+    def test_translation(self, app_mock):
+        async def test(client):
+            response = await client.post("/translation", json={"targetLanguage": "dummy_target",
+                                                               "sourceLanguage": "dummy_source",
+                                                               "texts": ["dummy_text"]})
+            assert response.status == 200
+            assert await response.json() == {'texts': ['dummy_translated_text']}
+
+        app_mock.run(test)
+        translate_batch_async = app_mock.translator.return_value.translate_batch_async
+        assert translate_batch_async.call_args.args == (['dummy_text'], 'dummy_target')
+        assert translate_batch_async.call_args.kwargs["source_language"] == "dummy_source"
+        assert app_mock.request_limiter.mock_calls == [call().limited_requests(cost=1, priority=PriorityClass.interactive),
+                                                       call().limited_requests().__aenter__(),
+                                                       call().limited_requests().__aexit__(None, None, None)]
+
+    def test_translation_stream(self, app_mock):
+        async def translations():
+            yield 1, "second_translated"
+            yield 0, "first_translated"
+            raise UnexpectedTranslationError("dummy error")
+
+        async def test(client):
+            response = await client.post("/translation/stream", json={"targetLanguage": "dummy_target", "texts": ["first", "second"]})
+            assert response.status == 200
+            assert response.content_type == "application/x-ndjson"
+            assert [json.loads(line) for line in (await response.text()).splitlines()] == [
+                {"index": 1, "text": "second_translated"}, {"index": 0, "text": "first_translated"}, {"error": "dummy error"}]
+
+        app_mock.translator.return_value.translate_batch_stream_async = AsyncMock(return_value=translations())
+        app_mock.run(test)
+        assert app_mock.translator.return_value.translate_batch_stream_async.call_args.args == (['first', 'second'], 'dummy_target')
+        app_mock.request_limiter.return_value.limited_requests.assert_called_once_with(cost=1, priority=PriorityClass.bulk)
+
+    def test_detection(self, app_mock):
+        async def test(client):
+            response = await client.post("/detection", json={"text": "dummy_text"})
+            assert response.status == 200
+            assert await response.json() == {'text': "dummy_language"}
+
+        app_mock.run(test)
+        assert app_mock.translator.return_value.detect_language_async.call_args.args == ("dummy_text",)
+
+    def test_concurrent_translations(self, app_mock):
+        in_flight = []
+
+        async def translate_batch_async(texts, *args, **kwargs):
+            in_flight.append(texts[0])
+            await asyncio.sleep(0.2)
+            return texts
+
+        async def test(client):
+            responses = await asyncio.gather(*[client.post("/translation", json={"targetLanguage": "en", "texts": [str(i)]})
+                                               for i in range(50)])
+            assert [await response.json() for response in responses] == [{"texts": [str(i)]} for i in range(50)]
+
+        app_mock.translator.return_value.translate_batch_async.side_effect = translate_batch_async
+        start = time.monotonic()
+        app_mock.run(test)
+        assert len(in_flight) == 50
+        assert time.monotonic() - start < 5  # requests are served concurrently, not one after the other
+
+    def test_not_ready(self, app_mock):
+        async def test(client):
+            response = await client.post("/translation", json={"targetLanguage": "en", "texts": ["text"]})
+            assert response.status == 503
+            assert response.headers["Retry-After"] == "5"
+            assert await response.json() == {"error": "Models have not been loaded yet."}
+
+        app_mock.translator.return_value.translate_batch_async.side_effect = TranslatorNotReadyException("Models have not been loaded yet.")
+        app_mock.run(test)
+
+    def test_priority(self, app_mock):
+        async def test(client):
+            response = await client.post("/detection", headers={"X-Translator-Priority": "BULK"}, json={"text": "dummy_text"})
+            assert response.status == 200
+            response = await client.post("/detection", headers={"X-Translator-Priority": "urgent"}, json={"text": "dummy_text"})
+            assert response.status == 400
+
+        app_mock.run(test)
+        app_mock.request_limiter.return_value.limited_requests.assert_called_once_with(cost=1, priority=PriorityClass.bulk)
+
+    def test_jobs(self, app_mock):
+        async def test(client):
+            form = aiohttp.FormData()
+            form.add_field("file", "Hallo\nWelt\n", filename="texts.csv", content_type="text/csv")
+            response = await client.post("/jobs", data=form, params={"targetLanguage": "en"})
+            assert response.status == 202
+            job_id = (await response.json())["jobId"]
+            assert response.headers["Location"] == f"/jobs/{job_id}"
+            response = await client.get(f"/jobs/{job_id}")
+            assert (await response.json())["total"] == 2
+            response = await client.get(f"/jobs/{job_id}/results", params={"offset": "x"})
+            assert response.status == 400
+            assert (await client.get("/jobs/unknown")).status == 404
+
+        app_mock.run(test)
+
+    def test_missing_argument(self, app_mock):
+        async def test(client):
+            assert (await client.post("/languages", json={})).status == 400
+            assert (await client.post("/translation", json={"texts": ["text"]})).status == 400
+
+        app_mock.run(test)
+
+    def test_invalid_json(self, app_mock):
+        async def test(client):
+            response = await client.post("/translation", data="{invalid", headers={"Content-Type": "application/json"})
+            assert response.status == 400
+            assert (await response.json())["error"].startswith("Failed to decode JSON object")
+
+        app_mock.run(test)
+
+    def test_job_workers_started_with_app(self, app_mock):
+        import translator_async_service
+        job_workers = translator_async_service.job_workers
+        job_workers.reset_mock()
+
+        async def test(client):
+            job_workers.start.assert_called_once()
+            job_workers.close.assert_not_called()
+
+        app_mock.run(test)
+        job_workers.close.assert_called_once()
+
+    def test_metrics(self, app_mock):
+        async def test(client):
+            await client.get("/jobs/unknown")
+            await client.get("/unknown")
+            response = await client.get("/metrics")
+            assert response.status == 200
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            metrics = await response.text()
+            assert 'translator_request_duration_seconds_count{endpoint="/jobs/{job_id}",method="GET",status="404"}' in metrics
+            assert 'translator_request_duration_seconds_count{endpoint="unmatched",method="GET",status="404"}' in metrics
+
+        app_mock.run(test)
+
+    def test_server_timing(self, app_mock):
+        async def test(client):
+            headers = {"traceparent": "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"}
+            response = await client.post("/translation", headers=headers, json={"targetLanguage": "en", "texts": ["text"]})
+            assert response.headers["Server-Timing"].startswith("total;dur=")
+            response = await client.post("/translation", json={"targetLanguage": "en", "texts": ["text"]})
+            assert "Server-Timing" not in response.headers
+
+        with patch("translator_async_service.settings.tracing_sample_rate", 0):
+            app_mock.run(test)
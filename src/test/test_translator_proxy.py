@@ -1,14 +1,20 @@
+import asyncio
+import threading
+import time
 from contextlib import ExitStack
 from unittest.mock import patch, Mock, AsyncMock, call, MagicMock
 
+import fakeredis
 import pytest
 
+from instrumentation import proxy_circuit_state, proxy_circuit_transitions, proxy_client_errors
 from schemas import TranslatorApiResponseHealthSchema, TranslatorApiResponseDetectionSchema, TranslatorApiDetectionSchema, TranslatorApiResponseTranslationSchema, \
     TranslatorApiTranslationSchema
 from settings import TranslatorSettings
 from src.test.mocks.translator_model_mocks import TranslatorModelMockA, TranslatorModelMockB
 from translator import TranslatorProxy, TranslatorNotReadyException, UnexpectedTranslationError
-from translator_proxy_client import FailedTranslatorProxyRequest
+from translator_proxy_client import FailedTranslatorProxyRequest, ForwardedTranslatorProxyError
+from utils.shared_translation_cache import SharedTranslationCache
 
 
 @pytest.fixture(scope="module", autouse=True)
@@ -35,6 +41,7 @@ def proxy_mock():
         proxy_mock.return_value.get_models = AsyncMock()
         proxy_mock.return_value.get_models.return_value = Mock(models=["mockA"])
         proxy_mock.return_value.get_health = AsyncMock()
+        proxy_mock.return_value.get_health.return_value = TranslatorApiResponseHealthSchema(healthy=True, serviceAvailable=True)
         proxy_mock.return_value.post_translation = AsyncMock()
         proxy_mock.return_value.post_detection = AsyncMock()
         yield proxy_mock
@@ -55,7 +62,23 @@ class TestTranslatorProxy:
         translator_proxy.initialize_models()
         assert translator_proxy.models_determined is True
         assert proxy_mock.mock_calls == [call('client_a'), call().get_models(),
-                                         call('client_b'), call().get_models()]
+                                         call('client_b'), call().get_models(),
+                                         call().get_health(), call().get_health()]
+
+    def test_reuse_proxy_clients(self, proxy_mock):
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        translator_proxy.detect_language("text")
+        translator_proxy.detect_language("text")
+        assert [c for c in proxy_mock.mock_calls if c.args and isinstance(c.args[0], str)] == [call('client_a'), call('client_b')]
+
+    def test_close(self, proxy_mock):
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        proxy_mock.return_value.close = AsyncMock()
+        translator_proxy.close()
+        assert proxy_mock.return_value.close.call_count == 2
+        assert translator_proxy._event_loop.loop.is_closed()
 
     def test_list_models(self, proxy_mock):
         proxy_mock.return_value.get_models.side_effect = [Mock(models=["mockA"]), Mock(models=["mockB"])]
@@ -95,6 +118,263 @@ class TestTranslatorProxy:
             call(TranslatorApiTranslationSchema(texts=['testAnswer'], targetLanguage='de', sourceLanguage='fr'))
         ]  # cf. TranslatorModelMockA and TranslatorModelMockB
 
+    def test_translate_batch(self, proxy_mock):
+        proxy_mock.return_value.post_translation.side_effect = lambda body: TranslatorApiResponseTranslationSchema(
+            texts=[f"{text}[{body.targetLanguage}]" for text in body.texts])
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        assert translator_proxy.translate_batch(["a", "b", "c"], target_language="de", source_language="en") == ["a[fr][de]", "b[fr][de]", "c[fr][de]"]
+        assert proxy_mock.return_value.post_translation.mock_calls == [
+            call(TranslatorApiTranslationSchema(texts=['a', 'b', 'c'], targetLanguage='fr', sourceLanguage='en')),
+            call(TranslatorApiTranslationSchema(texts=['a[fr]', 'b[fr]', 'c[fr]'], targetLanguage='de', sourceLanguage='fr'))
+        ]  # one request per step, cf. TranslatorModelMockA
+
+    def test_translate_batch_async(self, proxy_mock):
+        proxy_mock.return_value.post_translation.side_effect = lambda body: TranslatorApiResponseTranslationSchema(
+            texts=[f"{text}[{body.targetLanguage}]" for text in body.texts])
+        proxy_mock.return_value.post_detection.return_value = TranslatorApiResponseDetectionSchema(text="en")
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+
+        async def translate_concurrently():
+            return await asyncio.gather(translator_proxy.translate_batch_async(["a", "b"], target_language="de", source_language="en"),
+                                        translator_proxy.translate_batch_async(["c"], target_language="fr"),
+                                        translator_proxy.detect_language_async("d"))
+
+        assert asyncio.run(translate_concurrently()) == [["a[fr][de]", "b[fr][de]"], ["c[fr]"], "en"]
+        assert translator_proxy.translate_batch(["a", "b"], target_language="de", source_language="en") == ["a[fr][de]", "b[fr][de]"]
+        assert proxy_mock.return_value.post_translation.call_count == 3  # the last translation is cached
+
+    def test_translate_batch_split(self, proxy_mock):
+        proxy_mock.return_value.post_translation.side_effect = lambda body: TranslatorApiResponseTranslationSchema(
+            texts=[f"{text}[{body.targetLanguage}]" for text in body.texts])
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        with patch("translator.settings.proxy_batch_max_size", 2):
+            assert translator_proxy.translate_batch(["a", "b", "c"], target_language="fr", source_language="en") == ["a[fr]", "b[fr]", "c[fr]"]
+        assert [c.args[0].texts for c in proxy_mock.return_value.post_translation.mock_calls] == [['a', 'b'], ['c']]
+
+    def test_translate_batch_stream(self, proxy_mock):
+        proxy_mock.return_value.post_translation.side_effect = lambda body: TranslatorApiResponseTranslationSchema(
+            texts=[f"{text}[{body.targetLanguage}]" for text in body.texts])
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        translator_proxy.translate("b", target_language="fr", source_language="en")
+        with patch("translator.settings.stream_chunk_size", 2):
+            translations = list(translator_proxy.translate_batch_stream(["a", "b", "c", "d", "a"], target_language="fr", source_language="en"))
+        assert translations[0] == (1, "b[fr]")  # cached translations come first
+        assert sorted(translations) == [(0, "a[fr]"), (1, "b[fr]"), (2, "c[fr]"), (3, "d[fr]"), (4, "a[fr]")]
+        assert sorted(c.args[0].texts for c in proxy_mock.return_value.post_translation.mock_calls) == [['a', 'c'], ['b'], ['d']]
+
+    def test_translate_batch_stream_async(self, proxy_mock):
+        proxy_mock.return_value.post_translation.side_effect = lambda body: TranslatorApiResponseTranslationSchema(
+            texts=[f"{text}[{body.targetLanguage}]" for text in body.texts])
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+
+        async def translate_stream():
+            translations = await translator_proxy.translate_batch_stream_async(["a", "b", "c"], target_language="de", source_language="en")
+            return [translation async for translation in translations]
+
+        with patch("translator.settings.stream_chunk_size", 2):
+            assert sorted(asyncio.run(translate_stream())) == [(0, "a[fr][de]"), (1, "b[fr][de]"), (2, "c[fr][de]")]
+
+    def test_translate_batch_stream_error(self, proxy_mock):
+        proxy_mock.return_value.post_translation.side_effect = FailedTranslatorProxyRequest("client", "dummy")
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        translations = translator_proxy.translate_batch_stream(["a"], target_language="fr", source_language="en")
+        with pytest.raises(UnexpectedTranslationError):
+            list(translations)
+
+    def test_translate_batch_unexpected_number_of_translations(self, proxy_mock):
+        proxy_mock.return_value.post_translation.return_value = TranslatorApiResponseTranslationSchema(texts=["a"])
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        with pytest.raises(UnexpectedTranslationError):
+            translator_proxy.translate_batch(["a", "b"], target_language="fr", source_language="en")
+
+    def test_translate_batch_detect_languages(self, proxy_mock):
+        proxy_mock.return_value.post_detection.side_effect = lambda body: TranslatorApiResponseDetectionSchema(
+            text="de" if body.text.startswith("de") else "en")
+        proxy_mock.return_value.post_translation.side_effect = lambda body: TranslatorApiResponseTranslationSchema(
+            texts=[f"{text}[{body.targetLanguage}]" for text in body.texts])
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        assert translator_proxy.translate_batch(["de_text", "en_text"], target_language="en") == ["de_text[en]", "en_text"]
+        assert translator_proxy.translate_batch(["de_text", "en_text"], target_language="fr") == ["de_text[en][fr]", "en_text[fr]"]
+        assert proxy_mock.return_value.post_detection.call_count == 4
+
+    def test_detections_bounded(self, proxy_mock):
+        in_flight = []
+        max_in_flight = 0
+
+        async def _post_detection(body):
+            nonlocal max_in_flight
+            in_flight.append(body.text)
+            max_in_flight = max(max_in_flight, len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(body.text)
+            return TranslatorApiResponseDetectionSchema(text="en")
+
+        proxy_mock.return_value.post_detection.side_effect = _post_detection
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        with patch("translator.settings.proxy_detection_max_concurrency", 3):
+            assert translator_proxy._detect_languages([f"text{i}" for i in range(10)]) == ["en"] * 10
+        assert proxy_mock.return_value.post_detection.call_count == 10
+        assert max_in_flight == 3
+
+    def test_route_around_overloaded_client(self, proxy_mock):
+        proxy_mock.return_value.get_models.return_value = Mock(models=["mockA", "mockB"])
+
+        def _proxy_client(client):
+            async def _post_translation(body):
+                if client == "client_a":
+                    raise ForwardedTranslatorProxyError("Too many requests", client, 503, retry_after=60)
+                return TranslatorApiResponseTranslationSchema(texts=[f"{text}[{body.targetLanguage}]" for text in body.texts])
+            return Mock(get_models=proxy_mock.return_value.get_models, get_health=proxy_mock.return_value.get_health,
+                        post_translation=AsyncMock(side_effect=_post_translation))
+
+        def _overloaded_errors():
+            return sum(values[0] for (client, _, reason), values in proxy_client_errors.samples().items() if (client, reason) == ("client_a", "503"))
+
+        proxy_mock.side_effect = _proxy_client
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        errors_before = _overloaded_errors()
+        for i in range(5):
+            assert translator_proxy.translate(f"text{i}", "fr", "en") == f"text{i}[fr]"
+        client_statistics = translator_proxy.statistics()["clients"]
+        assert client_statistics["client_a"]["requests"] <= 1
+        assert client_statistics["client_a"]["available"] is False
+        assert client_statistics["client_b"]["requests"] == 5
+        assert _overloaded_errors() - errors_before == client_statistics["client_a"]["requests"]
+
+    def test_hedge_slow_request(self, proxy_mock):
+        proxy_mock.return_value.get_models.return_value = Mock(models=["mockA", "mockB"])
+        cancelled = []
+
+        def _proxy_client(client):
+            async def _post_translation(body):
+                try:
+                    await asyncio.sleep(10 if client == "client_a" else 0)
+                except asyncio.CancelledError:
+                    cancelled.append(client)
+                    raise
+                return TranslatorApiResponseTranslationSchema(texts=[f"{text}[{client}]" for text in body.texts])
+            return Mock(get_models=proxy_mock.return_value.get_models, get_health=proxy_mock.return_value.get_health,
+                        post_translation=AsyncMock(side_effect=_post_translation))
+
+        proxy_mock.side_effect = _proxy_client
+        with patch("translator.settings.proxy_hedging_enabled", True), patch("translator.settings.proxy_hedging_budget_ratio", 1.0):
+            translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        for _ in range(20):
+            translator_proxy._request_hedger.record("mockA", 0.01)
+        translator_proxy._load_balancer.mark_unavailable("client_b", 60)  # the original request goes to client_a
+
+        start = time.monotonic()
+        assert translator_proxy.translate("text", "fr", "en") == "text[client_b]"
+        assert time.monotonic() - start < 5
+        assert cancelled == ["client_a"]
+        hedging_statistics = translator_proxy.statistics()["hedging"]
+        assert hedging_statistics["hedges"] == 1
+        assert hedging_statistics["hedgesWon"] == 1
+
+    def test_skip_client_with_open_circuit(self, proxy_mock):
+        proxy_mock.return_value.get_models.return_value = Mock(models=["mockA", "mockB"])
+        calls = []
+
+        def _proxy_client(client):
+            async def _post_translation(body):
+                calls.append(client)
+                if client == "client_a":
+                    raise FailedTranslatorProxyRequest(client, "Connection refused")
+                return TranslatorApiResponseTranslationSchema(texts=[f"{text}[{body.targetLanguage}]" for text in body.texts])
+            return Mock(get_models=proxy_mock.return_value.get_models, get_health=proxy_mock.return_value.get_health,
+                        post_translation=AsyncMock(side_effect=_post_translation))
+
+        proxy_mock.side_effect = _proxy_client
+        with patch("translator.settings.proxy_circuit_minimum_requests", 2), patch("translator.settings.proxy_balancing_policy", "RANDOM"):
+            translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        for i in range(20):
+            assert translator_proxy.translate(f"text{i}", "fr", "en") == f"text{i}[fr]"
+
+        assert calls.count("client_a") == 2
+        assert calls.count("client_b") == 20
+        circuit_breakers = translator_proxy.statistics()["circuitBreakers"]
+        assert circuit_breakers["client_a"] == {"state": "OPEN", "transitions": {"CLOSED->OPEN": 1}}
+        assert circuit_breakers["client_b"]["state"] == "CLOSED"
+        assert proxy_circuit_transitions.samples()[("client_a", "CLOSED", "OPEN")] == [1.0]
+        assert proxy_circuit_state.samples()[("client_a", "OPEN")] == [1.0]
+        assert proxy_circuit_state.samples()[("client_b", "OPEN")] == [0.0]
+
+    def test_forward_error_if_all_clients_overloaded(self, proxy_mock):
+        proxy_mock.return_value.get_models.return_value = Mock(models=["mockA", "mockB"])
+        proxy_mock.return_value.post_translation.side_effect = ForwardedTranslatorProxyError("Too many requests", "client", 503, retry_after=5)
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        with pytest.raises(ForwardedTranslatorProxyError):
+            translator_proxy.translate("text", "fr", "en")
+        assert proxy_mock.return_value.post_translation.call_count == 2
+
+    def test_rejected_input_no_client_failure(self, proxy_mock):
+        proxy_mock.return_value.get_models.return_value = Mock(models=["mockA", "mockB"])
+        proxy_mock.return_value.post_translation.side_effect = ForwardedTranslatorProxyError("Invalid input", "client", 422)
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        with pytest.raises(ForwardedTranslatorProxyError):
+            translator_proxy.translate("text", "fr", "en")
+        client_statistics = translator_proxy.statistics()["clients"]
+        assert sum(statistics["requests"] for statistics in client_statistics.values()) == 1
+        assert sum(statistics["failures"] for statistics in client_statistics.values()) == 0
+
+    def test_translate_cached(self, proxy_mock):
+        proxy_mock.return_value.post_translation.return_value = TranslatorApiResponseTranslationSchema(texts=["testAnswer"])
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        assert translator_proxy.translate("testText", target_language="fr", source_language="en") == "testAnswer"
+        assert translator_proxy.translate("testText", target_language="fr", source_language="en") == "testAnswer"
+        assert proxy_mock.return_value.post_translation.call_count == 1
+        assert translator_proxy.statistics()["translationCache"]["hits"] == 1
+
+    def test_translate_shared_cached(self, proxy_mock):
+        """ Translations of one replica are served to another replica via the shared cache. """
+        proxy_mock.return_value.post_translation.return_value = TranslatorApiResponseTranslationSchema(texts=["testAnswer"])
+        shared_cache = SharedTranslationCache(fakeredis.FakeRedis(), ttl_seconds=60, compression_min_bytes=512,
+                                              retry_after_seconds=30)
+        with patch("translator.settings.shared_cache_enabled", True), \
+                patch("translator.SharedTranslationCache.from_settings", return_value=shared_cache):
+            translator_proxies = [TranslatorProxy(), TranslatorProxy()]
+        for translator_proxy in translator_proxies:
+            translator_proxy.initialize_models()
+            assert translator_proxy.translate("testText", target_language="fr", source_language="en") == "testAnswer"
+        assert proxy_mock.return_value.post_translation.call_count == 1
+        assert translator_proxies[1].statistics()["sharedTranslationCache"]["hits"] == 1
+
+    def test_shared_cache_accessed_off_event_loop(self, proxy_mock):
+        """ The shared cache blocks on Redis, so the async translation accesses it in the executor. """
+        proxy_mock.return_value.post_translation.return_value = TranslatorApiResponseTranslationSchema(texts=["testAnswer"])
+        shared_cache = SharedTranslationCache(fakeredis.FakeRedis(), ttl_seconds=60, compression_min_bytes=512,
+                                              retry_after_seconds=30)
+        cache_threads = []
+        for method in ("get_many", "put_many"):
+            def _record_thread(*args, _method=getattr(shared_cache, method)):
+                cache_threads.append(threading.current_thread())
+                return _method(*args)
+            setattr(shared_cache, method, _record_thread)
+        with patch("translator.settings.shared_cache_enabled", True), \
+                patch("translator.SharedTranslationCache.from_settings", return_value=shared_cache):
+            translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+
+        assert asyncio.run(translator_proxy.translate_batch_async(["testText"], "fr", source_language="en")) == ["testAnswer"]
+        assert asyncio.run(translator_proxy.statistics_async())["sharedTranslationCache"]["misses"] == 1
+        assert len(cache_threads) == 2
+        assert threading.main_thread() not in cache_threads
+
     def test_list_models_uninitialized(self):
         translator_proxy = TranslatorProxy()
         with pytest.raises(TranslatorNotReadyException):
@@ -117,16 +397,44 @@ class TestTranslatorProxy:
 
         translator_proxy = TranslatorProxy()
         translator_proxy.initialize_models()
+        # proxy clients are created once and reused by every attempt
         assert proxy_mock.mock_calls == [call('client_a'), call().get_models(),
-                                         call('client_b'), call().get_models()]*3
+                                         call('client_b'), call().get_models()] + [call().get_models()] * 4 + [call().get_health()] * 2
 
 
-    def test_catch_proxy_error_on_health_check(self, proxy_mock):
+    def test_models_loaded_cached(self, proxy_mock):
         translator_proxy = TranslatorProxy()
         translator_proxy.initialize_models()
-        proxy_mock.return_value.get_health.side_effect = FailedTranslatorProxyRequest("client", "dummy")
-        with pytest.raises(UnexpectedTranslationError):
-            translator_proxy.models_loaded
+        for _ in range(10):
+            assert translator_proxy.models_loaded is True
+        assert proxy_mock.return_value.get_health.call_count == 2  # only checked once during initialization
+
+    def test_health_check_error(self, proxy_mock):
+        proxy_mock.return_value.get_health.side_effect = [TranslatorApiResponseHealthSchema(healthy=True, serviceAvailable=True),
+                                                          FailedTranslatorProxyRequest("client_b", "dummy")]
+        translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        assert translator_proxy.models_loaded is False
+        client_health = translator_proxy.statistics()["clientHealth"]
+        assert client_health["client_a"]["available"] is True
+        assert client_health["client_b"]["available"] is False
+        assert client_health["client_b"]["consecutiveFailures"] == 1
+        assert client_health["client_b"]["stale"] is True
+
+    def test_health_polling(self, proxy_mock):
+        proxy_mock.return_value.get_health.return_value = TranslatorApiResponseHealthSchema(healthy=True, serviceAvailable=False)
+        with patch("translator.settings.proxy_health_interval_seconds", 0.01):
+            translator_proxy = TranslatorProxy()
+        translator_proxy.initialize_models()
+        assert translator_proxy.models_loaded is False
+
+        proxy_mock.return_value.get_health.return_value = TranslatorApiResponseHealthSchema(healthy=True, serviceAvailable=True)
+        deadline = time.monotonic() + 5
+        while not translator_proxy.models_loaded and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert translator_proxy.models_loaded is True
+        proxy_mock.return_value.close = AsyncMock()
+        translator_proxy.close()
 
 
     def test_catch_proxy_error_on_translate(self, proxy_mock):
@@ -146,7 +454,7 @@ class TestTranslatorProxy:
 
     def test_returns_error_if_model_not_loaded(self, proxy_mock, _env_mock):
         translator_proxy = TranslatorProxy()
-        translator_proxy.initialize_models()
         proxy_mock.return_value.get_health.return_value = TranslatorApiResponseHealthSchema(healthy = True, serviceAvailable = False)
+        translator_proxy.initialize_models()
         with pytest.raises(TranslatorNotReadyException):
             translator_proxy.translate("test", "de", "en")
\ No newline at end of file
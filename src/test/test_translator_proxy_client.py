@@ -0,0 +1,151 @@
+from types import SimpleNamespace
+from unittest.mock import patch, AsyncMock
+
+import pytest
+from aiohttp import web
+
+from constants import PriorityClass
+from schemas import TranslatorApiTranslationSchema, TranslatorApiResponseHealthSchema, TranslatorApiDetectionSchema
+from translator_proxy_client import TranslatorProxyClient, ForwardedTranslatorProxyError
+from utils.event_loop import BackgroundEventLoop
+from utils.priority import priority_context
+from utils.srv_resolver import SrvResolver
+from utils.tracing import Trace, trace_context
+
+
+class _StubTranslatorClient:
+    """ Local http server answering like a translator client; records the client ports of all requests. """
+
+    def __init__(self):
+        self.peers = []
+        self.priorities = []
+        self.traceparents = []
+        self._runner = None
+        self.url = None
+
+    async def _health(self, request: web.Request):
+        self.peers.append(request.transport.get_extra_info("peername"))
+        return web.json_response({"healthy": True, "serviceAvailable": True})
+
+    async def _translation(self, request: web.Request):
+        self.peers.append(request.transport.get_extra_info("peername"))
+        self.priorities.append(request.headers.get("X-Translator-Priority"))
+        self.traceparents.append(request.headers.get("traceparent"))
+        body = await request.json()
+        return web.json_response({"texts": [f"{text}[{body['targetLanguage']}]" for text in body["texts"]]},
+                                 headers={"Server-Timing": 'inference;dur=12.5;desc="mockA de->en", total;dur=20'})
+
+    async def _detection(self, request: web.Request):
+        return web.json_response({"error": "Too many requests"}, status=503, headers={"Retry-After": "7"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/health", self._health)
+        app.router.add_post("/translation", self._translation)
+        app.router.add_post("/detection", self._detection)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    @property
+    def srv_record(self):
+        host, port = self.url.removeprefix("http://").split(":")
+        return SimpleNamespace(host=host, port=int(port), priority=0, weight=1, ttl=30)
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+@pytest.fixture
+def event_loop_thread():
+    background_event_loop = BackgroundEventLoop()
+    yield background_event_loop
+    background_event_loop.close()
+
+
+@pytest.fixture
+def stub_client(event_loop_thread):
+    stub = _StubTranslatorClient()
+    event_loop_thread.run(stub.start())
+    yield stub
+    event_loop_thread.run(stub.stop())
+
+
+@pytest.fixture
+def proxy_client(event_loop_thread, stub_client):
+    proxy_client = TranslatorProxyClient("stub")
+    with patch.object(TranslatorProxyClient, "_get_client_url_from_srv_dns", AsyncMock(return_value=stub_client.url)):
+        yield proxy_client
+    event_loop_thread.run(proxy_client.close())
+
+
+@pytest.fixture
+def second_stub_client(event_loop_thread):
+    stub = _StubTranslatorClient()
+    event_loop_thread.run(stub.start())
+    yield stub
+    event_loop_thread.run(stub.stop())
+
+
+class TestTranslatorProxyClient:
+
+    def test_requests(self, event_loop_thread, proxy_client):
+        health = event_loop_thread.run(proxy_client.get_health())
+        assert health == TranslatorApiResponseHealthSchema(healthy=True, serviceAvailable=True)
+
+        translation = event_loop_thread.run(proxy_client.post_translation(
+            TranslatorApiTranslationSchema(texts=["a", "b"], sourceLanguage="de", targetLanguage="en")))
+        assert translation.texts == ["a[en]", "b[en]"]
+
+    def test_forward_priority(self, event_loop_thread, proxy_client, stub_client):
+        body = TranslatorApiTranslationSchema(texts=["a"], sourceLanguage="de", targetLanguage="en")
+        event_loop_thread.run(proxy_client.post_translation(body))
+        with priority_context(PriorityClass.bulk):
+            event_loop_thread.run(proxy_client.post_translation(body))
+
+        assert stub_client.priorities == ["INTERACTIVE", "BULK"]
+
+    def test_forward_trace(self, event_loop_thread, proxy_client, stub_client):
+        body = TranslatorApiTranslationSchema(texts=["a"], sourceLanguage="de", targetLanguage="en")
+        event_loop_thread.run(proxy_client.post_translation(body))
+        trace = Trace()
+        with trace_context(trace):
+            event_loop_thread.run(proxy_client.post_translation(body))
+
+        assert stub_client.traceparents[0] is None
+        proxy_span = next(span for span in trace.spans if span.name == "proxy")
+        assert stub_client.traceparents[1] == f"00-{trace.trace_id}-{proxy_span.span_id}-01"
+        client_spans = {span.name: span for span in trace.spans if span.parent_id == proxy_span.span_id}
+        assert client_spans["client.inference"].description == "stub mockA de->en"
+        assert client_spans["client.inference"].duration == 0.0125
+        assert client_spans["client.total"].duration == 0.02
+
+    def test_reuse_connection(self, event_loop_thread, proxy_client, stub_client):
+        for _ in range(3):
+            event_loop_thread.run(proxy_client.get_health())
+
+        assert len(stub_client.peers) == 3
+        assert len(set(stub_client.peers)) == 1  # all requests were sent via the same keep-alive connection
+
+    def test_forward_error(self, event_loop_thread, proxy_client):
+        with pytest.raises(ForwardedTranslatorProxyError) as e:
+            event_loop_thread.run(proxy_client.post_detection(TranslatorApiDetectionSchema(text="Hallo")))
+        assert e.value.status_code == 503
+        assert e.value.retry_after == 7
+        assert e.value.error == "Too many requests"
+
+    def test_spread_requests_across_srv_targets(self, event_loop_thread, stub_client, second_stub_client):
+        async def query(domain):
+            assert domain == "stub.translator"
+            return [stub_client.srv_record, second_stub_client.srv_record]
+
+        proxy_client = TranslatorProxyClient("stub", resolver=SrvResolver(min_ttl_seconds=5, max_ttl_seconds=300, query=query))
+        for _ in range(20):
+            event_loop_thread.run(proxy_client.get_health())
+        event_loop_thread.run(proxy_client.close())
+
+        assert len(stub_client.peers) + len(second_stub_client.peers) == 20
+        assert stub_client.peers and second_stub_client.peers
@@ -1,13 +1,16 @@
 import importlib
+import json
 from contextlib import ExitStack
 from dataclasses import dataclass
-from unittest.mock import Mock, MagicMock, call, patch
+from unittest.mock import ANY, Mock, MagicMock, call, patch
 
 import pytest
 from flask.testing import FlaskClient
 
 import request_limitation
 import translator
+from constants import PriorityClass, make_absolute_path
+from translator import TranslatorNotReadyException, UnexpectedTranslationError
 
 
 @pytest.fixture(scope="module")
@@ -18,6 +21,8 @@ def patched_app():
     with ExitStack() as e:
         e.enter_context(patch("request_limitation.RequestLimiter", request_limiter_mock))
         e.enter_context(patch("translator.Translator", translator_mock))
+        e.enter_context(patch("translation_jobs.settings.job_queue_redis_enabled", False))
+        e.enter_context(patch("translation_jobs.JobWorkers", MagicMock()))
         import translator_service
         importlib.reload(translator_service)
         yield translator_service.app, translator_mock, request_limiter_mock
@@ -35,7 +40,7 @@ def app_mock(patched_app) -> AppMockEnvironment:
     app, translator_mock, request_limiter_mock = patched_app
     request_limiter_mock.reset_mock()
     translator_mock.reset_mock()
-    translator_mock.return_value.translate.return_value = "dummy_translated_text"
+    translator_mock.return_value.translate_batch.return_value = ["dummy_translated_text"]
     translator_mock.return_value.detect_language.return_value = "dummy_language"
     with app.test_client() as client:
         yield AppMockEnvironment(client, translator_mock, request_limiter_mock)
@@ -52,15 +57,148 @@ class TestTranslatorService:
                                                  "sourceLanguage": "dummy_source",
                                                  "texts": ["dummy_text"]})
         assert response_wrapper.status_code == 200
-        app_mock.translator.assert_has_calls([call().translate('dummy_text',
-                                                           'dummy_target',
-                                                           source_language="dummy_source")])
+        app_mock.translator.assert_has_calls([call().translate_batch(['dummy_text'],
+                                                                 'dummy_target',
+                                                                 source_language="dummy_source")])
         assert response_wrapper.json == {'texts': ['dummy_translated_text']}
+        app_mock.request_limiter.return_value.limited_requests.assert_called_once_with(cost=1, priority=PriorityClass.interactive)
 
+    def test_translation_cost(self, app_mock):
+        """ Large requests take a larger share of the rate limit capacity, estimated before translating. """
+
+        response_wrapper = app_mock.client.post("translation",
+                                                json={"targetLanguage": "dummy_target",
+                                                      "texts": ["a" * 5000, "b" * 1000]})
+        assert response_wrapper.status_code == 200
+        app_mock.request_limiter.return_value.limited_requests.assert_called_once_with(cost=4, priority=PriorityClass.interactive)
+
+    def test_translation_priority(self, app_mock):
+        """ The priority class is taken from the priority header, case-insensitively, unknown classes are rejected. """
+
+        response_wrapper = app_mock.client.post("translation", headers={"X-Translator-Priority": "bulk"},
+                                                json={"targetLanguage": "dummy_target", "texts": ["dummy_text"]})
+        assert response_wrapper.status_code == 200
+        app_mock.request_limiter.return_value.limited_requests.assert_called_once_with(cost=1, priority=PriorityClass.bulk)
+
+        response_wrapper = app_mock.client.post("translation", headers={"X-Translator-Priority": "urgent"},
+                                                json={"targetLanguage": "dummy_target", "texts": ["dummy_text"]})
+        assert response_wrapper.status_code == 400
+        assert "urgent" in response_wrapper.json["error"]
+
+
+    def test_translation_stream(self, app_mock):
+        """ Test the /translation/stream endpoint. """
+
+        app_mock.translator.return_value.translate_batch_stream.return_value = iter([(1, "second_translated"), (0, "first_translated")])
+        response_wrapper = app_mock.client.post("translation/stream",
+                                                json={"targetLanguage": "dummy_target",
+                                                      "sourceLanguage": "dummy_source",
+                                                      "texts": ["first", "second"]})
+        assert response_wrapper.status_code == 200
+        assert response_wrapper.mimetype == "application/x-ndjson"
+        assert [json.loads(line) for line in response_wrapper.get_data(as_text=True).splitlines()] == [
+            {"index": 1, "text": "second_translated"}, {"index": 0, "text": "first_translated"}]
+        app_mock.translator.assert_has_calls([call().translate_batch_stream(['first', 'second'],
+                                                                            'dummy_target',
+                                                                            source_language="dummy_source")])
+        app_mock.request_limiter.return_value.limited_requests.assert_called_once_with(cost=1, priority=PriorityClass.bulk)
+        request_limitation = app_mock.request_limiter.return_value.limited_requests.return_value
+        request_limitation.__enter__.assert_called_once()
+        request_limitation.__exit__.assert_not_called()  # the request counts until the stream is closed
+        response_wrapper.close()
+        request_limitation.__exit__.assert_called_once_with(ANY, None, None, None)
+
+    def test_translation_stream_error(self, app_mock):
+        """ Test the /translation/stream endpoint to end the stream with an error record if translating fails midway. """
+
+        def translations():
+            yield 0, "first_translated"
+            raise UnexpectedTranslationError("dummy error")
+
+        app_mock.translator.return_value.translate_batch_stream.return_value = translations()
+        response_wrapper = app_mock.client.post("translation/stream", json={"targetLanguage": "dummy_target", "texts": ["first", "second"]})
+        assert response_wrapper.status_code == 200
+        assert [json.loads(line) for line in response_wrapper.get_data(as_text=True).splitlines()] == [
+            {"index": 0, "text": "first_translated"}, {"error": "dummy error"}]
+
+    def test_translation_stream_not_ready(self, app_mock):
+        app_mock.translator.return_value.translate_batch_stream.side_effect = TranslatorNotReadyException("Models have not been loaded yet.")
+        response_wrapper = app_mock.client.post("translation/stream", json={"targetLanguage": "dummy_target", "texts": ["first"]})
+        assert response_wrapper.status_code == 503
+        app_mock.request_limiter.return_value.limited_requests.return_value.__exit__.assert_called_once_with(ANY, TranslatorNotReadyException, ANY, ANY)
 
     def test_detection(self, app_mock):
         response_wrapper = app_mock.client.post("detection",
                                                 json={"text": "dummy_text" })
         assert response_wrapper.status_code == 200
         app_mock.translator.return_value.detect_language.assert_called_once_with("dummy_text")
-        assert response_wrapper.json == {'text': "dummy_language"}
\ No newline at end of file
+        assert response_wrapper.json == {'text': "dummy_language"}
+
+    def test_jobs(self, app_mock):
+        """ Test submitting a translation job, its progress and its results; the chunks are translated by hand here. """
+        import translator_service
+
+        response_wrapper = app_mock.client.post("jobs", json={"targetLanguage": "en", "texts": ["eins", "zwei"]})
+        assert response_wrapper.status_code == 202
+        job_id = response_wrapper.json["jobId"]
+        assert response_wrapper.headers["Location"] == f"/jobs/{job_id}"
+        assert response_wrapper.json["status"] == "QUEUED"
+        assert app_mock.client.get(f"jobs/{job_id}/results").json["results"] == []
+
+        chunk = translator_service.job_store.claim_chunk()
+        translator_service.job_store.complete_chunk(chunk, [{"text": "one"}, {"error": "failed"}])
+        job = app_mock.client.get(f"jobs/{job_id}").json
+        assert (job["status"], job["total"], job["completed"], job["failed"]) == ("COMPLETED", 2, 2, 1)
+        response_wrapper = app_mock.client.get(f"jobs/{job_id}/results", query_string={"offset": 1})
+        assert response_wrapper.json["results"] == [{"index": 1, "error": "failed"}]
+        assert response_wrapper.json["nextOffset"] == 2
+
+    def test_job_upload(self, app_mock):
+        """ Test submitting a translation job as CSV file upload and as JSONL body. """
+        import translator_service
+
+        with open(make_absolute_path("../../resources/test_texts.csv"), "rb") as file:
+            response_wrapper = app_mock.client.post("jobs", data={"file": (file, "test_texts.csv")})
+        assert response_wrapper.status_code == 202
+        response_wrapper = app_mock.client.post("jobs", query_string={"targetLanguage": "de"}, content_type="application/x-ndjson",
+                                                data='{"text": "Hello"}\n{"text": "Bonjour", "targetLanguage": "en"}\n')
+        assert response_wrapper.status_code == 202
+
+        assert translator_service.job_store.claim_chunk().items[:2] == [("Hello", "de", None), ("Hallo", "en", None)]
+        assert translator_service.job_store.claim_chunk().items == [("Hello", "de", None), ("Bonjour", "en", None)]
+
+    def test_job_workers_started_by_hook(self, app_mock):
+        import translator_service
+        job_workers = translator_service.job_workers
+        job_workers.start.assert_not_called()  # not on import
+
+        translator_service.start_job_workers()
+        job_workers.start.assert_called_once()
+        with patch("translator_service.settings.job_workers", 0):
+            translator_service.start_job_workers()
+        job_workers.start.assert_called_once()
+        translator_service.stop_job_workers()
+        job_workers.close.assert_called_once()
+
+    def test_job_errors(self, app_mock):
+        assert app_mock.client.get("jobs/unknown").status_code == 404
+        assert app_mock.client.get("jobs/unknown/results").status_code == 404
+        assert app_mock.client.post("jobs", json={"texts": ["eins"]}).status_code == 400
+        response_wrapper = app_mock.client.post("jobs", content_type="text/plain", data="eins")
+        assert response_wrapper.status_code == 400
+        assert "Unsupported file format" in response_wrapper.json["error"]
+
+    def test_metrics(self, app_mock):
+        app_mock.client.get("jobs/unknown")
+        response_wrapper = app_mock.client.get("metrics")
+        assert response_wrapper.status_code == 200
+        assert response_wrapper.content_type.startswith("text/plain; version=0.0.4")
+        assert 'translator_request_duration_seconds_count{endpoint="/jobs/<job_id>",method="GET",status="404"}' in response_wrapper.text
+
+    def test_server_timing(self, app_mock):
+        headers = {"traceparent": "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"}
+        response_wrapper = app_mock.client.post("translation", headers=headers, json={"targetLanguage": "en", "texts": ["dummy_text"]})
+        assert response_wrapper.headers["Server-Timing"].startswith("total;dur=")
+        with patch("translator_service.settings.tracing_sample_rate", 0):
+            response_wrapper = app_mock.client.post("translation", json={"targetLanguage": "en", "texts": ["dummy_text"]})
+        assert "Server-Timing" not in response_wrapper.headers
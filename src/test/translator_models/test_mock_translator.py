@@ -11,3 +11,8 @@ class TestMockTranslator:
         mock = MockTranslator()
         assert mock.translate("blabla", "en", "de") == "blabla in German"
         assert mock.translate("blabla", "de", "en") == "blabla auf Englisch"
+
+    def test_model_batch_translation(self):
+        mock = MockTranslator()
+        assert mock.translate_batch(["bla", "blub"], "en", "de") == ["bla in German", "blub in German"]
+
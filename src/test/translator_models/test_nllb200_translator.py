@@ -30,4 +30,40 @@ class TestNLB200Translator:
         assert LANGUAGE_DICT
         assert transformer_auto_tokenizer_mock.mock_calls == [call.from_pretrained('facebook/nllb-200-3.3B', use_auth_token=True, src_lang=scr_lang) for scr_lang in LANGUAGE_DICT.values()]
 
+    def test_translate_batch(self, transformer_auto_model_mock, transformer_auto_tokenizer_mock):
+        nllb200 = Nllb200Translator()
+        tokenizer = transformer_auto_tokenizer_mock.from_pretrained.return_value
+        model = transformer_auto_model_mock.from_pretrained.return_value.to.return_value
 
+        tokenizer.return_value = {"input_ids": [[1, 2, 3], [1]]}
+        tokenizer.batch_decode.return_value = ["second_translated", "first_translated"]
+
+        res = nllb200.translate_batch(["first_text", "second_text"], "de", "en")
+
+        tokenizer.assert_called_once_with(["first_text", "second_text"])
+        tokenizer.pad.assert_called_once_with({"input_ids": [[1], [1, 2, 3]]}, return_tensors='pt')  # sorted by length
+        model.generate.assert_called_once_with(**tokenizer.pad.return_value.to.return_value,
+                                               forced_bos_token_id=tokenizer.lang_code_to_id['eng_Latn'],
+                                               max_length=1000)
+        assert res == ["first_translated", "second_translated"]
+
+    def test_translate_batch_token_budget(self, transformer_auto_model_mock, transformer_auto_tokenizer_mock):
+        nllb200 = Nllb200Translator()
+        nllb200.batch_max_tokens = 4
+        tokenizer = transformer_auto_tokenizer_mock.from_pretrained.return_value
+        tokenizer.return_value = {"input_ids": [[1, 2, 3], [1], [1, 2]]}
+        tokenizer.batch_decode.side_effect = [["second_translated", "third_translated"], ["first_translated"]]
+
+        res = nllb200.translate_batch(["first_text", "second_text", "third_text"], "de", "en")
+
+        assert tokenizer.pad.call_args_list == [call({"input_ids": [[1], [1, 2]]}, return_tensors='pt'),
+                                                call({"input_ids": [[1, 2, 3]]}, return_tensors='pt')]
+        assert res == ["first_translated", "second_translated", "third_translated"]
+
+    def test_count_tokens(self, transformer_auto_model_mock, transformer_auto_tokenizer_mock):
+        nllb200 = Nllb200Translator()
+        tokenizer = transformer_auto_tokenizer_mock.from_pretrained.return_value
+        tokenizer.tokenize.return_value = ["▁first", "_text"]
+
+        assert nllb200.count_tokens("first_text", "de", "en") == 2
+        tokenizer.tokenize.assert_called_once_with("first_text")
@@ -24,4 +24,10 @@ class TestOpusMTTranslator:
     @pytest.mark.parametrize("iso_pair", [("nan", "nan"), ("fr", "ja")])
     def test_fail_for_invalid_tuple(self, iso_pair):
         with pytest.raises(ValueError):
-            OpusMTTranslator().translate("some_text", source_language=iso_pair[0], target_language=iso_pair[1])
\ No newline at end of file
+            OpusMTTranslator().translate("some_text", source_language=iso_pair[0], target_language=iso_pair[1])
+
+    def test_translate_batch(self, easy_nmt_mock):
+        res = OpusMTTranslator().translate_batch(["first_text", "second_text"], source_language="de", target_language="en")
+        easy_nmt_mock.return_value.translate.assert_called_once_with(["first_text", "second_text"], "en", source_lang="de")
+        assert res == easy_nmt_mock.return_value.translate.return_value
+
@@ -60,3 +60,32 @@ class TestWMT19Translator:
         assert unused_tokenizer.mock_calls == []
 
         assert res == used_tokenizer.decode.return_value
+
+    def test_translate_batch(self, transformer_model_mock, transformer_tokenizer_mock):
+        model_tokenizer_mocks = self._setup_models_and_tokenizers(transformer_model_mock, transformer_tokenizer_mock)
+        used_tokenizer, used_model = model_tokenizer_mocks["en-de"]
+
+        used_tokenizer.return_value = {"input_ids": [[1, 2, 3], [1]]}
+        used_tokenizer.batch_decode.return_value = ["second_translated", "first_translated"]
+        wmt19 = Wmt19Translator()
+
+        res = wmt19.translate_batch(["first_text", "second_text"], "en", "de")
+        assert used_tokenizer.mock_calls[0] == call(["first_text", "second_text"])
+        used_tokenizer.pad.assert_called_once_with({"input_ids": [[1], [1, 2, 3]]}, return_tensors='pt')  # sorted by length
+        used_tokenizer.batch_decode.assert_called_once_with(used_model.generate.return_value, skip_special_tokens=True)
+        assert res == ["first_translated", "second_translated"]
+
+    def test_translate_empty_batch(self, transformer_model_mock, transformer_tokenizer_mock):
+        model_tokenizer_mocks = self._setup_models_and_tokenizers(transformer_model_mock, transformer_tokenizer_mock)
+        used_tokenizer, used_model = model_tokenizer_mocks["en-de"]
+
+        assert Wmt19Translator().translate_batch([], "en", "de") == []
+        assert used_model.mock_calls == []
+
+    def test_count_tokens(self, transformer_model_mock, transformer_tokenizer_mock):
+        model_tokenizer_mocks = self._setup_models_and_tokenizers(transformer_model_mock, transformer_tokenizer_mock)
+        used_tokenizer, _ = model_tokenizer_mocks["en-de"]
+        used_tokenizer.tokenize.return_value = ["first", "_text"]
+
+        assert Wmt19Translator().count_tokens("first_text", "en", "de") == 2
+        used_tokenizer.tokenize.assert_called_once_with("first_text")
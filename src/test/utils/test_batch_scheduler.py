@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from constants import PriorityClass
+from utils.batch_scheduler import BatchScheduler, BatchQueueFullException
+
+
+class _RecordingModel:
+    """ Translates by upper-casing and records the sizes of the batches it was called with. """
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def translate_batch(self, texts):
+        self.batch_sizes.append(len(texts))
+        return [text.upper() for text in texts]
+
+
+class TestBatchScheduler:
+
+    def test_translate_batch_in_order(self):
+        model = _RecordingModel()
+        scheduler = BatchScheduler(max_batch_size=2, max_wait_ms=0, max_queue_depth=10)
+
+        assert scheduler.translate_batch("mock", ("de", "en"), ["a", "b", "c"], model.translate_batch) == ["A", "B", "C"]
+        assert model.batch_sizes == [2, 1]
+
+    def test_merge_concurrent_calls(self):
+        model = _RecordingModel()
+        scheduler = BatchScheduler(max_batch_size=4, max_wait_ms=5000, max_queue_depth=10)
+        barrier = threading.Barrier(4)
+
+        def _translate(text):
+            barrier.wait()
+            return scheduler.translate_batch("mock", ("de", "en"), [text], model.translate_batch)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(_translate, ["a", "b", "c", "d"]))
+
+        assert results == [["A"], ["B"], ["C"], ["D"]]
+        assert model.batch_sizes == [4]  # flushed as soon as the batch is full, long before the max wait expires
+
+    def test_separate_queues_per_language_pair(self):
+        model = _RecordingModel()
+        scheduler = BatchScheduler(max_batch_size=4, max_wait_ms=0, max_queue_depth=10)
+
+        scheduler.translate_batch("mock", ("de", "en"), ["a"], model.translate_batch)
+        scheduler.translate_batch("mock", ("en", "de"), ["b"], model.translate_batch)
+
+        assert set(scheduler.statistics()) == {"mock:de->en", "mock:en->de"}
+
+    def test_error_is_raised_for_every_caller(self):
+        scheduler = BatchScheduler(max_batch_size=4, max_wait_ms=0, max_queue_depth=10)
+
+        def _fail(texts):
+            raise ValueError("invalid language pair")
+
+        with pytest.raises(ValueError):
+            scheduler.translate_batch("mock", ("de", "en"), ["a"], _fail)
+        # the queue is still usable afterwards
+        assert scheduler.translate_batch("mock", ("de", "en"), ["a"], _RecordingModel().translate_batch) == ["A"]
+
+    def test_queue_full(self):
+        scheduler = BatchScheduler(max_batch_size=1, max_wait_ms=0, max_queue_depth=2)
+        translating = threading.Event()
+        release = threading.Event()
+
+        def _translate_blocking(texts):
+            translating.set()
+            release.wait()
+            return [text.upper() for text in texts]
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # more segments than the maximum depth are accepted on an empty queue
+            large = executor.submit(scheduler.translate_batch, "mock", ("de", "en"), ["a", "b", "c"], _translate_blocking)
+            translating.wait()
+            with pytest.raises(BatchQueueFullException):
+                scheduler.translate_batch("mock", ("de", "en"), ["d"], _translate_blocking)
+            release.set()
+            assert large.result() == ["A", "B", "C"]
+
+    def test_statistics(self):
+        scheduler = BatchScheduler(max_batch_size=2, max_wait_ms=0, max_queue_depth=10)
+        scheduler.translate_batch("mock", ("de", "en"), ["a", "b", "c"], _RecordingModel().translate_batch)
+
+        assert scheduler.statistics() == {"mock:de->en": {"queued": 0,
+                                                          "queuedByPriority": {"INTERACTIVE": 0, "BULK": 0},
+                                                          "batches": 2,
+                                                          "segments": 3,
+                                                          "averageBatchSize": 1.5,
+                                                          "lastBatchSize": 1,
+                                                          "maxBatchSize": 2}}
+
+    def test_bulk_preempted_at_batch_boundary(self):
+        scheduler = BatchScheduler(max_batch_size=2, max_wait_ms=0, max_queue_depth=10,
+                                   weights={PriorityClass.interactive: 4, PriorityClass.bulk: 1})
+        batches = []
+        batch_started = threading.Event()
+        interactive_queued = threading.Event()
+
+        def _translate(texts):
+            batch_started.set()
+            interactive_queued.wait(5)
+            batches.append(texts)
+            return [text.upper() for text in texts]
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            bulk = executor.submit(scheduler.translate_batch, "mock", ("de", "en"), ["b0", "b1", "b2", "b3", "b4", "b5"],
+                                   _translate, PriorityClass.bulk)
+            batch_started.wait(5)
+            interactive = executor.submit(scheduler.translate_batch, "mock", ("de", "en"), ["i0", "i1"],
+                                          _translate, PriorityClass.interactive)
+            while scheduler.statistics()["mock:de->en"]["queuedByPriority"]["INTERACTIVE"] < 2:
+                time.sleep(0.001)
+            interactive_queued.set()
+
+            assert interactive.result() == ["I0", "I1"]
+            assert bulk.result() == ["B0", "B1", "B2", "B3", "B4", "B5"]
+        # the interactive texts are translated right after the batch in progress
+        assert batches == [["b0", "b1"], ["i0", "i1"], ["b2", "b3"], ["b4", "b5"]]
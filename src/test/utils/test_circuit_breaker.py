@@ -0,0 +1,68 @@
+import random
+
+from src.test.mocks.clock_mock import ClockMock
+from utils.circuit_breaker import CircuitBreaker, CircuitState
+
+
+def _circuit_breaker(clock):
+    return CircuitBreaker("client", failure_rate_threshold=0.5, minimum_requests=4, window_size=10, open_seconds=2,
+                          max_open_seconds=8, clock=clock, rng=random.Random(0))
+
+
+def _fail(circuit_breaker, times=1):
+    for _ in range(times):
+        assert circuit_breaker.try_acquire()
+        circuit_breaker.record_failure()
+
+
+class TestCircuitBreaker:
+
+    def test_open_at_failure_rate(self):
+        circuit_breaker = _circuit_breaker(ClockMock())
+        _fail(circuit_breaker, 3)
+        assert circuit_breaker.state == CircuitState.closed  # too few requests
+        for _ in range(4):
+            assert circuit_breaker.try_acquire()
+            circuit_breaker.record_success()
+        _fail(circuit_breaker)
+        assert circuit_breaker.state == CircuitState.open
+        assert circuit_breaker.allows_requests is False
+        assert circuit_breaker.try_acquire() is False
+
+    def test_half_open_probe(self):
+        clock = ClockMock()
+        circuit_breaker = _circuit_breaker(clock)
+        _fail(circuit_breaker, 4)
+
+        clock.now = 2
+        assert circuit_breaker.allows_requests is True
+        assert circuit_breaker.try_acquire() is True
+        assert circuit_breaker.state == CircuitState.half_open
+        assert circuit_breaker.try_acquire() is False  # only a single probe
+        circuit_breaker.record_success()
+        assert circuit_breaker.state == CircuitState.closed
+        assert circuit_breaker.statistics()["transitions"] == {"CLOSED->OPEN": 1, "OPEN->HALF_OPEN": 1, "HALF_OPEN->CLOSED": 1}
+
+    def test_exponential_backoff(self):
+        clock = ClockMock()
+        circuit_breaker = _circuit_breaker(clock)
+        _fail(circuit_breaker, 4)
+        open_times = []
+        for _ in range(4):
+            open_times.append(circuit_breaker._open_until - clock.now)
+            clock.now = circuit_breaker._open_until
+            _fail(circuit_breaker)  # failed probe
+            assert circuit_breaker.state == CircuitState.open
+
+        assert 1 <= open_times[0] <= 2
+        assert 2 <= open_times[1] <= 4
+        assert all(4 <= open_time <= 8 for open_time in open_times[2:])  # capped at the maximum
+
+    def test_release_probe(self):
+        clock = ClockMock()
+        circuit_breaker = _circuit_breaker(clock)
+        _fail(circuit_breaker, 4)
+        clock.now = 2
+        assert circuit_breaker.try_acquire() is True
+        circuit_breaker.release()
+        assert circuit_breaker.try_acquire() is True
@@ -0,0 +1,58 @@
+from unittest.mock import Mock
+
+from utils.document_segmenter import DocumentSegmenter, flatten_segments, join_segments
+
+
+def _count_words(text):
+    return len(text.split())
+
+
+class TestDocumentSegmenter:
+
+    def test_short_text_untouched(self):
+        segmenter = DocumentSegmenter(5, _count_words)
+
+        assert segmenter.segment(" Hello world. \n").segments == [" Hello world. \n"]
+
+    def test_special_tokens(self):
+        count_tokens = Mock(side_effect=_count_words)
+        segmenter = DocumentSegmenter(5, count_tokens, special_tokens=2)
+
+        assert segmenter.segment("a b").segments == ["a b"]
+        count_tokens.assert_not_called()
+        assert segmenter.segment("a b c d").segments == ["a b c", "d"]
+
+    def test_pack_sentences(self):
+        segmenter = DocumentSegmenter(5, _count_words)
+
+        segmented = segmenter.segment("One two. Three four. Five six seven? Eight!")
+        assert segmented.segments == ["One two. Three four.", "Five six seven? Eight!"]
+        assert segmented.separators == ["", " ", ""]
+
+    def test_keep_paragraphs(self):
+        segmenter = DocumentSegmenter(5, _count_words)
+        text = "  First paragraph.\n\n\tSecond one.\nThird paragraph with more words than fit.  \n"
+
+        segmented = segmenter.segment(text)
+        assert segmented.segments == ["First paragraph.", "Second one.", "Third paragraph with more words", "than fit."]
+        assert segmented.join(segmented.segments) == text
+
+    def test_split_long_sentence(self):
+        segmenter = DocumentSegmenter(3, _count_words)
+
+        segmented = segmenter.segment("a b c d e f g. h i.")
+        assert segmented.segments == ["a b c", "d e f", "g. h i."]
+        assert segmented.join(["A", "D", "G"]) == "A D G"
+
+    def test_quoted_sentence_end(self):
+        segmenter = DocumentSegmenter(4, _count_words)
+
+        assert segmenter.segment('He said "stop now." Then she left.').segments == ['He said "stop now."', "Then she left."]
+
+    def test_join_flattened_segments(self):
+        segmenter = DocumentSegmenter(2, _count_words)
+        segmented_texts = [segmenter.segment(text) for text in ["One two. Three.\nFour.", "Five."]]
+
+        segments = flatten_segments(segmented_texts)
+        assert segments == ["One two.", "Three.", "Four.", "Five."]
+        assert join_segments(segmented_texts, [s.upper() for s in segments]) == ["ONE TWO. THREE.\nFOUR.", "FIVE."]
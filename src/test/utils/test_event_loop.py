@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.event_loop import BackgroundEventLoop
+
+
+@pytest.fixture
+def event_loop_thread():
+    background_event_loop = BackgroundEventLoop()
+    yield background_event_loop
+    background_event_loop.close()
+
+
+class TestBackgroundEventLoop:
+
+    def test_run(self, event_loop_thread):
+        async def _add(a, b):
+            await asyncio.sleep(0)
+            return a + b
+
+        assert event_loop_thread.run(_add(1, 2)) == 3
+
+    def test_run_on_same_loop(self, event_loop_thread):
+        async def _get_loop():
+            return asyncio.get_running_loop()
+
+        assert event_loop_thread.run(_get_loop()) is event_loop_thread.run(_get_loop()) is event_loop_thread.loop
+
+    def test_run_from_several_threads(self, event_loop_thread):
+        results = []
+
+        async def _identity(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        threads = [threading.Thread(target=lambda i=i: results.append(event_loop_thread.run(_identity(i)))) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(results) == [0, 1, 2, 3, 4]
+
+    def test_run_raises(self, event_loop_thread):
+        async def _fail():
+            raise ValueError("failed")
+
+        with pytest.raises(ValueError):
+            event_loop_thread.run(_fail())
+
+    def test_run_from_within_loop(self, event_loop_thread):
+        async def _nested():
+            async def _inner():
+                return 1
+            event_loop_thread.run(_inner())
+
+        with pytest.raises(RuntimeError):
+            event_loop_thread.run(_nested())
+
+    def test_close(self):
+        background_event_loop = BackgroundEventLoop()
+        background_event_loop.close()
+        assert background_event_loop.loop.is_closed()
@@ -0,0 +1,64 @@
+import asyncio
+import random
+
+from src.test.mocks.clock_mock import ClockMock
+from utils.health_monitor import HealthMonitor
+
+
+def _monitor(check_health, clock=None):
+    return HealthMonitor(["a", "b"], check_health, interval_seconds=5, max_backoff_seconds=60, stale_after_seconds=30,
+                         clock=clock or ClockMock(), rng=random.Random(0))
+
+
+class TestHealthMonitor:
+
+    def test_refresh(self):
+        async def check_health(client):
+            if client == "b":
+                raise ConnectionError("refused")
+            return True
+
+        monitor = _monitor(check_health)
+        assert monitor.all_available is False  # not checked yet
+        asyncio.run(monitor.refresh())
+
+        assert monitor.is_available("a") is True
+        assert monitor.is_available("b") is False
+        assert monitor.all_available is False
+        assert monitor.statistics()["b"]["lastError"] == "ConnectionError: refused"
+
+    def test_stale(self):
+        clock = ClockMock()
+
+        async def check_health(client):
+            return True
+
+        monitor = _monitor(check_health, clock)
+        asyncio.run(monitor.refresh())
+        assert monitor.all_available is True
+
+        clock.now = 31
+        assert monitor.all_available is False
+        assert monitor.statistics()["a"]["stale"] is True
+        assert monitor.statistics()["a"]["secondsSinceLastSuccess"] == 31
+
+    def test_jittered_backoff(self):
+        failures = {"a": 0}
+
+        async def check_health(client):
+            if failures["a"]:
+                raise TimeoutError()
+            return True
+
+        monitor = _monitor(check_health)
+        asyncio.run(monitor.refresh())
+        assert 2.5 <= monitor._next_delay("a") <= 5
+
+        failures["a"] = 1
+        delays = []
+        for _ in range(6):
+            asyncio.run(monitor.refresh())
+            delays.append(monitor._next_delay("a"))
+        assert 5 <= delays[0] <= 10
+        assert 10 <= delays[1] <= 20
+        assert all(30 <= delay <= 60 for delay in delays[3:])  # capped at the maximum backoff
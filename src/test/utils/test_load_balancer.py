@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from constants import BalancingPolicy
+from src.test.mocks.clock_mock import ClockMock
+from utils.load_balancer import LoadBalancer
+
+
+def _balancer(policy, clock=None):
+    return LoadBalancer(policy, ewma_decay_seconds=10, clock=clock or ClockMock(), rng=random.Random(0))
+
+
+class TestLoadBalancer:
+
+    def test_least_outstanding(self):
+        balancer = _balancer(BalancingPolicy.least_outstanding)
+        with balancer.track("a"), balancer.track("a"), balancer.track("b"):
+            assert {balancer.choose(["a", "b", "c"]) for _ in range(10)} == {"c"}
+            with balancer.track("c"):
+                assert {balancer.choose(["a", "b", "c"]) for _ in range(10)} == {"b", "c"}
+        assert balancer.statistics()["a"]["inFlight"] == 0
+
+    def test_ewma_prefers_fast_client(self):
+        clock = ClockMock()
+        balancer = _balancer(BalancingPolicy.ewma, clock)
+        for client, latency in (("fast", 0.1), ("slow", 2.0)):
+            with balancer.track(client):
+                clock.now += latency
+
+        assert {balancer.choose(["fast", "slow"]) for _ in range(10)} == {"fast"}
+        assert balancer.statistics()["slow"]["latencySeconds"] == pytest.approx(2.0)
+
+    def test_ewma_accounts_for_load(self):
+        clock = ClockMock()
+        balancer = _balancer(BalancingPolicy.ewma, clock)
+        for client in ("a", "b"):
+            with balancer.track(client):
+                clock.now += 1.0
+        with balancer.track("a"):
+            assert {balancer.choose(["a", "b"]) for _ in range(10)} == {"b"}
+
+    def test_ewma_decay(self):
+        clock = ClockMock()
+        balancer = _balancer(BalancingPolicy.ewma, clock)
+        with balancer.track("a"):
+            clock.now += 1.0
+        clock.now += 1000
+        with balancer.track("a"):
+            clock.now += 0.1
+        assert balancer.statistics()["a"]["latencySeconds"] == pytest.approx(0.1)
+
+    def test_failures_do_not_update_latency(self):
+        balancer = _balancer(BalancingPolicy.ewma)
+        with pytest.raises(RuntimeError):
+            with balancer.track("a"):
+                raise RuntimeError()
+        assert balancer.statistics()["a"] == {"inFlight": 0, "latencySeconds": None, "requests": 1, "failures": 1, "available": True}
+
+    def test_errors_that_are_no_failures(self):
+        clock = ClockMock()
+        balancer = _balancer(BalancingPolicy.ewma, clock)
+        with pytest.raises(ValueError):
+            with balancer.track("a", is_failure=lambda e: not isinstance(e, ValueError)):
+                clock.now += 0.5
+                raise ValueError()
+        assert balancer.statistics()["a"] == {"inFlight": 0, "latencySeconds": 0.5, "requests": 1, "failures": 0, "available": True}
+
+    @pytest.mark.parametrize("policy", list(BalancingPolicy))
+    def test_route_around_unavailable_client(self, policy):
+        clock = ClockMock()
+        balancer = _balancer(policy, clock)
+        balancer.mark_unavailable("a", 5)
+
+        assert {balancer.choose(["a", "b"]) for _ in range(10)} == {"b"}
+        assert balancer.choose(["a"]) == "a"  # no other client left
+        clock.now = 5
+        assert {balancer.choose(["a", "b"]) for _ in range(20)} == {"a", "b"}
@@ -0,0 +1,117 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from constants import PriorityClass
+from utils.metrics import MetricsRegistry
+
+
+def _write_snapshot(directory, pid: int, registry: MetricsRegistry):
+    with open(os.path.join(directory, f"metrics_{pid}.json"), "w") as file:
+        json.dump(registry.snapshot(), file)
+
+
+def _exited_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    return process.pid
+
+
+class TestMetricsRegistry:
+
+    def test_render(self):
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "Requests.", ["priority"])
+        queued = registry.gauge("queued", "Queued \"segments\".")
+        latency = registry.histogram("latency_seconds", "Latency.", ["endpoint"], buckets=[0.1, 1])
+
+        requests.labels(PriorityClass.bulk).inc()
+        requests.labels(PriorityClass.bulk).inc(2)
+        queued.set(3)
+        for value in (0.05, 0.1, 0.5, 2):
+            latency.labels("/translation").observe(value)
+
+        assert registry.render().splitlines() == [
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{endpoint="/translation",le="0.1"} 2.0',
+            'latency_seconds_bucket{endpoint="/translation",le="1.0"} 3.0',
+            'latency_seconds_bucket{endpoint="/translation",le="+Inf"} 4.0',
+            'latency_seconds_sum{endpoint="/translation"} 2.65',
+            'latency_seconds_count{endpoint="/translation"} 4.0',
+            '# HELP queued Queued \\"segments\\".',
+            '# TYPE queued gauge',
+            'queued 3.0',
+            '# HELP requests_total Requests.',
+            '# TYPE requests_total counter',
+            'requests_total{priority="BULK"} 3.0',
+        ]
+
+    def test_register_twice(self):
+        registry = MetricsRegistry()
+        assert registry.counter("requests_total", "Requests.") is registry.counter("requests_total", "Requests.")
+        with pytest.raises(ValueError):
+            registry.gauge("requests_total", "Requests.")
+        with pytest.raises(ValueError):
+            registry.counter("errors_total", "Errors.", ["client"]).labels("a", "b")
+
+    def test_record_from_threads(self):
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "Requests.")
+
+        def _record():
+            for _ in range(1000):
+                requests.inc()
+        threads = [threading.Thread(target=_record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert "requests_total 8000.0" in registry.render()
+
+    def test_callback(self):
+        registry = MetricsRegistry()
+        lookups = registry.counter("lookups_total", "Lookups.", ["result"])
+        lookups.set_callback(lambda: {("hit",): 1})
+        lookups.set_callback(lambda: {("hit",): 3, ("miss",): 2})
+        failing = registry.gauge("failing", "Failing.")
+        failing.set_callback(lambda: 1 / 0)
+
+        rendered = registry.render()
+        assert 'lookups_total{result="hit"} 3.0' in rendered
+        assert 'lookups_total{result="miss"} 2.0' in rendered
+        assert "# TYPE failing gauge" in rendered
+
+    def test_multiple_processes(self, tmp_path):
+        def _registry(directory=None):
+            registry = MetricsRegistry(directory)
+            registry.counter("requests_total", "Requests.").inc()
+            registry.histogram("latency_seconds", "Latency.", buckets=[1]).observe(0.5)
+            registry.gauge("queued", "Queued.").set(2)
+            registry.gauge("load_seconds", "Load time.", multiprocess_mode="max").set(5)
+            return registry
+        _write_snapshot(tmp_path, os.getppid(), _registry())
+        _write_snapshot(tmp_path, _exited_pid(), _registry())
+        registry = _registry(str(tmp_path))
+
+        rendered = registry.render().splitlines()
+        # counters and histograms include exited processes, gauges only live ones
+        assert "requests_total 3.0" in rendered
+        assert 'latency_seconds_bucket{le="1.0"} 3.0' in rendered
+        assert "latency_seconds_count 3.0" in rendered
+        assert "queued 4.0" in rendered
+        assert "load_seconds 5.0" in rendered
+
+    def test_write_snapshot(self, tmp_path):
+        registry = MetricsRegistry(str(tmp_path))
+        registry.counter("requests_total", "Requests.").inc()
+        registry.start()
+        registry.close()
+
+        with open(tmp_path / f"metrics_{os.getpid()}.json") as file:
+            assert json.load(file)["requests_total"]["samples"] == [[[], [1.0]]]
@@ -0,0 +1,22 @@
+import pytest
+
+from constants import PriorityClass
+from utils.priority import InvalidPriorityException, current_priority, iterate_in_context, parse_priority, priority_context
+
+
+def test_parse_priority():
+    assert parse_priority(None, PriorityClass.bulk) == PriorityClass.bulk
+    assert parse_priority(" bulk ", PriorityClass.interactive) == PriorityClass.bulk
+    with pytest.raises(InvalidPriorityException):
+        parse_priority("urgent", PriorityClass.interactive)
+
+
+def test_iterate_in_context():
+    def priorities():
+        for _ in range(2):
+            yield current_priority.get()
+
+    with priority_context(PriorityClass.bulk):
+        iterator = iterate_in_context(priorities())
+    assert current_priority.get() == PriorityClass.interactive
+    assert list(iterator) == [PriorityClass.bulk, PriorityClass.bulk]
@@ -0,0 +1,42 @@
+import pytest
+
+from utils.request_hedger import RequestHedger
+
+
+class TestRequestHedger:
+
+    def test_delay_percentile(self):
+        hedger = RequestHedger(percentile=90, min_delay_seconds=0.001, budget_ratio=0.1)
+        for latency in range(1, 20):
+            hedger.record("mock", latency / 100)
+        assert hedger.delay("mock") is None  # too few samples
+
+        hedger.record("mock", 0.2)
+        assert hedger.delay("mock") == pytest.approx(0.18)
+        assert hedger.delay("other") is None
+
+    def test_delay_per_batch_size(self):
+        hedger = RequestHedger(percentile=50, min_delay_seconds=0.001, budget_ratio=0.1)
+        for _ in range(20):
+            hedger.record("mock", 0.01, batch_size=1)
+            hedger.record("mock", 1.0, batch_size=200)
+        assert hedger.delay("mock") == 0.01
+        assert hedger.delay("mock", batch_size=256) == 1.0  # same class of batch sizes
+        assert hedger.delay("mock", batch_size=8) is None
+
+    def test_min_delay(self):
+        hedger = RequestHedger(percentile=50, min_delay_seconds=0.5, budget_ratio=0.1)
+        for _ in range(20):
+            hedger.record("mock", 0.01)
+        assert hedger.delay("mock") == 0.5
+
+    def test_budget(self):
+        hedger = RequestHedger(percentile=50, min_delay_seconds=0.0, budget_ratio=0.25)
+        acquired = []
+        for _ in range(8):
+            hedger.delay("mock")
+            acquired.append(hedger.try_acquire())
+
+        assert acquired == [False, False, False, True] * 2
+        assert hedger.statistics()["hedges"] == 2
+        assert hedger.statistics()["budgetExhausted"] == 6
@@ -0,0 +1,66 @@
+from unittest.mock import Mock
+
+import fakeredis
+import pytest
+import redis
+
+from src.test.mocks.clock_mock import ClockMock
+from utils.shared_translation_cache import SharedTranslationCache
+from utils.translation_cache import make_translation_cache_key
+
+
+def _key(text):
+    return make_translation_cache_key(text, "de", "en", ("mock",))
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+class TestSharedTranslationCache:
+
+    def test_round_trip(self, redis_client):
+        cache = SharedTranslationCache(redis_client, ttl_seconds=60, compression_min_bytes=512, retry_after_seconds=30)
+        cache.put_many([(_key("Hallo"), "Hello"), (_key("Welt"), "World")])
+
+        assert cache.get_many([_key("Hallo"), _key("Tschüss"), _key("Welt")]) == ["Hello", None, "World"]
+        assert cache.hits == 2
+        assert cache.misses == 1
+
+    def test_ttl(self, redis_client):
+        cache = SharedTranslationCache(redis_client, ttl_seconds=60, compression_min_bytes=512, retry_after_seconds=30)
+        cache.put_many([(_key("Hallo"), "Hello")])
+
+        assert 0 < redis_client.ttl(SharedTranslationCache._redis_key(_key("Hallo"))) <= 60
+
+    def test_compression(self, redis_client):
+        cache = SharedTranslationCache(redis_client, ttl_seconds=60, compression_min_bytes=16, retry_after_seconds=30)
+        long_translation = "Hello World! " * 100
+        cache.put_many([(_key("Hallo"), "Hello"), (_key("Hallo Welt!"), long_translation)])
+
+        assert redis_client.get(SharedTranslationCache._redis_key(_key("Hallo"))) == b"rHello"
+        compressed_value = redis_client.get(SharedTranslationCache._redis_key(_key("Hallo Welt!")))
+        assert compressed_value.startswith(b"z")
+        assert len(compressed_value) < len(long_translation)
+        assert cache.get_many([_key("Hallo"), _key("Hallo Welt!")]) == ["Hello", long_translation]
+
+    def test_fall_back_if_redis_unavailable(self):
+        clock = ClockMock()
+        redis_client = Mock(spec=redis.Redis)
+        redis_client.mget.side_effect = redis.TimeoutError("Timeout reading from socket")
+        cache = SharedTranslationCache(redis_client, ttl_seconds=60, compression_min_bytes=512, retry_after_seconds=30,
+                                       clock=clock)
+
+        assert cache.get_many([_key("Hallo")]) == [None]
+        assert cache.available is False
+        assert cache.get_many([_key("Hallo")]) == [None]
+        cache.put_many([(_key("Hallo"), "Hello")])
+        assert redis_client.mget.call_count == 1
+        assert redis_client.pipeline.call_count == 0
+
+        clock.now = 30
+        assert cache.available is True
+        assert cache.get_many([_key("Hallo")]) == [None]
+        assert redis_client.mget.call_count == 2
+        assert cache.statistics()["errors"] == 2
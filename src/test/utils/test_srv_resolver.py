@@ -0,0 +1,131 @@
+import asyncio
+import random
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from src.test.mocks.clock_mock import ClockMock
+from utils.srv_resolver import SrvResolver, SrvTarget, SrvResolutionError
+
+
+class _StubDns:
+    """ Answers SRV queries with the configured records and counts the queries. """
+
+    def __init__(self, *records):
+        self.records = list(records)
+        self.queries = 0
+        self.error = None
+
+    async def query(self, domain):
+        self.queries += 1
+        if self.error:
+            raise self.error
+        return self.records
+
+
+def _record(host, port=80, priority=0, weight=1, ttl=30):
+    return SimpleNamespace(host=host, port=port, priority=priority, weight=weight, ttl=ttl)
+
+
+def _resolver(stub_dns, clock):
+    return SrvResolver(min_ttl_seconds=5, max_ttl_seconds=300, query=stub_dns.query, clock=clock, rng=random.Random(0))
+
+
+class TestSrvResolver:
+
+    def test_spread_by_weight(self):
+        stub_dns = _StubDns(_record("a", weight=3), _record("b", weight=1), _record("backup", priority=1))
+        resolver = _resolver(stub_dns, ClockMock())
+
+        async def choose_many():
+            return Counter([(await resolver.choose("client.translator")).host for _ in range(400)])
+
+        counts = asyncio.run(choose_many())
+        assert set(counts) == {"a", "b"}
+        assert 250 < counts["a"] < 350
+        assert stub_dns.queries == 1
+
+    def test_ttl(self):
+        clock = ClockMock()
+        stub_dns = _StubDns(_record("a", ttl=30))
+        resolver = _resolver(stub_dns, clock)
+
+        async def resolve():
+            return await resolver.resolve("client.translator")
+
+        assert asyncio.run(resolve()) == [SrvTarget("a", 80, 0, 1)]
+        clock.now = 29
+        stub_dns.records = [_record("a"), _record("b")]
+
+        async def resolve_and_wait_for_refresh():
+            targets = await resolver.resolve("client.translator")  # served from cache, refreshed in background
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            return targets, await resolver.resolve("client.translator")
+
+        stale_targets, refreshed_targets = asyncio.run(resolve_and_wait_for_refresh())
+        assert [target.host for target in stale_targets] == ["a"]
+        assert [target.host for target in refreshed_targets] == ["a", "b"]
+        assert stub_dns.queries == 2
+
+    def test_refresh_scheduled_on_event_loop(self):
+        stub_dns = _StubDns(_record("a", ttl=0))
+
+        async def resolve_and_wait(resolver, lookups):
+            for _ in range(lookups):
+                await resolver.resolve("client.translator")
+            stub_dns.records = [_record("b", ttl=0)]
+            await asyncio.sleep(0.18)
+            queries = stub_dns.queries
+            targets = await resolver.resolve("client.translator")
+            resolver.close()
+            return queries, [target.host for target in targets]
+
+        # refreshed without waiting for a lookup, since the records were in use
+        resolver = SrvResolver(min_ttl_seconds=0.2, max_ttl_seconds=0.2, query=stub_dns.query)
+        assert asyncio.run(resolve_and_wait(resolver, 2)) == (2, ["b"])
+
+        # records that have not been looked up again are only refreshed by the next lookup
+        stub_dns.records = [_record("a", ttl=0)]
+        resolver = SrvResolver(min_ttl_seconds=0.2, max_ttl_seconds=0.2, query=stub_dns.query)
+        assert asyncio.run(resolve_and_wait(resolver, 1)) == (3, ["a"])
+
+    def test_ttl_bounds(self):
+        clock = ClockMock()
+        stub_dns = _StubDns(_record("a", ttl=0))
+        resolver = _resolver(stub_dns, clock)
+
+        async def resolve():
+            await resolver.resolve("client.translator")
+
+        asyncio.run(resolve())
+        clock.now = 3
+        asyncio.run(resolve())
+        assert stub_dns.queries == 1  # cached for the minimum TTL
+        clock.now = 5
+        asyncio.run(resolve())
+        assert stub_dns.queries == 2
+
+    def test_keep_records_if_refresh_fails(self):
+        clock = ClockMock()
+        stub_dns = _StubDns(_record("a", ttl=30))
+        resolver = _resolver(stub_dns, clock)
+
+        async def resolve():
+            targets = await resolver.resolve("client.translator")
+            await asyncio.sleep(0)
+            return targets
+
+        asyncio.run(resolve())
+        stub_dns.error = SrvResolutionError("client.translator", "timeout")
+        clock.now = 25
+        assert [target.host for target in asyncio.run(resolve())] == ["a"]
+        clock.now = 30
+        with pytest.raises(SrvResolutionError):
+            asyncio.run(resolve())
+
+    def test_no_records(self):
+        resolver = _resolver(_StubDns(), ClockMock())
+        with pytest.raises(SrvResolutionError):
+            asyncio.run(resolver.resolve("client.translator"))
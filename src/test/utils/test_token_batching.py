@@ -0,0 +1,17 @@
+from utils.token_batching import token_budget_batches
+
+
+class TestTokenBatching:
+
+    def test_sort_by_length(self):
+        assert token_budget_batches([5, 1, 3], max_tokens=None) == [[1, 2, 0]]
+
+    def test_token_budget(self):
+        # padded sizes: 2 * 2, 3 * 2, 8 * 1
+        assert token_budget_batches([3, 2, 8, 2, 3], max_tokens=6) == [[1, 3], [0, 4], [2]]
+
+    def test_sequence_exceeding_budget(self):
+        assert token_budget_batches([10, 1], max_tokens=4) == [[1], [0]]
+
+    def test_empty(self):
+        assert token_budget_batches([], max_tokens=4) == []
@@ -0,0 +1,78 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import json
+import logging
+
+import pytest
+
+from utils.tracing import Trace, parse_server_timing, span, start_trace, trace_context, traced
+
+_TRACE_ID = "0af7651916cd43dd8448eb211c80319c"
+_PARENT_SPAN_ID = "b7ad6b7169203331"
+
+
+class TestTracing:
+
+    def test_start_trace(self):
+        trace = start_trace(f"00-{_TRACE_ID}-{_PARENT_SPAN_ID}-01", sample_rate=0)
+        assert (trace.trace_id, trace.parent_span_id) == (_TRACE_ID, _PARENT_SPAN_ID)
+        # the caller decided not to sample the trace
+        assert start_trace(f"00-{_TRACE_ID}-{_PARENT_SPAN_ID}-00", sample_rate=1) is None
+        assert start_trace(None, sample_rate=0) is None
+        assert start_trace("invalid", sample_rate=1).trace_id != _TRACE_ID
+
+    def test_spans(self):
+        trace = Trace()
+        with trace_context(trace):
+            with span("hop", "mockA de->en") as hop:
+                with span("inference"):
+                    pass
+            with span("hop", "mockA de->en"):
+                pass
+            assert trace.traceparent().startswith(f"00-{trace.trace_id}-")
+        with span("ignored"):
+            pass
+
+        assert [s.name for s in trace.spans] == ["inference", "hop", "hop"]
+        assert trace.spans[0].parent_id == hop.span_id
+        assert trace.spans[1].parent_id is None
+        entries = parse_server_timing(trace.finish())
+        assert [(name, description) for name, _, description in entries] == [("hop", "mockA de->en"), ("inference", None), ("total", None)]
+        assert entries[0][1] == pytest.approx((trace.spans[1].duration + trace.spans[2].duration) * 1000, abs=0.001)
+
+    def test_spans_in_executor_and_event_loop(self):
+        @traced("detect")
+        def detect():
+            pass
+
+        @traced("proxy")
+        async def post():
+            await asyncio.sleep(0)
+
+        trace = Trace()
+        with trace_context(trace), concurrent.futures.ThreadPoolExecutor(1) as executor:
+            executor.submit(contextvars.copy_context().run, detect).result()
+            asyncio.run(post())
+
+        assert sorted(s.name for s in trace.spans) == ["detect", "proxy"]
+
+    def test_remote_timings(self):
+        trace = Trace()
+        with trace_context(trace), span("proxy") as proxy:
+            trace.add_remote_timings('inference;dur=12.5;desc="a, \\"b\\"", cache;desc=x, total;dur=20', "client", "client_a", end=100.0)
+
+        assert [(s.name, s.description, s.start, s.duration, s.parent_id) for s in trace.spans[:2]] == [
+            ("client.inference", 'client_a a, "b"', 99.9875, 0.0125, proxy.span_id),
+            ("client.total", "client_a", 99.98, 0.02, proxy.span_id)]
+
+    def test_log_spans(self, caplog):
+        trace = Trace(_TRACE_ID, log_spans=True)
+        with trace_context(trace), span("cache"):
+            pass
+        with caplog.at_level(logging.INFO, logger="utils.tracing"):
+            trace.finish()
+
+        logged = json.loads(caplog.records[-1].getMessage())
+        assert logged["traceId"] == _TRACE_ID
+        assert [s["name"] for s in logged["spans"]] == ["cache"]
@@ -0,0 +1,54 @@
+from src.test.mocks.clock_mock import ClockMock
+from utils.translation_cache import TranslationCache, make_translation_cache_key
+
+
+def _key(text, source_language="de", target_language="en"):
+    return make_translation_cache_key(text, source_language, target_language, ("mock",))
+
+
+class TestTranslationCache:
+
+    def test_hit_and_miss(self):
+        cache = TranslationCache(max_bytes=10_000, ttl_seconds=60)
+        cache.put(_key("Hallo"), "Hello")
+
+        assert cache.get_many([_key("Hallo"), _key("Hallo", target_language="fr"), _key("Welt")]) == ["Hello", None, None]
+        assert cache.hits == 1
+        assert cache.misses == 2
+
+    def test_unicode_normalized_key(self):
+        cache = TranslationCache(max_bytes=10_000, ttl_seconds=60)
+        cache.put(_key("Gru\u0308\u00dfe"), "Greetings")  # decomposed umlaut
+
+        assert cache.get(_key("Gr\u00fc\u00dfe")) == "Greetings"
+
+    def test_ttl(self):
+        clock = ClockMock()
+        cache = TranslationCache(max_bytes=10_000, ttl_seconds=60, clock=clock)
+        cache.put(_key("Hallo"), "Hello")
+
+        clock.now = 59
+        assert cache.get(_key("Hallo")) == "Hello"
+        clock.now = 60
+        assert cache.get(_key("Hallo")) is None
+        assert cache.expirations == 1
+        assert cache.statistics()["entries"] == 0
+
+    def test_lru_eviction_by_byte_budget(self):
+        entry_size = TranslationCache._entry_size(_key("text0"), "translation0")
+        cache = TranslationCache(max_bytes=2 * entry_size, ttl_seconds=60)
+        cache.put(_key("text0"), "translation0")
+        cache.put(_key("text1"), "translation1")
+        cache.get(_key("text0"))  # text1 is now the least recently used entry
+        cache.put(_key("text2"), "translation2")
+
+        assert cache.get_many([_key("text0"), _key("text1"), _key("text2")]) == ["translation0", None, "translation2"]
+        assert cache.evictions == 1
+        assert cache.statistics()["sizeBytes"] <= 2 * entry_size
+
+    def test_disabled(self):
+        cache = TranslationCache(max_bytes=0, ttl_seconds=60)
+        cache.put(_key("Hallo"), "Hello")
+
+        assert cache.get(_key("Hallo")) is None
+        assert cache.statistics()["entries"] == 0
@@ -1,4 +1,7 @@
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
 
 from translator_models.translator_model import TranslatorModel
 from utils.translation_graph import TranslationGraph
@@ -42,3 +45,122 @@ class TestTranslationGraph:
                                                                  (("b", "e"), model),
                                                                  (("e", "f"), model),
                                                                  ]
+
+    def test_contains(self):
+        model = Mock(spec=TranslatorModel)
+        model.available_language_pairs = [("a", "b")]
+        model.translation_quality_grade = 1
+        graph = TranslationGraph([model])
+
+        assert "a" in graph
+        assert "b" in graph
+        assert "c" not in graph
+
+    def test_shortest_paths_computed_once(self):
+        model = Mock(spec=TranslatorModel)
+        model.available_language_pairs = [("a", "b"), ("b", "c"), ("a", "c")]
+        model.translation_quality_grade = 2
+        graph = TranslationGraph([model])
+
+        with patch.object(TranslationGraph, "_compute_shortest_paths", autospec=True,
+                          side_effect=TranslationGraph._compute_shortest_paths) as compute_spy:
+            assert graph.find_optimal_translation_path("a", "c") == [(("a", "c"), model)]
+            assert graph.find_optimal_translation_path("b", "c") == [(("b", "c"), model)]
+            assert compute_spy.call_count == 1
+
+            better_model = Mock(spec=TranslatorModel)
+            better_model.available_language_pairs = [("a", "d"), ("d", "c")]
+            better_model.translation_quality_grade = 0.5
+            graph.add_model(better_model)
+
+            assert graph.find_optimal_translation_path("a", "c") == [(("a", "d"), better_model), (("d", "c"), better_model)]
+            assert compute_spy.call_count == 2
+
+    def test_keep_better_model_per_language_pair(self):
+        better_model = Mock(spec=TranslatorModel)
+        better_model.available_language_pairs = [("a", "b")]
+        better_model.translation_quality_grade = 1
+        worse_model = Mock(spec=TranslatorModel)
+        worse_model.available_language_pairs = [("a", "b"), ("b", "a")]
+        worse_model.translation_quality_grade = 2
+        graph = TranslationGraph([better_model, worse_model])
+
+        assert graph.translation_models == {("a", "b"): better_model, ("b", "a"): worse_model}
+
+    def test_find_translation_path_to_same_language(self):
+        model = Mock(spec=TranslatorModel)
+        model.available_language_pairs = [("a", "b")]
+        model.translation_quality_grade = 1
+        graph = TranslationGraph([model])
+
+        assert graph.find_optimal_translation_path("a", "a") == []
+
+    def test_no_translation_path(self):
+        model = Mock(spec=TranslatorModel)
+        model.available_language_pairs = [("a", "b")]
+        model.translation_quality_grade = 1
+        graph = TranslationGraph([model])
+
+        with pytest.raises(ValueError):
+            graph.find_optimal_translation_path("b", "a")
+        assert graph.get_strongly_connected_component("b") == {"b"}
+        assert graph.get_strongly_connected_component("c") == set()
+
+    def test_connected_languages(self):
+        model = Mock(spec=TranslatorModel)
+        model.available_language_pairs = [("a", "b"), ("b", "a"), ("b", "c"), ("c", "d"), ("d", "c"), ("d", "e")]
+        model.translation_quality_grade = 1
+        graph = TranslationGraph([model])
+
+        assert graph.connected_languages == {"a": ("a", "b"), "b": ("a", "b"), "c": ("c", "d"), "d": ("c", "d"), "e": ("e",)}
+        assert graph.get_connected_languages("d") is graph.get_connected_languages("c")
+        assert graph.get_connected_languages("x") == ()
+
+    def test_connected_languages_computed_once(self):
+        model = Mock(spec=TranslatorModel)
+        model.available_language_pairs = [("a", "b"), ("b", "a")]
+        model.translation_quality_grade = 1
+        graph = TranslationGraph([model])
+
+        with patch.object(TranslationGraph, "_compute_strongly_connected_components", autospec=True,
+                          side_effect=TranslationGraph._compute_strongly_connected_components) as compute_spy:
+            graph.get_connected_languages("a")
+            graph.get_connected_languages("b")
+            assert compute_spy.call_count == 1
+
+            other_model = Mock(spec=TranslatorModel)
+            other_model.available_language_pairs = [("b", "c"), ("c", "a")]
+            other_model.translation_quality_grade = 1
+            graph.add_model(other_model)
+
+            assert graph.get_connected_languages("a") == ("a", "b", "c")
+            assert compute_spy.call_count == 2
+
+    def test_connected_languages_of_long_cycle(self):
+        model = Mock(spec=TranslatorModel)
+        model.available_language_pairs = [(f"l{i}", f"l{(i + 1) % 2000}") for i in range(2000)]
+        model.translation_quality_grade = 1
+        graph = TranslationGraph([model])
+
+        assert len(graph.get_connected_languages("l0")) == 2000
+
+    def test_connected_languages_match_reachability(self):
+        random_generator = np.random.default_rng(42)
+        model = Mock(spec=TranslatorModel)
+        model.available_language_pairs = [(f"l{source}", f"l{target}") for source, target in random_generator.integers(0, 40, size=(60, 2))]
+        model.translation_quality_grade = 1
+        graph = TranslationGraph([model])
+
+        for language in graph.languages:
+            reachable = {target for target in graph.languages if _is_reachable(graph, language, target)}
+            reaching = {source for source in graph.languages if _is_reachable(graph, source, language)}
+            assert set(graph.get_connected_languages(language)) == reachable & reaching
+
+
+def _is_reachable(graph, source_language, target_language):
+    try:
+        graph.find_optimal_translation_path(source_language, target_language)
+        return True
+    except ValueError:
+        return False
+
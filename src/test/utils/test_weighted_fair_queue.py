@@ -0,0 +1,35 @@
+from constants import PriorityClass
+from utils.weighted_fair_queue import WeightedFairQueue
+
+
+class TestWeightedFairQueue:
+
+    def test_serve_in_proportion_to_weights(self):
+        queue = WeightedFairQueue({PriorityClass.interactive: 3, PriorityClass.bulk: 1})
+        queue.extend(PriorityClass.bulk, [f"b{i}" for i in range(4)])
+        queue.extend(PriorityClass.interactive, [f"i{i}" for i in range(6)])
+
+        assert [queue.pop() for _ in range(8)] == ["i0", "i1", "i2", "b0", "i3", "i4", "i5", "b1"]
+        assert len(queue) == 2
+        assert queue.depth(PriorityClass.bulk) == 2
+
+    def test_idle_class_does_not_catch_up(self):
+        queue = WeightedFairQueue({PriorityClass.interactive: 1, PriorityClass.bulk: 1})
+        queue.extend(PriorityClass.bulk, ["b0", "b1", "b2", "b3"])
+        assert [queue.pop(), queue.pop()] == ["b0", "b1"]
+
+        queue.extend(PriorityClass.interactive, ["i0", "i1", "i2"])
+        # the interactive class starts at the current virtual time instead of being served exclusively until it caught up
+        assert [queue.pop() for _ in range(4)] == ["i0", "b2", "i1", "b3"]
+
+    def test_heads_and_cost(self):
+        queue = WeightedFairQueue({})
+        queue.push(PriorityClass.interactive, "i0")
+        queue.push(PriorityClass.interactive, "i1")
+        queue.push(PriorityClass.bulk, "b0")
+
+        assert list(queue.heads()) == [(PriorityClass.interactive, "i0"), (PriorityClass.bulk, "b0")]
+        queue.pop(PriorityClass.interactive, cost=2)
+        assert queue.peek() == (PriorityClass.bulk, "b0")
+        queue.remove(PriorityClass.bulk, "b0")
+        assert queue.peek() == (PriorityClass.interactive, "i1")